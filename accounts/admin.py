@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 
-from .models import User, EmailOTP
+from .models import User, EmailOTP, TrustedDevice
 
 
 @admin.register(User)
@@ -144,3 +145,25 @@ class EmailOTPAdmin(admin.ModelAdmin):
             "fields": ("created_at",),
         }),
     )
+
+
+@admin.register(TrustedDevice)
+class TrustedDeviceAdmin(admin.ModelAdmin):
+    """
+    الأجهزة الموثوقة (تخطي OTP) — الإلغاء يُسقط الثقة فورًا
+    """
+
+    list_display = ("id", "user", "label", "created_at", "last_used_at", "expires_at", "revoked_at")
+    list_display_links = ("id", "user")
+    list_filter = ("revoked_at",)
+    search_fields = ("user__email", "label")
+    list_select_related = ("user",)
+    ordering = ("-id",)
+    exclude = ("token_hash",)
+    readonly_fields = ("user", "label", "created_at", "last_used_at", "expires_at", "revoked_at")
+    actions = ("revoke_devices",)
+
+    @admin.action(description="إلغاء الثقة بالأجهزة المحددة")
+    def revoke_devices(self, request, queryset):
+        updated = queryset.filter(revoked_at__isnull=True).update(revoked_at=timezone.now())
+        self.message_user(request, f"تم إلغاء {updated} جهاز.")
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     name = 'accounts'
     verbose_name = 'الحسابات والصلاحيات'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .signals import connect_header_signals, connect_trusted_device_signals, connect_user_cache_signals
+        connect_header_signals()
+        connect_user_cache_signals()
+        connect_trusted_device_signals()
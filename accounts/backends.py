@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import uuid
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_PREFIX = "accounts:user"
+USER_TTL_SECONDS = 3600
+# sessions logged in before CachedModelBackend carry ModelBackend's path;
+# accounts.middleware maps them to CACHED_BACKEND instead of logging them out
+CACHED_BACKEND = "accounts.backends.CachedModelBackend"
+LEGACY_BACKENDS = frozenset({"django.contrib.auth.backends.ModelBackend"})
+# generation shared by all cached users: bumped when a region/branch/organization
+# changes, since their names ride along with every cached user
+GENERATION_KEY = f"{USER_CACHE_PREFIX}:generation"
+
+
+def _version_key(user_id) -> str:
+    return f"{USER_CACHE_PREFIX}:{user_id}:version"
+
+
+def _new_token() -> str:
+    return uuid.uuid4().hex
+
+
+def _bump(key: str) -> None:
+    # a fresh token, never a counter: an evicted version can't fall back to an old entry
+    cache.set(key, _new_token(), timeout=None)
+
+
+def _tokens(keys: list[str]) -> list[str]:
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # first use or evicted: publish a new token (another worker may win the add)
+            cache.add(key, _new_token(), timeout=None)
+            found[key] = cache.get(key)
+    # still unknown (cache refusing writes): a one-off token, nothing can match it
+    return [found.get(key) or _new_token() for key in keys]
+
+
+def invalidate_user(user_id) -> None:
+    """
+    Move the user to a new cache version. Entries are keyed by version, so a
+    request that read the old row concurrently can only fill a key nobody reads.
+    """
+    _bump(_version_key(user_id))
+
+
+def invalidate_all() -> None:
+    _bump(GENERATION_KEY)
+
+
+def _load(user_id):
+    return (
+        User.objects.select_related("region", "org_branch__master", "org_branch__region")
+        .filter(pk=user_id)
+        .first()
+    )
+
+
+def get_cached_user(user_id):
+    """
+    The user row with region and branch (master/region names included) attached,
+    from the cache when possible; None if the user does not exist.
+    """
+    generation, version = _tokens([GENERATION_KEY, _version_key(user_id)])
+    key = f"{USER_CACHE_PREFIX}:{user_id}:{generation}:{version}"
+    user = cache.get(key)
+    if user is None:
+        user = _load(user_id)
+        if user is None:
+            return None
+        cache.set(key, user, USER_TTL_SECONDS)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() (run by AuthenticationMiddleware on every
+    authenticated request) is served from the cache. Any User save (password,
+    role, profile fields, last_login) moves the user to a new version; see
+    accounts.signals.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = get_cached_user(user_id)
+        except Exception:
+            # cache down: behave like ModelBackend
+            logger.exception("User cache unavailable")
+            return super().get_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
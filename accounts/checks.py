@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# cache backends whose incr/decr are atomic across processes
+ATOMIC_CACHE_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_atomic_cache(app_configs, **kwargs):
+    """Rate-limit counters (accounts.ratelimit) rely on atomic cache.incr."""
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if not getattr(settings, "RATELIMIT_ENABLED", True) or backend in ATOMIC_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f"{backend} has no atomic incr: concurrent requests can slip past the rate limits.",
+            hint="Set THQAF_REDIS_URL in production.",
+            id="accounts.W001",
+        )
+    ]
+
+
+@register(Tags.caches, deploy=True)
+def check_session_cache(app_configs, **kwargs):
+    """accounts.session_store keeps pre-login state and recent changes in the cache only."""
+    if settings.SESSION_ENGINE != "accounts.session_store":
+        return []
+    alias = getattr(settings, "SESSION_CACHE_ALIAS", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    if backend == "django.core.cache.backends.redis.RedisCache":
+        return []
+    return [
+        Warning(
+            f"{backend} is not a shared Redis cache: culled or per-process session entries "
+            f"lose pending logins and up to SESSION_PERSIST_SECONDS of session changes.",
+            hint="Set THQAF_REDIS_URL (with maxmemory-policy noeviction or volatile-*) in production, "
+                 "or THQAF_SESSION_ENGINE=django.contrib.sessions.backends.db.",
+            id="accounts.W002",
+        )
+    ]
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from .header import header_context
+
+
+def portal_header(request) -> dict[str, str]:
+    """display_name / region / org_name for the portal layouts (cached per user)."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return header_context(user)
@@ -1,8 +1,6 @@
 from __future__ import annotations
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.templatetags.static import static
 from django.utils import timezone
 
@@ -12,6 +10,7 @@ def send_verify_email(*, request, to_email: str, otp_code: str, ttl_minutes: int
     إرسال رسالة تفعيل البريد عبر OTP.
     - يستخدم HTML + Plain text
     - يبني رابط الشعار بشكل absolute
+    - تُكتب في الـ outbox (mailer) فتخضع لحد الإرسال بالساعة وإعادة المحاولة
     """
     logo_url = request.build_absolute_uri(static("assets/img/logothqaf.png"))
 
@@ -25,14 +24,15 @@ def send_verify_email(*, request, to_email: str, otp_code: str, ttl_minutes: int
         "year": timezone.now().year,
     }
 
-    text_body = render_to_string("emails/verify_email.txt", ctx)
-    html_body = render_to_string("emails/verify_email.html", ctx)
+    from mailer.models import OutboxMessage
+    from mailer.services import enqueue_email
 
-    msg = EmailMultiAlternatives(
+    enqueue_email(
+        to_email=to_email,
         subject=subject,
-        body=text_body,
+        txt_template="emails/verify_email.txt",
+        html_template="emails/verify_email.html",
+        ctx=ctx,
         from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[to_email],
+        priority=OutboxMessage.Priority.OTP,
     )
-    msg.attach_alternative(html_body, "text/html")
-    msg.send(fail_silently=False)
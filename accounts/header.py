@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.cache import cache
+
+from regions.catalog import region_label
+
+from .models import IndividualProfile, OrganizationProfile, User, UserRole
+
+logger = logging.getLogger(__name__)
+
+# بيانات هيدر البوابات (الاسم/الجهة) لكل مستخدم: تُحسب مرة وتُخزّن في الكاش
+# بمفتاح (id + updated_at) فأي حفظ للمستخدم يبدّل المفتاح تلقائيًا
+HEADER_CACHE_PREFIX = "accounts:header:v1"
+HEADER_TTL_SECONDS = 24 * 3600
+
+# مفاتيح السيشن التي تقرأها الصفحات العامة (home.html) وقوالب المسؤولين
+SESSION_KEYS = ("display_name", "region")
+
+
+def _key(user_id, updated_at) -> str:
+    stamp = updated_at.timestamp() if updated_at else 0
+    return f"{HEADER_CACHE_PREFIX}:{user_id}:{stamp}"
+
+
+def _display_name(user) -> str:
+    """
+    الاسم في الهيدر: اسم ملف الفرد ← الاسم الكامل ← اسم المستخدم
+    ← الجزء قبل @ من البريد (لا نعرض البريد كاملًا).
+    """
+    if user.role == UserRole.INDIVIDUAL:
+        prof = IndividualProfile.objects.filter(user_id=user.pk).only("full_name").first()
+        if prof and (prof.full_name or "").strip():
+            return prof.full_name.strip()
+
+    full = (user.get_full_name() or "").strip()
+    if full:
+        return full
+
+    username = (user.username or "").strip()
+    if username:
+        return username
+
+    email = (user.email or "").strip()
+    if "@" in email:
+        return email.split("@", 1)[0]
+    return "مستخدم"
+
+
+def _compute(user) -> dict[str, str]:
+    display_name, org_name = "", ""
+    if user.role == UserRole.ORG_REP:
+        org = OrganizationProfile.objects.filter(user_id=user.pk).only(
+            "representative_name", "organization_name"
+        ).first()
+        if org:
+            org_name = (org.organization_name or "").strip()
+            display_name = (org.representative_name or "").strip() or org_name
+    return {
+        "display_name": display_name or _display_name(user),
+        "org_name": org_name,
+    }
+
+
+def header_context(user) -> dict[str, str]:
+    """
+    display_name / org_name / region (اسم المنطقة) للمستخدم.
+    اسم المنطقة من كتالوج المراجع (regions.catalog) فلا يحتاج استعلامًا.
+    """
+    if not getattr(user, "is_authenticated", False):
+        return {}
+    key = _key(user.pk, user.updated_at)
+    values = cache.get(key)
+    if values is None:
+        values = _compute(user)
+        cache.set(key, values, HEADER_TTL_SECONDS)
+    return {**values, "region": region_label(user.region_id)}
+
+
+def invalidate(user_id) -> None:
+    """For changes that don't touch the user row itself (profile edits)."""
+    updated_at = User.objects.filter(pk=user_id).values_list("updated_at", flat=True).first()
+    if updated_at is not None:
+        cache.delete(_key(user_id, updated_at))
+
+
+def sync_session(request, values: dict[str, str]) -> None:
+    """
+    Copy the header values into the session, assigning only keys whose value
+    changed: an unchanged session isn't marked modified, so it isn't saved.
+    """
+    session = request.session
+    for name in SESSION_KEYS:
+        value = values.get(name, "")
+        if session.get(name) != value:
+            session[name] = value
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import copy
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import EmailOTP
+
+BENCH_EMAIL_DOMAIN = "bench-db.example.com"
+ALIAS_PREFIX = "bench_"
+
+
+def _write_mix(alias: str, worker: int, ops: int, results: list[tuple[int, int]]) -> None:
+    """The login path's writes, one transaction each: issue an OTP, check + count an attempt, store a session."""
+    email = f"w{worker}@{BENCH_EMAIL_DOMAIN}"
+    committed = locked = 0
+    try:
+        for i in range(ops):
+            try:
+                with transaction.atomic(using=alias):
+                    otp = EmailOTP.objects.using(alias).create(
+                        email=email, purpose="login", code="000000",
+                        expires_at=timezone.now() + timedelta(minutes=10),
+                    )
+                committed += 1
+                # read, then write in the same transaction (like verifying a code)
+                with transaction.atomic(using=alias):
+                    EmailOTP.objects.using(alias).filter(email=email, is_used=False).order_by("-created_at").first()
+                    EmailOTP.objects.using(alias).filter(pk=otp.pk).update(attempts=F("attempts") + 1)
+                committed += 1
+                with transaction.atomic(using=alias):
+                    Session.objects.using(alias).create(
+                        session_key=f"bench{worker:04d}{i:08d}{int(time.time() * 1e6) % 10**12:012d}"[:40],
+                        session_data="x", expire_date=timezone.now(),
+                    )
+                committed += 1
+            except OperationalError:
+                # "database is locked" once busy_timeout runs out
+                locked += 1
+    finally:
+        results.append((committed, locked))
+        connections[alias].close()
+
+
+def _cleanup(alias: str) -> None:
+    EmailOTP.objects.using(alias).filter(email__endswith=f"@{BENCH_EMAIL_DOMAIN}").delete()
+    Session.objects.using(alias).filter(session_key__startswith="bench", session_data="x").delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark: write transactions/s with N threads doing the login write mix "
+        "(OTP insert, read + attempt update, session insert). On SQLite it compares stock settings with "
+        "the tuned profile on temporary copies of the database; on PostgreSQL (DATABASE_URL) it "
+        "runs against the configured database and removes its rows afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--ops", type=int, default=100, help="write-mix iterations per thread")
+
+    def _run(self, alias: str, threads: int, ops: int) -> tuple[float, int]:
+        results: list[tuple[int, int]] = []
+        workers = [threading.Thread(target=_write_mix, args=(alias, w, ops, results)) for w in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        return sum(c for c, _ in results) / elapsed, sum(e for _, e in results)
+
+    def _add_alias(self, name: str, **overrides) -> str:
+        alias = f"{ALIAS_PREFIX}{name}"
+        config = copy.deepcopy(connections.settings["default"])
+        config.update(overrides)
+        connections.settings[alias] = config
+        return alias
+
+    def _drop_alias(self, alias: str) -> None:
+        # the worker threads closed their own connections; this closes the main thread's
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def handle(self, *args, **opts):
+        threads, ops = opts["threads"], opts["ops"]
+        default = settings.DATABASES["default"]
+        self.stdout.write(f"{'profile':16s} {'commits/s':>9s} {'locked':>7s}  ({threads} threads x {ops} x 3 writes)")
+
+        if default["ENGINE"] != "django.db.backends.sqlite3":
+            alias = self._add_alias("configured")
+            vendor = connections[alias].vendor
+            try:
+                rate, locked = self._run(alias, threads, ops)
+            finally:
+                _cleanup(alias)
+                self._drop_alias(alias)
+            self.stdout.write(f"{vendor:16s} {rate:9.0f} {locked:7d}")
+            return
+
+        tuned_options = default.get("OPTIONS", {})
+        profiles = {
+            # what Django does without OPTIONS: rollback journal, 5 s timeout, DEFERRED transactions
+            "sqlite-stock": {"OPTIONS": {}},
+            "sqlite-tuned": {"OPTIONS": tuned_options},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            copies = {name: Path(tmp) / f"{name}.sqlite3" for name in profiles}
+            source = sqlite3.connect(str(default["NAME"]))
+            try:
+                for path in copies.values():
+                    target = sqlite3.connect(str(path))
+                    source.backup(target)
+                    target.execute("PRAGMA journal_mode=DELETE")
+                    target.close()
+            finally:
+                source.close()
+            for name, overrides in profiles.items():
+                alias = self._add_alias(name, NAME=copies[name], **overrides)
+                try:
+                    rate, locked = self._run(alias, threads, ops)
+                finally:
+                    self._drop_alias(alias)
+                self.stdout.write(f"{name:16s} {rate:9.0f} {locked:7d}")
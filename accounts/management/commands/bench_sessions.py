@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.models import EmailOTP, User, UserRole
+from accounts.otp import otp_backend
+from mailer.models import OutboxMessage
+
+ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "hybrid": "accounts.session_store",
+}
+BENCH_EMAIL = "bench.sessions@example.com"
+BENCH_PASSWORD = "bench-sessions-pass"
+
+
+def _login_flow(client: Client) -> None:
+    """Login page → password → OTP page → OTP → two dashboard views + welcome dismiss → logout."""
+    client.get("/accounts/login/")
+    client.post("/accounts/login/", {"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    client.get("/accounts/login/otp/")
+    code = EmailOTP.objects.filter(email=BENCH_EMAIL, purpose="login", is_used=False).latest("created_at").code
+    client.post("/accounts/login/otp/", {"code": code})
+    client.get("/individuals/dashboard/")
+    client.post("/accounts/welcome/clear/")
+    client.get("/individuals/dashboard/")
+    client.post("/accounts/logout/")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the session engine over a full login flow (password + OTP, dashboard, logout): "
+        "django_session reads/writes and wall time per flow, default DB backend vs "
+        "accounts.session_store."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flows", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        n = opts["flows"]
+        user = User.objects.create_user(
+            email=BENCH_EMAIL, password=BENCH_PASSWORD, role=UserRole.INDIVIDUAL, is_active=True
+        )
+        try:
+            self.stdout.write(f"{'engine':8s} {'reads':>7s} {'writes':>7s} {'ms/flow':>9s}  (per login flow, {n} flows)")
+            for label, engine in ENGINES.items():
+                # codes must be readable from the DB to finish the flow; no rate limits in a loop
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                    SESSION_ENGINE=engine,
+                    OTP_BACKEND="accounts.otp.DatabaseOTPBackend",
+                    RATELIMIT_ENABLED=False,
+                ):
+                    otp_backend.cache_clear()
+                    _login_flow(Client())  # warm-up
+                    reads = writes = 0
+                    elapsed = 0.0
+                    for _ in range(n):
+                        client = Client()
+                        with CaptureQueriesContext(connection) as ctx:
+                            start = time.perf_counter()
+                            _login_flow(client)
+                            elapsed += time.perf_counter() - start
+                        for q in ctx.captured_queries:
+                            sql = q["sql"].lstrip().upper()
+                            if '"DJANGO_SESSION"' not in sql:
+                                continue
+                            if sql.startswith("SELECT"):
+                                reads += 1
+                            else:
+                                writes += 1
+                    self.stdout.write(f"{label:8s} {reads / n:7.1f} {writes / n:7.1f} {elapsed / n * 1000:9.1f}")
+        finally:
+            otp_backend.cache_clear()
+            EmailOTP.objects.filter(email=BENCH_EMAIL).delete()
+            OutboxMessage.objects.filter(to_email=BENCH_EMAIL).delete()
+            user.delete()
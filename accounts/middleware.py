@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware as DjangoAuthenticationMiddleware
+
+from .backends import CACHED_BACKEND, LEGACY_BACKENDS
+
+
+class AuthenticationMiddleware(DjangoAuthenticationMiddleware):
+    """
+    Django's AuthenticationMiddleware, plus: a session whose backend path is a
+    LEGACY_BACKENDS entry (no longer in AUTHENTICATION_BACKENDS) is moved to
+    CachedModelBackend before the user is loaded, so it stays logged in.
+    """
+
+    def process_request(self, request):
+        session = request.session
+        if session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            session[BACKEND_SESSION_KEY] = CACHED_BACKEND
+        super().process_request(request)
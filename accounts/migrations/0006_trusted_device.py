@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrustedDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_hash', models.CharField(max_length=64, unique=True, verbose_name='بصمة الرمز')),
+                ('label', models.CharField(blank=True, default='', max_length=255, verbose_name='الجهاز')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإضافة')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر استخدام')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='ينتهي في')),
+                ('revoked_at', models.DateTimeField(blank=True, null=True, verbose_name='أُلغي في')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trusted_devices', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'جهاز موثوق',
+                'verbose_name_plural': 'الأجهزة الموثوقة',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
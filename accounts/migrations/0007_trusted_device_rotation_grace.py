@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_trusted_device'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trusteddevice',
+            name='previous_token_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='بصمة الرمز السابق'),
+        ),
+        migrations.AddField(
+            model_name='trusteddevice',
+            name='rotated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='آخر تدوير'),
+        ),
+    ]
@@ -247,4 +247,39 @@ class OrganizationProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.organization_name
\ No newline at end of file
+        return self.organization_name
+
+class TrustedDevice(models.Model):
+    """
+    جهاز موثوق: متصفح أكمل تسجيل الدخول بالـ OTP واختار "تذكر هذا الجهاز".
+    الكوكي الموقّع يحمل (id, token) ويُخزَّن هنا hash الـ token فقط، ويتغيّر الـ token
+    مع كل استخدام. الإلغاء (revoked_at) يُسقط الثقة فورًا، ويحدث تلقائيًا عند تغيير
+    كلمة المرور أو تعطيل الحساب (accounts.signals).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="trusted_devices",
+        verbose_name="المستخدم",
+    )
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name="بصمة الرمز")
+    # الرمز السابق يبقى مقبولًا لمدة قصيرة بعد التدوير (طلبان متزامنان من نفس المتصفح)
+    previous_token_hash = models.CharField(max_length=64, blank=True, default="", verbose_name="بصمة الرمز السابق")
+    rotated_at = models.DateTimeField(null=True, blank=True, verbose_name="آخر تدوير")
+    label = models.CharField(max_length=255, blank=True, default="", verbose_name="الجهاز")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإضافة")
+    last_used_at = models.DateTimeField(null=True, blank=True, verbose_name="آخر استخدام")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="ينتهي في")
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name="أُلغي في")
+
+    class Meta:
+        verbose_name = "جهاز موثوق"
+        verbose_name_plural = "الأجهزة الموثوقة"
+        ordering = ["-created_at"]
+
+    def is_valid(self) -> bool:
+        return self.revoked_at is None and timezone.now() < self.expires_at
+
+    def __str__(self):
+        return f"{self.user} - {self.label or self.pk}"
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import EmailOTP
+
+logger = logging.getLogger(__name__)
+
+# كم يبقى الرمز في الكاش بعد انتهاء صلاحيته (لتمييز "منتهي" عن "غير موجود")
+CACHE_GRACE_SECONDS = 300
+
+
+class VerifyResult:
+    OK = "ok"
+    MISSING = "missing"
+    EXPIRED = "expired"
+    TOO_MANY = "too_many"
+    WRONG = "wrong"
+
+
+class DatabaseOTPBackend:
+    """
+    الرموز في جدول EmailOTP (دائمة وقابلة للتدقيق من لوحة الإدارة).
+    زيادة المحاولات واستهلاك الرمز عبر UPDATE شرطي (آمن مع الطلبات المتزامنة).
+    """
+
+    def issue(self, email: str, purpose: str, ttl_minutes: int) -> str:
+        return EmailOTP.create_otp(email=email, purpose=purpose, ttl_minutes=ttl_minutes).code
+
+    def verify(self, email: str, purpose: str, code: str, max_attempts: int) -> str:
+        otp = (
+            EmailOTP.objects.filter(email=email, purpose=purpose, is_used=False)
+            .order_by("-created_at").only("pk", "code", "expires_at").first()
+        )
+        if not otp:
+            return VerifyResult.MISSING
+        if otp.is_expired():
+            return VerifyResult.EXPIRED
+        # the attempt only counts while under the limit: concurrent submissions can't overshoot it
+        if not EmailOTP.objects.filter(pk=otp.pk, attempts__lt=max_attempts).update(attempts=F("attempts") + 1):
+            return VerifyResult.TOO_MANY
+        if not hmac.compare_digest(otp.code, code):
+            return VerifyResult.WRONG
+        # single use: only one concurrent request flips is_used
+        if not EmailOTP.objects.filter(pk=otp.pk, is_used=False).update(is_used=True):
+            return VerifyResult.MISSING
+        return VerifyResult.OK
+
+
+class CacheOTPBackend:
+    """
+    الرموز في الكاش المشترك: hash الرمز + عداد محاولات بـ incr ذري، وتنتهي بالـ TTL.
+    لا كتابة على قاعدة البيانات في الإصدار أو التحقق (يتطلب Redis لعدة عمليات).
+    """
+
+    prefix = "accounts:otp"
+
+    def _keys(self, email: str, purpose: str) -> tuple[str, str]:
+        base = f"{self.prefix}:{purpose}:{email.lower()}"
+        return f"{base}:code", f"{base}:attempts"
+
+    @staticmethod
+    def _hash(email: str, code: str) -> str:
+        return hashlib.sha256(f"{settings.SECRET_KEY}:{email.lower()}:{code}".encode("utf-8")).hexdigest()
+
+    def issue(self, email: str, purpose: str, ttl_minutes: int) -> str:
+        code = EmailOTP.generate_code(6)
+        code_key, attempts_key = self._keys(email, purpose)
+        timeout = ttl_minutes * 60 + CACHE_GRACE_SECONDS
+        expires_at = time.time() + ttl_minutes * 60
+        # a new code replaces the previous one and resets its attempts
+        cache.set_many({code_key: (self._hash(email, code), expires_at), attempts_key: 0}, timeout=timeout)
+        return code
+
+    def verify(self, email: str, purpose: str, code: str, max_attempts: int) -> str:
+        code_key, attempts_key = self._keys(email, purpose)
+        stored = cache.get(code_key)
+        if not stored:
+            return VerifyResult.MISSING
+        code_hash, expires_at = stored
+        if time.time() >= expires_at:
+            return VerifyResult.EXPIRED
+        try:
+            attempts = cache.incr(attempts_key)
+        except ValueError:
+            return VerifyResult.MISSING
+        if attempts > max_attempts:
+            return VerifyResult.TOO_MANY
+        if not hmac.compare_digest(code_hash, self._hash(email, code)):
+            return VerifyResult.WRONG
+        # single use: only the request that actually deletes the key wins
+        if not cache.delete(code_key):
+            return VerifyResult.MISSING
+        cache.delete(attempts_key)
+        return VerifyResult.OK
+
+
+@lru_cache(maxsize=1)
+def otp_backend():
+    path = getattr(settings, "OTP_BACKEND", "accounts.otp.DatabaseOTPBackend")
+    return import_string(path)()
+
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import time
+from functools import wraps
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+RATELIMIT_CACHE_PREFIX = "rl"
+
+
+class RateLimit:
+    """
+    Sliding-window counter in the shared cache: ``limit`` hits per ``window``
+    seconds for one (scope, identity). Each window is one counter updated with
+    incr/decr; the previous window's count is weighted by how much of it still
+    overlaps the sliding window.
+
+    incr is atomic on Redis/Memcached only. FileBasedCache/LocMemCache do a
+    read-modify-write, so concurrent hits from several workers can be lost and a
+    client gets somewhat more than ``limit``: production needs THQAF_REDIS_URL
+    (``manage.py check --deploy`` warns otherwise, accounts.checks).
+    """
+
+    def __init__(self, scope: str, limit: int, window: int) -> None:
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+
+    def _key(self, ident: str, index: int) -> str:
+        digest = hashlib.sha1(ident.lower().encode("utf-8")).hexdigest()[:20]
+        return f"{RATELIMIT_CACHE_PREFIX}:{self.scope}:{digest}:{index}"
+
+    def hit(self, ident: str) -> int:
+        """Count one hit. Returns 0 when allowed, else seconds to wait (Retry-After)."""
+        if not ident or not getattr(settings, "RATELIMIT_ENABLED", True):
+            return 0
+        now = time.time()
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        key = self._key(ident, index)
+        try:
+            cache.add(key, 0, timeout=self.window * 2 + 1)
+            current = cache.incr(key)
+            previous = cache.get(self._key(ident, index - 1)) or 0
+        except Exception:
+            # limiter down: fail open rather than lock everyone out
+            logger.exception("Rate limiter unavailable (%s)", self.scope)
+            return 0
+        estimated = previous * (1 - elapsed / self.window) + current
+        if estimated <= self.limit:
+            return 0
+        # rejected hits don't count, so a client that keeps retrying isn't locked out forever
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+        return max(math.ceil(self.window - elapsed), 1)
+
+
+# -----------------------------
+# Identity extractors
+# -----------------------------
+def client_ip(request) -> str:
+    """
+    REMOTE_ADDR, or with TRUSTED_PROXY_COUNT proxies in front of the app, the
+    address the outermost of them saw (that many hops from the right of
+    X-Forwarded-For). Entries further left are client-supplied and never used.
+    """
+    proxies = int(getattr(settings, "TRUSTED_PROXY_COUNT", 0))
+    if proxies > 0:
+        hops = [h.strip() for h in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if h.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR") or ""
+
+
+def post_email(request) -> str:
+    return (request.POST.get("email") or "").strip().lower()
+
+
+def session_value(key: str) -> Callable[[object], str]:
+    def extract(request) -> str:
+        return str(request.session.get(key) or "").strip().lower()
+    return extract
+
+
+def too_many_requests(retry_after: int) -> HttpResponse:
+    response = HttpResponse(
+        f"طلبات كثيرة. حاول مرة أخرى بعد {retry_after} ثانية.",
+        status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def rate_limited(*rules: tuple[RateLimit, Callable[[object], str]], methods: Optional[tuple[str, ...]] = ("POST",)):
+    """
+    Check every (RateLimit, identity extractor) rule in order before the view
+    runs; the first exceeded rule answers 429 without calling the view.
+    Put IP rules first: they need no session/DB access.
+    """
+    def deco(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                for limit, extract in rules:
+                    retry_after = limit.hit(extract(request))
+                    if retry_after:
+                        logger.info("Rate limit %s exceeded (%s)", limit.scope, client_ip(request))
+                        return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return deco
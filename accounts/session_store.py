@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "accounts.session"
+
+
+def _persist_seconds() -> int:
+    return int(getattr(settings, "SESSION_PERSIST_SECONDS", 300))
+
+
+def _digest(encoded: str) -> str:
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _auth(data) -> tuple:
+    return data.get(SESSION_KEY), data.get(HASH_SESSION_KEY)
+
+
+class SessionStore(DBStore):
+    """
+    Write-through cache + lazy DB persistence (SESSION_ENGINE = "accounts.session_store").
+
+    - Every modification goes to the shared cache. Only authenticated sessions
+      get a django_session row: written on the first save after login, then at
+      most once per SESSION_PERSIST_SECONDS. A change of SESSION_KEY or
+      HASH_SESSION_KEY (login, password change) is written at once, so an
+      evicted entry can't bring back an old login. A cache miss
+      (eviction/restart) reloads the row. Pre-login state (pending login/OTP
+      e-mail) lives in the cache only; losing it just means starting the login
+      again. Needs a cache that doesn't cull live keys (accounts.W002).
+    - Creating a key only reserves it in the cache (cache.add), and cycling a
+      session that never had a row doesn't touch the DB.
+    - A save whose encoded data is what was loaded and already in the row
+      writes nothing; a changed save within the interval only updates the cache.
+    - clear_expired() deletes expired rows in batches (manage.py clearsessions).
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = caches[getattr(settings, "SESSION_CACHE_ALIAS", "default")]
+        self._loaded_digest = None
+        self._row_digest = None
+        self._row_auth = None
+        self._persisted_at = 0.0
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.cache_key_prefix}:{self._get_or_create_session_key()}"
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            logger.exception("Session cache unavailable")
+            entry = None
+        if entry is not None:
+            encoded, self._persisted_at, self._row_digest = entry
+            self._loaded_digest = _digest(encoded)
+            data = self.decode(encoded)
+            # auth changes are persisted at once, so the cached ones are the row's
+            self._row_auth = _auth(data)
+            return data
+
+        row = self._get_session_from_db()
+        if row is None:
+            return {}
+        data = self.decode(row.session_data)
+        self._persisted_at = time.time()
+        self._loaded_digest = self._row_digest = _digest(row.session_data)
+        self._row_auth = _auth(data)
+        self._cache.set(
+            self.cache_key, self._entry(row.session_data),
+            self.get_expiry_age(expiry=data.get("_session_expiry")),
+        )
+        return data
+
+    def _entry(self, encoded: str) -> tuple[str, float, str | None]:
+        # (data, when the row was last written, digest of the data in the row)
+        return encoded, self._persisted_at, self._row_digest
+
+    def exists(self, session_key):
+        return self._cache.has_key(f"{self.cache_key_prefix}:{session_key}") or super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        encoded = self.encode(data)
+        digest = _digest(encoded)
+        timeout = self.get_expiry_age()
+
+        if must_create:
+            # reserve the key; the row follows on the first real save
+            self._persisted_at, self._row_digest, self._row_auth = 0.0, None, None
+            if not self._cache.add(self.cache_key, self._entry(encoded), timeout):
+                raise CreateError
+            self._loaded_digest = digest
+            return
+
+        row_current = digest == self._row_digest
+        if digest == self._loaded_digest and row_current:
+            return
+        auth = _auth(data)
+        due = auth != self._row_auth or time.time() - self._persisted_at >= _persist_seconds()
+        if not row_current and due and data.get(SESSION_KEY):
+            self._persist(encoded)
+            self._persisted_at, self._row_digest, self._row_auth = time.time(), digest, auth
+        self._cache.set(self.cache_key, self._entry(encoded), timeout)
+        self._loaded_digest = digest
+
+    def _persist(self, encoded: str) -> None:
+        """Write the row: INSERT for a session that never had one, else UPDATE (upsert either way)."""
+        model = self.model
+        using = router.db_for_write(model, instance=None)
+        fields = {"session_data": encoded, "expire_date": self.get_expiry_date()}
+        rows = model.objects.using(using).filter(session_key=self.session_key)
+        if self._row_digest is not None and rows.update(**fields):
+            return
+        try:
+            with transaction.atomic(using=using):
+                model.objects.using(using).create(session_key=self.session_key, **fields)
+        except IntegrityError:
+            rows.update(**fields)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(f"{self.cache_key_prefix}:{session_key}")
+        super().delete(session_key)
+
+    def cycle_key(self):
+        data = self._session
+        key = self.session_key
+        # rows only exist for authenticated sessions: cycling a pre-login one skips the DB
+        had_row = bool(data.get(SESSION_KEY)) or self._row_digest is not None
+        self.create()
+        self._session_cache = data
+        if key:
+            self._cache.delete(f"{self.cache_key_prefix}:{key}")
+            if had_row:
+                DBStore.delete(self, key)
+
+    # the db backend's async methods would bypass the cache
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    async def aflush(self):
+        return await sync_to_async(self.flush)()
+
+    @classmethod
+    def clear_expired(cls, batch_size=None):
+        """Delete expired rows ``batch_size`` at a time (short write locks on SQLite)."""
+        batch_size = batch_size or int(getattr(settings, "SESSION_PRUNE_BATCH", 1000))
+        model = cls.get_model_class()
+        deleted = 0
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=timezone.now())
+                .values_list("session_key", flat=True)[:batch_size]
+            )
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import backends, header, trusted_devices
+
+
+def _invalidate_header(sender, instance, **kwargs):
+    # profile edits don't bump User.updated_at, so the cached header must be dropped here
+    header.invalidate(instance.user_id)
+
+
+def _invalidate_user(sender, instance, **kwargs):
+    # after commit: a reader between the bump and the commit would cache the old row
+    transaction.on_commit(partial(backends.invalidate_user, instance.pk))
+
+
+def _invalidate_all_users(sender, **kwargs):
+    transaction.on_commit(backends.invalidate_all)
+
+
+def _revoke_trusted_devices(sender, instance, created, **kwargs):
+    # set_password() leaves the raw password in _password until save() returns
+    if not created and (getattr(instance, "_password", None) is not None or not instance.is_active):
+        trusted_devices.revoke_all(instance)
+
+
+def connect_header_signals() -> None:
+    from .models import IndividualProfile, OrganizationProfile
+
+    for model in (IndividualProfile, OrganizationProfile):
+        post_save.connect(_invalidate_header, sender=model, dispatch_uid=f"header_save_{model._meta.label_lower}")
+        post_delete.connect(_invalidate_header, sender=model, dispatch_uid=f"header_delete_{model._meta.label_lower}")
+
+
+def connect_user_cache_signals() -> None:
+    from organizations.models import OrganizationBranch, OrganizationMaster
+    from regions.models import Region
+
+    from .models import User
+
+    post_save.connect(_invalidate_user, sender=User, dispatch_uid="user_cache_save")
+    post_delete.connect(_invalidate_user, sender=User, dispatch_uid="user_cache_delete")
+    # names cached along with the users
+    for model in (Region, OrganizationMaster, OrganizationBranch):
+        post_save.connect(_invalidate_all_users, sender=model, dispatch_uid=f"user_cache_save_{model._meta.label_lower}")
+        post_delete.connect(_invalidate_all_users, sender=model, dispatch_uid=f"user_cache_delete_{model._meta.label_lower}")
+
+
+def connect_trusted_device_signals() -> None:
+    from .models import User
+
+    post_save.connect(_revoke_trusted_devices, sender=User, dispatch_uid="trusted_devices_revoke")
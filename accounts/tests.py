@@ -1,3 +1,337 @@
-from django.test import TestCase
+from __future__ import annotations
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, authenticate
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import trusted_devices
+from .backends import CACHED_BACKEND, CachedModelBackend
+from .checks import check_session_cache
+from .middleware import AuthenticationMiddleware
+from .models import EmailOTP, TrustedDevice, User, UserRole
+from .otp import CacheOTPBackend, DatabaseOTPBackend, VerifyResult
+from .ratelimit import RateLimit, client_ip
+from .session_store import SessionStore
+from .views import _verify_link
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+PASSWORD = "correct-horse-battery"
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AccountsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="member@example.com", password=PASSWORD, role=UserRole.INDIVIDUAL, is_active=True
+        )
+
+
+class CachedBackendTests(AccountsTestCase):
+    def test_failed_login_hashes_once(self):
+        with mock.patch.object(User, "check_password", autospec=True, return_value=False) as check:
+            self.assertIsNone(authenticate(email=self.user.email, password="wrong"))
+        self.assertEqual(check.call_count, 1)
+
+    def test_get_user_follows_deactivation(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_evicted_version_does_not_serve_the_stale_entry(self):
+        from .backends import _version_key, get_cached_user
+
+        self.assertTrue(get_cached_user(self.user.pk).is_active)
+        # deactivation committed, then the cache culls the new version key
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        cache.delete(_version_key(self.user.pk))
+        self.assertFalse(get_cached_user(self.user.pk).is_active)
+        self.assertIsNone(CachedModelBackend().get_user(self.user.pk))
+
+    def test_legacy_model_backend_session_stays_logged_in(self):
+        session = DBSessionStore()
+        session.update({
+            SESSION_KEY: str(self.user.pk),
+            BACKEND_SESSION_KEY: "django.contrib.auth.backends.ModelBackend",
+            HASH_SESSION_KEY: self.user.get_session_auth_hash(),
+        })
+        request = RequestFactory().get("/")
+        request.session = session
+        AuthenticationMiddleware(lambda r: None).process_request(request)
+        self.assertEqual(request.user, self.user)
+        self.assertEqual(session[BACKEND_SESSION_KEY], CACHED_BACKEND)
+
+
+class ClientIpTests(AccountsTestCase):
+    def request(self, xff=None):
+        meta = {"REMOTE_ADDR": "10.0.0.5"}
+        if xff:
+            meta["HTTP_X_FORWARDED_FOR"] = xff
+        return RequestFactory().get("/", **meta)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxy(self):
+        self.assertEqual(client_ip(self.request("1.2.3.4")), "10.0.0.5")
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_rightmost_hop_from_trusted_proxy(self):
+        # the client prepended a fake address; the proxy appended the real one
+        self.assertEqual(client_ip(self.request("6.6.6.6, 203.0.113.9")), "203.0.113.9")
+        self.assertEqual(client_ip(self.request()), "10.0.0.5")
+
+
+@override_settings(RATELIMIT_ENABLED=True)
+class RateLimitTests(AccountsTestCase):
+    def test_limit_and_rejected_hits_do_not_count(self):
+        limit = RateLimit("test:ip", 2, 3600)
+        self.assertEqual(limit.hit("1.1.1.1"), 0)
+        self.assertEqual(limit.hit("1.1.1.1"), 0)
+        self.assertGreater(limit.hit("1.1.1.1"), 0)
+        self.assertGreater(limit.hit("1.1.1.1"), 0)
+        self.assertEqual(limit.hit("2.2.2.2"), 0)
+
+    def test_ip_buckets_are_per_endpoint(self):
+        for _ in range(30):
+            self.client.post("/accounts/login/otp/", {"code": "000000"})
+        self.assertEqual(self.client.post("/accounts/login/otp/", {"code": "000000"}).status_code, 429)
+        response = self.client.post("/accounts/login/", {"email": self.user.email, "password": "wrong"})
+        self.assertNotEqual(response.status_code, 429)
+
+
+class VerifyLinkTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pending = User.objects.create_user(email="new@example.com", password=PASSWORD, is_active=False)
+        self.link = _verify_link(RequestFactory().get("/"), self.pending)
+
+    def is_active(self):
+        self.pending.refresh_from_db()
+        return self.pending.is_active
+
+    def test_link_activates_pending_account(self):
+        self.client.get(self.link)
+        self.assertTrue(self.is_active())
+
+    def test_link_does_not_reactivate_deactivated_account(self):
+        self.client.get(self.link)
+        User.objects.filter(pk=self.pending.pk).update(is_active=False)
+        self.client.get(self.link)
+        self.assertFalse(self.is_active())
+
+    def test_link_dies_with_password_change(self):
+        self.pending.set_password("another-password-1")
+        self.pending.save()
+        self.client.get(self.link)
+        self.assertFalse(self.is_active())
+
+    def test_tampered_link_is_rejected(self):
+        token = self.link.rstrip("/").rsplit("/", 1)[1]
+        self.client.get(self.link.replace(token, token[:-1] + ("B" if token.endswith("A") else "A")))
+        self.assertFalse(self.is_active())
+
+
+@override_settings(TRUSTED_DEVICE_ENABLED=True, TRUSTED_DEVICE_ROTATION_GRACE_SECONDS=60)
+class TrustedDeviceTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        response = HttpResponse()
+        self.device = trusted_devices.trust(RequestFactory().get("/"), response, self.user)
+        self.cookie = response.cookies[trusted_devices.cookie_name()].value
+
+    def request_with(self, cookie):
+        request = RequestFactory().get("/")
+        request.COOKIES[trusted_devices.cookie_name()] = cookie
+        return request
+
+    def login_with(self, cookie):
+        """recognise + rotate like login_view; returns (device, new cookie or None)."""
+        device = trusted_devices.recognise(self.request_with(cookie), self.user)
+        if device is None:
+            return None, None
+        response = HttpResponse()
+        trusted_devices.rotate(response, device)
+        morsel = response.cookies.get(trusted_devices.cookie_name())
+        return device, morsel.value if morsel else None
+
+    def revoked(self):
+        self.device.refresh_from_db()
+        return self.device.revoked_at is not None
+
+    def test_rotation_and_grace_for_racing_request(self):
+        device, second = self.login_with(self.cookie)
+        self.assertIsNotNone(device)
+        self.assertIsNotNone(second)
+        # a request sent with the first cookie before the new one arrived
+        device, again = self.login_with(self.cookie)
+        self.assertIsNotNone(device)
+        self.assertIsNone(again)  # not rotated again: the browser keeps `second`
+        self.assertIsNotNone(self.login_with(second)[0])
+
+    def test_previous_token_after_grace_revokes(self):
+        self.login_with(self.cookie)
+        TrustedDevice.objects.filter(pk=self.device.pk).update(rotated_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(self.login_with(self.cookie), (None, None))
+        self.assertTrue(self.revoked())
+
+    def test_password_change_revokes(self):
+        self.user.set_password("new-password-123")
+        self.user.save()
+        self.assertTrue(self.revoked())
+
+    def test_deactivation_revokes(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertTrue(self.revoked())
+
+    def test_profile_save_keeps_trust(self):
+        self.user.save()
+        self.assertFalse(self.revoked())
+
+    def test_logout_can_forget_all_devices(self):
+        self.client.force_login(self.user)
+        self.client.cookies[trusted_devices.cookie_name()] = self.cookie
+        response = self.client.post("/accounts/logout/", {"forget_devices": "1"})
+        self.assertTrue(self.revoked())
+        self.assertEqual(response.cookies[trusted_devices.cookie_name()].value, "")
+
+
+class OTPBackendTests:
+    """Shared by both backends; the subclass sets ``backend`` and ``expire()``."""
+
+    email = "member@example.com"
+
+    def issue(self):
+        return self.backend.issue(self.email, "login", 10)
+
+    def verify(self, code, max_attempts=3):
+        return self.backend.verify(self.email, "login", code, max_attempts)
+
+    def test_code_is_single_use(self):
+        code = self.issue()
+        self.assertEqual(self.verify(code), VerifyResult.OK)
+        self.assertEqual(self.verify(code), VerifyResult.MISSING)
+
+    def test_wrong_code_then_attempt_limit(self):
+        code = self.issue()
+        for _ in range(3):
+            self.assertEqual(self.verify("x" + code[1:]), VerifyResult.WRONG)
+        self.assertEqual(self.verify(code), VerifyResult.TOO_MANY)
+
+    def test_expired_code(self):
+        code = self.issue()
+        self.expire()
+        self.assertEqual(self.verify(code), VerifyResult.EXPIRED)
+
+    def test_missing_code(self):
+        self.assertEqual(self.verify("123456"), VerifyResult.MISSING)
+
+
+class DatabaseOTPBackendTests(OTPBackendTests, AccountsTestCase):
+    backend = DatabaseOTPBackend()
+
+    def expire(self):
+        EmailOTP.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+
+class CacheOTPBackendTests(OTPBackendTests, AccountsTestCase):
+    backend = CacheOTPBackend()
+
+    def expire(self):
+        patcher = mock.patch("accounts.otp.time.time", return_value=timezone.now().timestamp() + 601)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_code_resets_attempts_without_db_writes(self):
+        self.issue()
+        self.assertEqual(self.verify("x", max_attempts=1), VerifyResult.WRONG)
+        code = self.issue()
+        self.assertEqual(self.verify(code, max_attempts=1), VerifyResult.OK)
+        self.assertFalse(EmailOTP.objects.exists())
+
+
+@override_settings(SESSION_PERSIST_SECONDS=300)
+class SessionStoreTests(AccountsTestCase):
+    def login_session(self):
+        # like auth.login(): cycle_key() creates the key, the middleware saves the user id
+        session = SessionStore()
+        session.cycle_key()
+        session[SESSION_KEY] = str(self.user.pk)
+        session.save()
+        return session
+
+    def row_data(self, session):
+        return SessionStore().decode(Session.objects.get(session_key=session.session_key).session_data)
+
+    def test_pre_login_session_lives_in_the_cache_only(self):
+        session = SessionStore()
+        session["pending_login_email"] = self.user.email
+        session.save()
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(SessionStore(session.session_key)["pending_login_email"], self.user.email)
+        with CaptureQueriesContext(connection) as queries:
+            session.cycle_key()
+        self.assertEqual([q["sql"] for q in queries if not q["sql"].startswith("SELECT")], [])
+
+    def test_login_writes_the_row_then_at_most_once_per_interval(self):
+        session = self.login_session()
+        self.assertEqual(self.row_data(session)[SESSION_KEY], str(self.user.pk))
+        session["step"] = 1
+        session.save()
+        self.assertNotIn("step", self.row_data(session))
+        self.assertEqual(SessionStore(session.session_key)["step"], 1)
+        session._persisted_at -= 301
+        session["step"] = 2
+        session.save()
+        self.assertEqual(self.row_data(session)["step"], 2)
+
+    def test_auth_change_is_persisted_within_the_interval(self):
+        session = self.login_session()
+        session["step"] = 1
+        session.save()
+        session[HASH_SESSION_KEY] = "new-hash"
+        session.save()
+        cache.clear()  # evicted: the row must not bring back the old hash
+        self.assertEqual(SessionStore(session.session_key)[HASH_SESSION_KEY], "new-hash")
+
+    def test_session_cache_check(self):
+        self.assertEqual([w.id for w in check_session_cache(None)], ["accounts.W002"])
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with self.settings(CACHES=redis):
+            self.assertEqual(check_session_cache(None), [])
+        with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            self.assertEqual(check_session_cache(None), [])
+
+    def test_unchanged_save_writes_nothing(self):
+        session = self.login_session()
+        reloaded = SessionStore(session.session_key)
+        reloaded.load()
+        with self.assertNumQueries(0):
+            reloaded.save()
+
+    def test_cache_miss_reloads_the_row(self):
+        session = self.login_session()
+        cache.clear()
+        self.assertEqual(SessionStore(session.session_key)[SESSION_KEY], str(self.user.pk))
+
+    def test_clear_expired_in_batches(self):
+        past = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(
+            Session(session_key=f"expired{i:033d}", session_data="x", expire_date=past) for i in range(5)
+        )
+        live = self.login_session()
+        with self.settings(SESSION_PRUNE_BATCH=2):
+            SessionStore.clear_expired()
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), [live.session_key])
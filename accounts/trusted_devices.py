@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import TrustedDevice
+
+logger = logging.getLogger(__name__)
+
+COOKIE_SALT = "accounts.trusted_device"
+STATS_CACHE_PREFIX = "accounts:login_stats"
+STATS_TTL_SECONDS = 8 * 24 * 3600
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "TRUSTED_DEVICE_ENABLED", True))
+
+
+def window_days() -> int:
+    return int(getattr(settings, "TRUSTED_DEVICE_DAYS", 30))
+
+
+def rotation_grace_seconds() -> int:
+    return int(getattr(settings, "TRUSTED_DEVICE_ROTATION_GRACE_SECONDS", 60))
+
+
+def cookie_name() -> str:
+    return getattr(settings, "TRUSTED_DEVICE_COOKIE_NAME", "thqaf_td")
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _set_cookie(response, device: TrustedDevice, token: str) -> None:
+    max_age = max(int((device.expires_at - timezone.now()).total_seconds()), 0)
+    response.set_signed_cookie(
+        cookie_name(),
+        f"{device.pk}:{token}",
+        salt=COOKIE_SALT,
+        max_age=max_age,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def _read_cookie(request) -> Optional[tuple[int, str]]:
+    raw = request.get_signed_cookie(cookie_name(), default=None, salt=COOKIE_SALT, max_age=window_days() * 86400)
+    if not raw:
+        return None
+    device_id, _, token = raw.partition(":")
+    if not device_id.isdigit() or not token:
+        return None
+    return int(device_id), token
+
+
+def trust(request, response, user) -> TrustedDevice:
+    """Register the current browser for ``user`` and set its cookie on ``response``."""
+    token = secrets.token_urlsafe(32)
+    device = TrustedDevice.objects.create(
+        user=user,
+        token_hash=_hash(token),
+        label=(request.META.get("HTTP_USER_AGENT") or "")[:255],
+        expires_at=timezone.now() + timedelta(days=window_days()),
+    )
+    _set_cookie(response, device, token)
+    return device
+
+
+def recognise(request, user) -> Optional[TrustedDevice]:
+    """
+    The trusted device behind this request's cookie, if it is valid for ``user``.
+
+    The token replaced by the last rotation is still accepted for
+    TRUSTED_DEVICE_ROTATION_GRACE_SECONDS (a second tab or a retried request
+    that raced the new cookie); such a match is not rotated again. Any other
+    mismatch means the cookie was copied, and the device is revoked.
+    """
+    if not is_enabled():
+        return None
+    parsed = _read_cookie(request)
+    if parsed is None:
+        return None
+    device_id, token = parsed
+    device = TrustedDevice.objects.filter(pk=device_id, user=user).first()
+    if device is None or not device.is_valid():
+        return None
+    presented = _hash(token)
+    if hmac.compare_digest(device.token_hash, presented):
+        return device
+    if (
+        device.previous_token_hash
+        and hmac.compare_digest(device.previous_token_hash, presented)
+        and device.rotated_at is not None
+        and timezone.now() - device.rotated_at <= timedelta(seconds=rotation_grace_seconds())
+    ):
+        device.matched_previous = True
+        return device
+    # an old (already rotated) token: the cookie was copied — stop trusting it
+    logger.warning("Trusted device #%s presented a stale token; revoking", device.pk)
+    revoke(device)
+    return None
+
+
+def rotate(response, device: TrustedDevice) -> None:
+    """
+    Issue a fresh token for ``device`` (each cookie value is usable once). Only
+    the holder of the current token rotates; a concurrent request that lost the
+    race keeps the cookie the winner sets.
+    """
+    now = timezone.now()
+    if getattr(device, "matched_previous", False):
+        TrustedDevice.objects.filter(pk=device.pk).update(last_used_at=now)
+        return
+    token = secrets.token_urlsafe(32)
+    rotated = TrustedDevice.objects.filter(pk=device.pk, token_hash=device.token_hash).update(
+        previous_token_hash=device.token_hash, token_hash=_hash(token), rotated_at=now, last_used_at=now,
+    )
+    if rotated:
+        _set_cookie(response, device, token)
+
+
+def revoke(device: TrustedDevice) -> None:
+    TrustedDevice.objects.filter(pk=device.pk, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def revoke_all(user) -> int:
+    """Stop trusting every device of ``user`` (password change, deactivation, user request)."""
+    return TrustedDevice.objects.filter(user=user, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def forget(response) -> None:
+    response.delete_cookie(cookie_name(), samesite="Lax")
+
+
+# -----------------------------
+# Metrics: logins that skipped the OTP e-mail
+# -----------------------------
+def _stats_key(kind: str, day: str) -> str:
+    return f"{STATS_CACHE_PREFIX}:{day}:{kind}"
+
+
+def record_login(*, trusted: bool) -> None:
+    key = _stats_key("trusted" if trusted else "otp", timezone.localdate().isoformat())
+    cache.add(key, 0, timeout=STATS_TTL_SECONDS)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=STATS_TTL_SECONDS)
+
+
+def login_stats(days: int = 1) -> dict:
+    """Logins over the last ``days`` days and the share that needed no e-mail."""
+    today = timezone.localdate()
+    keys = [
+        _stats_key(kind, (today - timedelta(days=i)).isoformat())
+        for i in range(days) for kind in ("trusted", "otp")
+    ]
+    values = cache.get_many(keys)
+    trusted = sum(v for k, v in values.items() if k.endswith(":trusted"))
+    otp = sum(v for k, v in values.items() if k.endswith(":otp"))
+    total = trusted + otp
+    return {
+        "total": total,
+        "trusted": trusted,
+        "otp": otp,
+        "skipped_email_pct": round(100 * trusted / total, 1) if total else 0.0,
+    }
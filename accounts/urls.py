@@ -6,6 +6,7 @@ from .views import (
     login_otp_view,
     resend_login_otp_view,
     verify_email_view,
+    verify_email_link_view,
     resend_otp_view,
     logout_view,
     clear_welcome_view,
@@ -20,6 +21,7 @@ urlpatterns = [
     path("login/otp/resend/", resend_login_otp_view, name="resend_login_otp"),
     path("verify-email/", verify_email_view, name="verify_email"),
     path("verify-email/resend/", resend_otp_view, name="resend_otp"),
+    path("verify-email/<str:token>/", verify_email_link_view, name="verify_email_link"),
 
     # ✅ Logout via POST only
     path("logout/", logout_view, name="logout"),
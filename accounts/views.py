@@ -3,24 +3,32 @@ from __future__ import annotations
 
 import logging
 import re
-from datetime import datetime
 from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
 from django.contrib import messages
+from django.core import signing
 from django.contrib.auth import authenticate, login, logout
 from django.core.exceptions import ValidationError
-from django.core.mail import EmailMultiAlternatives
 from django.core.validators import validate_email
 from django.db import IntegrityError, transaction
 from django.http import JsonResponse
 from django.shortcuts import redirect, render
-from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_http_methods, require_POST
 
-from .models import EmailOTP, IndividualProfile, OrganizationProfile, User, UserRole
+from regions.catalog import org_branch_options, region_options
+from mailer.models import OutboxMessage
+from mailer.services import enqueue_email
+
+from . import trusted_devices
+from .header import header_context, sync_session
+from .ratelimit import RateLimit, client_ip, post_email, rate_limited, session_value
+from .otp import VerifyResult, otp_backend
+from .models import IndividualProfile, OrganizationProfile, User, UserRole
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +39,16 @@ OTP_TTL_MINUTES = 10
 OTP_MAX_ATTEMPTS = 6
 OTP_RESEND_COOLDOWN_SECONDS = 60
 
+VERIFY_LINK_SALT = "accounts.verify_email"
+VERIFY_LINK_MAX_AGE = 24 * 3600
+
+OTP_ERROR_MESSAGES = {
+    VerifyResult.MISSING: "رمز غير صحيح أو تم استخدامه.",
+    VerifyResult.EXPIRED: "انتهت صلاحية الرمز. اطلب رمزًا جديدًا.",
+    VerifyResult.TOO_MANY: "تم تجاوز عدد المحاولات. اطلب رمزًا جديدًا.",
+    VerifyResult.WRONG: "الرمز غير صحيح.",
+}
+
 # ✅ أدوار لوحة المسؤولين (عدّلها حسب مسمياتك الفعلية في UserRole)
 STAFF_ROLES = {
     UserRole.SUPER_ADMIN,
@@ -110,7 +128,7 @@ def _logo_url_default() -> str:
     return (getattr(settings, "THQAF_LOGO_URL", "") or "").strip() or os_getenv("THQAF_LOGO_URL") or ""
 
 
-def _send_html_email(
+def _queue_html_email(
     *,
     to_email: str,
     subject: str,
@@ -119,35 +137,26 @@ def _send_html_email(
     ctx: dict,
     from_email: str,
     reply_to: str | None = None,
+    priority: int = OutboxMessage.Priority.TRANSACTIONAL,
+    account: str = OutboxMessage.Account.NO_REPLY,
 ) -> None:
     """
-    إرسال رسالة HTML + TXT بشكل آمن (مع تحقق بريد المستلم).
+    إرسال رسالة HTML + TXT عبر الـ Outbox (مع تحقق بريد المستلم): تُكتب الرسالة ضمن
+    معاملة الطلب ويرسلها run_mail_worker بعد الـ commit ضمن الحصة الساعية (mailer.quota)
+    مع إعادة المحاولة — كل رسائل المنصة تمر من هنا.
     """
-    to_email = _clean_and_validate_email(to_email)
-    text_body = render_to_string(txt_template, ctx)
-
-    html_body = None
-    if html_template:
-        try:
-            html_body = render_to_string(html_template, ctx)
-        except Exception:
-            html_body = None
-
-    msg = EmailMultiAlternatives(
+    enqueue_email(
+        to_email=_clean_and_validate_email(to_email),
         subject=subject,
-        body=text_body,
+        txt_template=txt_template,
+        html_template=html_template,
+        ctx=ctx,
         from_email=from_email,
-        to=[to_email],
-        reply_to=[reply_to] if reply_to else None,
+        reply_to=reply_to,
+        priority=priority,
+        account=account,
     )
 
-    if html_body:
-        msg.attach_alternative(html_body, "text/html")
-
-    sent = msg.send(fail_silently=False)
-    if sent != 1:
-        raise RuntimeError(f"Email backend returned sent_count={sent}")
-
 
 # -----------------------------
 # Redirect by role (✅ من نفس الهوم)
@@ -181,20 +190,44 @@ def _redirect_by_role(request, user: User):
 
 
 # -----------------------------
-# Emails (verification / login otp / course notification / contact)
+# Emails (verification / login otp / contact) — إشعارات الدورات الجماعية: mailer.merge
 # -----------------------------
-def _send_verify_email_otp(email: str, code: str) -> None:
+def _verify_link_state(user: User) -> str:
+    """
+    بصمة حالة الحساب داخل رابط التفعيل: تتغير عند التفعيل والإيقاف (is_active/updated_at)
+    وتغيير كلمة المرور والدخول — فلا يعيد رابط قديم تفعيل حساب أوقفه المشرف.
+    """
+    stamps = [d.timestamp() if d else "" for d in (user.last_login, user.updated_at)]
+    value = f"{user.pk}|{user.email}|{user.is_active}|{user.password}|{stamps[0]}|{stamps[1]}"
+    return salted_hmac(VERIFY_LINK_SALT, value).hexdigest()[:32]
+
+
+def _verify_link(request, user: User) -> str:
+    """
+    رابط تفعيل موقّع (django.core.signing) بصلاحية VERIFY_LINK_MAX_AGE — لا يُخزَّن في أي جدول.
+    يصلح للحالة التي صدر فيها فقط (_verify_link_state).
+    """
+    token = signing.dumps(
+        {"uid": user.pk, "email": user.email, "state": _verify_link_state(user)},
+        salt=VERIFY_LINK_SALT, compress=True,
+    )
+    return request.build_absolute_uri(reverse("accounts:verify_email_link", args=[token]))
+
+
+def _send_verify_email(email: str, *, code: str | None = None, verify_url: str | None = None) -> None:
     subject = "تفعيل حسابك في منصة ثقف"
     ctx = {
         "otp_code": code,
+        "verify_url": verify_url,
         "ttl_minutes": OTP_TTL_MINUTES,
+        "link_ttl_hours": VERIFY_LINK_MAX_AGE // 3600,
         "year": timezone.now().year,
         "user_name": "بك",
         "logo_url": _logo_url_default(),
         "support_email": _support_email(),
     }
 
-    _send_html_email(
+    _queue_html_email(
         to_email=email,
         subject=subject,
         txt_template="emails/verify_email.txt",
@@ -202,6 +235,7 @@ def _send_verify_email_otp(email: str, code: str) -> None:
         ctx=ctx,
         from_email=_no_reply_email(),
         reply_to=_support_email(),
+        priority=OutboxMessage.Priority.OTP,
     )
 
 
@@ -216,7 +250,7 @@ def _send_login_otp_email(email: str, code: str) -> None:
         "support_email": _support_email(),
     }
 
-    _send_html_email(
+    _queue_html_email(
         to_email=email,
         subject=subject,
         txt_template="emails/login_otp.txt",
@@ -224,34 +258,7 @@ def _send_login_otp_email(email: str, code: str) -> None:
         ctx=ctx,
         from_email=_no_reply_email(),
         reply_to=_support_email(),
-    )
-
-
-def send_course_notification_email(
-    *,
-    to_email: str,
-    course_title: str,
-    start_at: str | None = None,
-    extra: str | None = None,
-) -> None:
-    subject = f"إشعار دورة تدريبية: {course_title}"
-    ctx = {
-        "course_title": course_title,
-        "start_at": start_at,
-        "extra": extra,
-        "year": timezone.now().year,
-        "logo_url": _logo_url_default(),
-        "support_email": _support_email(),
-    }
-
-    _send_html_email(
-        to_email=to_email,
-        subject=subject,
-        txt_template="emails/course_notification.txt",
-        html_template="emails/course_notification.html",
-        ctx=ctx,
-        from_email=_no_reply_email(),
-        reply_to=_support_email(),
+        priority=OutboxMessage.Priority.OTP,
     )
 
 
@@ -270,73 +277,33 @@ def send_contact_us_email(*, from_name: str, from_email: str, message_text: str)
         "support_email": to_support,
     }
 
-    _send_html_email(
+    _queue_html_email(
         to_email=to_support,
         subject=subject,
         txt_template="emails/contact_us.txt",
         html_template="emails/contact_us.html",
         ctx=ctx,
-        from_email=_no_reply_email(),
+        # حساب الدعم وحصته (المرسل = بريد الدعم نفسه)
+        from_email=f"{settings.THQAF_SUPPORT_EMAIL_FROM_NAME} <{to_support}>",
         reply_to=from_email_clean,
+        account=OutboxMessage.Account.SUPPORT,
     )
 
 
 # -----------------------------
-# Rate limits
+# Rate limits (accounts.ratelimit — مشتركة عبر الكاش، لا تعتمد على الجلسة)
 # -----------------------------
-def _rate_limit_resend_ok(request) -> bool:
-    last = request.session.get("otp_last_sent_at")
-    if not last:
-        return True
-    try:
-        last_dt = datetime.fromisoformat(last)
-        if timezone.is_naive(last_dt):
-            last_dt = timezone.make_aware(last_dt, timezone.get_current_timezone())
-        delta = (timezone.now() - last_dt).total_seconds()
-        return delta >= OTP_RESEND_COOLDOWN_SECONDS
-    except Exception:
-        return True
-
-
-def _mark_otp_sent_now(request) -> None:
-    request.session["otp_last_sent_at"] = timezone.now().isoformat()
-
-
-def _rate_limit_resend_ok_login(request) -> bool:
-    last = request.session.get("otp_login_last_sent_at")
-    if not last:
-        return True
-    try:
-        last_dt = datetime.fromisoformat(last)
-        if timezone.is_naive(last_dt):
-            last_dt = timezone.make_aware(last_dt, timezone.get_current_timezone())
-        delta = (timezone.now() - last_dt).total_seconds()
-        return delta >= OTP_RESEND_COOLDOWN_SECONDS
-    except Exception:
-        return True
+def _ip_limit(endpoint: str) -> RateLimit:
+    # حد لكل صفحة: كثرة محاولات OTP من IP لا تمنعه من صفحة الدخول نفسها
+    return RateLimit(f"{endpoint}:ip", 30, 60)
 
 
-def _mark_otp_login_sent_now(request) -> None:
-    request.session["otp_login_last_sent_at"] = timezone.now().isoformat()
-
-
-def _get_regions_and_org_branches():
-    regions = []
-    org_branches = []
-
-    try:
-        from regions.models import Region  # type: ignore
-        regions = Region.objects.all().order_by("id")
-    except Exception as e:
-        logger.warning("Could not load regions: %s", e)
-
-    try:
-        from organizations.models import OrganizationBranch  # type: ignore
-        org_branches = OrganizationBranch.objects.all().order_by("id")
-    except Exception as e:
-        logger.warning("Could not load organization branches: %s", e)
-
-    return regions, org_branches
+REGISTER_IP_LIMIT = RateLimit("register:ip", 10, 3600)
+LOGIN_EMAIL_LIMIT = RateLimit("login:email", 10, 600)
+OTP_VERIFY_LIMIT = RateLimit("otp_verify:email", 10, 600)
+# إرسال OTP/رابط: رسالة واحدة لكل بريد خلال مدة الانتظار (يشمل الإرسال الأول)
+VERIFY_SEND_LIMIT = RateLimit("verify_send:email", 1, OTP_RESEND_COOLDOWN_SECONDS)
+LOGIN_OTP_SEND_LIMIT = RateLimit("login_otp_send:email", 1, OTP_RESEND_COOLDOWN_SECONDS)
 
 
 def _validate_region_id(region_id: str) -> int | None:
@@ -352,31 +319,6 @@ def _validate_region_id(region_id: str) -> int | None:
         return None
 
 
-def _get_display_name(user: User) -> str:
-    try:
-        if user.role == UserRole.INDIVIDUAL:
-            prof = IndividualProfile.objects.filter(user=user).only("full_name").first()
-            if prof and (prof.full_name or "").strip():
-                return prof.full_name.strip()
-
-        if user.role == UserRole.ORG_REP:
-            org = OrganizationProfile.objects.filter(user=user).only(
-                "representative_name", "organization_name"
-            ).first()
-            if org:
-                if (org.representative_name or "").strip():
-                    return org.representative_name.strip()
-                if (org.organization_name or "").strip():
-                    return org.organization_name.strip()
-    except Exception:
-        pass
-
-    email = (getattr(user, "email", "") or "").strip()
-    if "@" in email:
-        return email.split("@", 1)[0]
-    return "مستخدم"
-
-
 def _safe_next(request, fallback_url_name: str):
     nxt = (request.POST.get("next") or request.GET.get("next") or "").strip()
     if nxt and url_has_allowed_host_and_scheme(
@@ -392,10 +334,13 @@ def _safe_next(request, fallback_url_name: str):
 # Register
 # -----------------------------
 @require_http_methods(["GET", "POST"])
+@rate_limited((REGISTER_IP_LIMIT, client_ip))
 def register_view(request):
     if request.method == "GET":
-        regions, org_branches = _get_regions_and_org_branches()
-        return render(request, "accounts_temp/register.html", {"regions": regions, "org_branches": org_branches})
+        return render(request, "accounts_temp/register.html", {
+            "regions": region_options(),
+            "org_branches": org_branch_options(),
+        })
 
     account_type = (request.POST.get("account_type") or "").strip()  # individual | org
     email = (request.POST.get("email") or "").strip().lower()
@@ -493,12 +438,12 @@ def register_view(request):
                     landmark=landmark,
                 )
 
-            otp = EmailOTP.create_otp(email=user.email, purpose="verify_email", ttl_minutes=OTP_TTL_MINUTES)
-            _send_verify_email_otp(user.email, otp.code)
-            _mark_otp_sent_now(request)
+            # رابط فقط (بدون OTP): الرمز يُطلب من صفحة التفعيل عند الحاجة
+            _send_verify_email(user.email, verify_url=_verify_link(request, user))
+            VERIFY_SEND_LIMIT.hit(user.email)
 
         request.session["pending_verify_email"] = user.email
-        messages.success(request, "تم إنشاء الحساب. تم إرسال رمز التفعيل إلى بريدك.")
+        messages.success(request, "تم إنشاء الحساب. تم إرسال رابط التفعيل إلى بريدك.")
         return redirect("accounts:verify_email")
 
     except IntegrityError:
@@ -514,6 +459,7 @@ def register_view(request):
 # Verify Email
 # -----------------------------
 @require_http_methods(["GET", "POST"])
+@rate_limited((_ip_limit("verify_email"), client_ip), (OTP_VERIFY_LIMIT, session_value("pending_verify_email")))
 def verify_email_view(request):
     email = (request.session.get("pending_verify_email") or "").strip().lower()
     if not email:
@@ -528,34 +474,19 @@ def verify_email_view(request):
         messages.error(request, "أدخل رمز التفعيل.")
         return redirect("accounts:verify_email")
 
-    otp = EmailOTP.objects.filter(email=email, purpose="verify_email", is_used=False).order_by("-created_at").first()
-    if not otp:
-        messages.error(request, "رمز غير صحيح أو تم استخدامه.")
-        return redirect("accounts:verify_email")
-    if otp.is_expired():
-        messages.error(request, "انتهت صلاحية الرمز. اطلب رمزًا جديدًا.")
-        return redirect("accounts:verify_email")
-
-    otp.attempts += 1
-    otp.save(update_fields=["attempts"])
-    if otp.attempts > OTP_MAX_ATTEMPTS:
-        messages.error(request, "تم تجاوز عدد المحاولات. اطلب رمزًا جديدًا.")
-        return redirect("accounts:verify_email")
-
-    if otp.code != code:
-        messages.error(request, "الرمز غير صحيح.")
+    result = otp_backend().verify(email, "verify_email", code, OTP_MAX_ATTEMPTS)
+    if result != VerifyResult.OK:
+        messages.error(request, OTP_ERROR_MESSAGES[result])
         return redirect("accounts:verify_email")
 
     try:
         with transaction.atomic():
-            otp.is_used = True
-            otp.save(update_fields=["is_used"])
             user = User.objects.filter(email=email).first()
             if not user:
                 messages.error(request, "الحساب غير موجود.")
                 return redirect("accounts:register")
             user.is_active = True
-            user.save(update_fields=["is_active"])
+            user.save(update_fields=["is_active", "updated_at"])
 
         request.session.pop("pending_verify_email", None)
         messages.success(request, "تم تفعيل الحساب بنجاح. يمكنك تسجيل الدخول الآن.")
@@ -566,20 +497,56 @@ def verify_email_view(request):
         return redirect("accounts:verify_email")
 
 
+# -----------------------------
+# Verify Email (signed link)
+# -----------------------------
+@require_http_methods(["GET"])
+@rate_limited((_ip_limit("verify_email_link"), client_ip), methods=None)
+def verify_email_link_view(request, token: str):
+    try:
+        data = signing.loads(token, salt=VERIFY_LINK_SALT, max_age=VERIFY_LINK_MAX_AGE)
+    except signing.SignatureExpired:
+        messages.error(request, "انتهت صلاحية رابط التفعيل. اطلب رمز تفعيل جديدًا.")
+        return redirect("accounts:verify_email" if request.session.get("pending_verify_email") else "accounts:login")
+    except signing.BadSignature:
+        messages.error(request, "رابط التفعيل غير صالح.")
+        return redirect("accounts:login")
+
+    user = User.objects.filter(pk=data.get("uid"), email=data.get("email")).first()
+    if not user:
+        messages.error(request, "الحساب غير موجود.")
+        return redirect("accounts:register")
+
+    if request.session.get("pending_verify_email") == user.email:
+        request.session.pop("pending_verify_email", None)
+
+    if user.is_active:
+        messages.info(request, "الحساب مفعل بالفعل. يمكنك تسجيل الدخول.")
+        return redirect("accounts:login")
+
+    if not constant_time_compare(data.get("state", ""), _verify_link_state(user)):
+        # تغيّر الحساب بعد إصدار الرابط (فُعّل ثم أُوقف، أو تغيرت كلمة المرور)
+        messages.error(request, "رابط التفعيل غير صالح.")
+        return redirect("accounts:login")
+
+    user.is_active = True
+    # updated_at يتغير مع التفعيل، فلا تعود الحالة كما كانت عند إصدار الرابط إذا أُوقف الحساب لاحقًا
+    user.save(update_fields=["is_active", "updated_at"])
+    messages.success(request, "تم تفعيل الحساب بنجاح. يمكنك تسجيل الدخول الآن.")
+    return redirect("accounts:login")
+
+
 # -----------------------------
 # Resend Verify OTP
 # -----------------------------
 @require_http_methods(["POST"])
+@rate_limited((_ip_limit("resend_otp"), client_ip), (VERIFY_SEND_LIMIT, session_value("pending_verify_email")))
 def resend_otp_view(request):
     email = (request.session.get("pending_verify_email") or "").strip().lower()
     if not email:
         messages.error(request, "لا يوجد حساب بانتظار التفعيل.")
         return redirect("accounts:register")
 
-    if not _rate_limit_resend_ok(request):
-        messages.error(request, f"انتظر قليلًا قبل إعادة الإرسال ({OTP_RESEND_COOLDOWN_SECONDS} ثانية).")
-        return redirect("accounts:verify_email")
-
     user = User.objects.filter(email=email).first()
     if not user:
         messages.error(request, "الحساب غير موجود.")
@@ -591,9 +558,9 @@ def resend_otp_view(request):
         return redirect("accounts:login")
 
     try:
-        otp = EmailOTP.create_otp(email=email, purpose="verify_email", ttl_minutes=OTP_TTL_MINUTES)
-        _send_verify_email_otp(email, otp.code)
-        _mark_otp_sent_now(request)
+        with transaction.atomic():
+            code = otp_backend().issue(email, "verify_email", OTP_TTL_MINUTES)
+            _send_verify_email(email, code=code, verify_url=_verify_link(request, user))
         messages.success(request, "تم إرسال رمز جديد إلى بريدك.")
         return redirect("accounts:verify_email")
     except Exception as e:
@@ -605,7 +572,35 @@ def resend_otp_view(request):
 # -----------------------------
 # Login (✅ نفس بوابة الدخول: فرد/جهة/مسؤول + OTP)
 # -----------------------------
+def _complete_login(request, user: User):
+    """
+    تسجيل الدخول الفعلي بعد التحقق (OTP أو جهاز موثوق) + بيانات الجلسة والتوجيه.
+    """
+    login(request, user)
+
+    header = header_context(user)
+    sync_session(request, header)
+    display_name = header["display_name"]
+
+    # ✅ Toast مرة واحدة بعد الدخول
+    request.session["show_login_toast"] = True
+
+    # (اختياري) مودال للأفراد فقط كما كان
+    if getattr(user, "role", None) == UserRole.INDIVIDUAL:
+        request.session["show_welcome_modal"] = True
+        request.session["welcome_name"] = display_name
+
+    request.session.pop("pending_login_user_id", None)
+    request.session.pop("pending_login_email", None)
+
+    messages.success(request, "تم تسجيل الدخول بنجاح.")
+
+    # ✅ توجيه حسب الدور (فرد/جهة/مسؤول)
+    return _redirect_by_role(request, user)
+
+
 @require_http_methods(["GET", "POST"])
+@rate_limited((_ip_limit("login"), client_ip), (LOGIN_EMAIL_LIMIT, post_email))
 def login_view(request):
     if request.method == "GET":
         return render(request, "accounts_temp/login.html")
@@ -632,6 +627,14 @@ def login_view(request):
         messages.error(request, "غير مصرح لك بالدخول.")
         return redirect("accounts:login")
 
+    # ✅ جهاز موثوق (اختاره المستخدم سابقًا): دخول مباشر بدون OTP ولا بريد
+    device = trusted_devices.recognise(request, user)
+    if device is not None:
+        response = _complete_login(request, user)
+        trusted_devices.rotate(response, device)
+        trusted_devices.record_login(trusted=True)
+        return response
+
     try:
         try:
             request.session.cycle_key()
@@ -639,10 +642,10 @@ def login_view(request):
             pass
 
         login_email = _clean_and_validate_email(getattr(user, "email", "") or email)
-        otp = EmailOTP.create_otp(email=login_email, purpose="login", ttl_minutes=OTP_TTL_MINUTES)
-
-        _send_login_otp_email(login_email, otp.code)
-        _mark_otp_login_sent_now(request)
+        with transaction.atomic():
+            code = otp_backend().issue(login_email, "login", OTP_TTL_MINUTES)
+            _send_login_otp_email(login_email, code)
+        LOGIN_OTP_SEND_LIMIT.hit(login_email)
 
         request.session["pending_login_user_id"] = user.pk
         request.session["pending_login_email"] = login_email
@@ -660,6 +663,7 @@ def login_view(request):
 # Login OTP
 # -----------------------------
 @require_http_methods(["GET", "POST"])
+@rate_limited((_ip_limit("login_otp"), client_ip), (OTP_VERIFY_LIMIT, session_value("pending_login_email")))
 def login_otp_view(request):
     email = (request.session.get("pending_login_email") or "").strip().lower()
     user_id = request.session.get("pending_login_user_id")
@@ -675,35 +679,23 @@ def login_otp_view(request):
         return redirect("accounts:login")
 
     if request.method == "GET":
-        return render(request, "accounts_temp/login_otp.html", {"email": email})
+        return render(request, "accounts_temp/login_otp.html", {
+            "email": email,
+            "trust_device_enabled": trusted_devices.is_enabled(),
+            "trust_device_days": trusted_devices.window_days(),
+        })
 
     code = (request.POST.get("code") or "").strip()
     if not code:
         messages.error(request, "أدخل رمز التحقق.")
         return redirect("accounts:login_otp")
 
-    otp = EmailOTP.objects.filter(email=email, purpose="login", is_used=False).order_by("-created_at").first()
-    if not otp:
-        messages.error(request, "رمز غير صحيح أو تم استخدامه.")
-        return redirect("accounts:login_otp")
-    if otp.is_expired():
-        messages.error(request, "انتهت صلاحية الرمز. اطلب رمزًا جديدًا.")
-        return redirect("accounts:login_otp")
-
-    otp.attempts += 1
-    otp.save(update_fields=["attempts"])
-    if otp.attempts > OTP_MAX_ATTEMPTS:
-        messages.error(request, "تم تجاوز عدد المحاولات. اطلب رمزًا جديدًا.")
-        return redirect("accounts:login_otp")
-
-    if otp.code != code:
-        messages.error(request, "الرمز غير صحيح.")
+    result = otp_backend().verify(email, "login", code, OTP_MAX_ATTEMPTS)
+    if result != VerifyResult.OK:
+        messages.error(request, OTP_ERROR_MESSAGES[result])
         return redirect("accounts:login_otp")
 
     try:
-        otp.is_used = True
-        otp.save(update_fields=["is_used"])
-
         user = User.objects.filter(pk=user_id, email=email).first()
         if not user:
             messages.error(request, "الحساب غير موجود.")
@@ -714,26 +706,11 @@ def login_otp_view(request):
             messages.error(request, "غير مصرح لك بالدخول.")
             return redirect("accounts:login")
 
-        login(request, user)
-
-        display_name = _get_display_name(user)
-        request.session["display_name"] = display_name
-
-        # ✅ Toast مرة واحدة بعد الدخول
-        request.session["show_login_toast"] = True
-
-        # (اختياري) مودال للأفراد فقط كما كان
-        if getattr(user, "role", None) == UserRole.INDIVIDUAL:
-            request.session["show_welcome_modal"] = True
-            request.session["welcome_name"] = display_name
-
-        request.session.pop("pending_login_user_id", None)
-        request.session.pop("pending_login_email", None)
-
-        messages.success(request, "تم تسجيل الدخول بنجاح.")
-
-        # ✅ توجيه حسب الدور (فرد/جهة/مسؤول)
-        return _redirect_by_role(request, user)
+        response = _complete_login(request, user)
+        trusted_devices.record_login(trusted=False)
+        if request.POST.get("trust_device") and trusted_devices.is_enabled():
+            trusted_devices.trust(request, response, user)
+        return response
 
     except Exception as e:
         logger.exception("Login OTP verify failed: %s", e)
@@ -745,6 +722,7 @@ def login_otp_view(request):
 # Resend Login OTP
 # -----------------------------
 @require_http_methods(["POST"])
+@rate_limited((_ip_limit("resend_login_otp"), client_ip), (LOGIN_OTP_SEND_LIMIT, session_value("pending_login_email")))
 def resend_login_otp_view(request):
     email = (request.session.get("pending_login_email") or "").strip().lower()
     user_id = request.session.get("pending_login_user_id")
@@ -759,10 +737,6 @@ def resend_login_otp_view(request):
         messages.error(request, "البريد الإلكتروني غير صالح.")
         return redirect("accounts:login")
 
-    if not _rate_limit_resend_ok_login(request):
-        messages.error(request, f"انتظر قليلًا قبل إعادة الإرسال ({OTP_RESEND_COOLDOWN_SECONDS} ثانية).")
-        return redirect("accounts:login_otp")
-
     user = User.objects.filter(pk=user_id, email=email).first()
     if not user:
         messages.error(request, "الحساب غير موجود.")
@@ -774,9 +748,9 @@ def resend_login_otp_view(request):
         return redirect("accounts:login")
 
     try:
-        otp = EmailOTP.create_otp(email=email, purpose="login", ttl_minutes=OTP_TTL_MINUTES)
-        _send_login_otp_email(email, otp.code)
-        _mark_otp_login_sent_now(request)
+        with transaction.atomic():
+            code = otp_backend().issue(email, "login", OTP_TTL_MINUTES)
+            _send_login_otp_email(email, code)
         messages.success(request, "تم إرسال رمز جديد إلى بريدك.")
         return redirect("accounts:login_otp")
     except Exception as e:
@@ -790,6 +764,10 @@ def resend_login_otp_view(request):
 # -----------------------------
 @require_POST
 def logout_view(request):
+    # ✅ "خروج وإلغاء الأجهزة الموثوقة": كل الأجهزة تعود لطلب OTP
+    forget_devices = request.POST.get("forget_devices") == "1" and request.user.is_authenticated
+    if forget_devices:
+        trusted_devices.revoke_all(request.user)
     if request.user.is_authenticated:
         logout(request)
 
@@ -800,6 +778,11 @@ def logout_view(request):
     request.session.pop("pending_login_user_id", None)
     request.session.pop("pending_login_email", None)
 
+    if forget_devices:
+        messages.success(request, "تم تسجيل الخروج وإلغاء الثقة بكل الأجهزة.")
+        response = redirect("home")
+        trusted_devices.forget(response)
+        return response
     messages.success(request, "تم تسجيل الخروج بنجاح.")
     return redirect("home")
 
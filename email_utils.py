@@ -1,11 +1,37 @@
 from __future__ import annotations
 
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives, get_connection
 
+logger = logging.getLogger(__name__)
+
+# أقصى مدة لبقاء اتصال خامل في الـ pool قبل فحصه بـ NOOP
+POOL_IDLE_CHECK_SECONDS = 30
+# أقصى عمر لاتصال خامل (بعده يُغلق ويُفتح اتصال جديد)
+POOL_MAX_IDLE_SECONDS = 240
+
 
-def _smtp_connection(username: str, password: str):
-    return get_connection(
+def is_connection_error(exc: BaseException) -> bool:
+    """
+    True when the SMTP connection itself is gone (dropped, refused, socket error).
+    SMTPException subclasses OSError, so a refused recipient or a rejected
+    message would otherwise look like a broken connection; those concern one
+    message and leave the connection usable.
+    """
+    if isinstance(exc, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def _smtp_connection(username: str, password: str, **overrides):
+    kwargs = dict(
         backend=settings.EMAIL_BACKEND,
         host=settings.EMAIL_HOST,
         port=settings.EMAIL_PORT,
@@ -16,14 +42,188 @@ def _smtp_connection(username: str, password: str):
         timeout=getattr(settings, "EMAIL_TIMEOUT", 20),
         fail_silently=getattr(settings, "EMAIL_FAIL_SILENTLY", False),
     )
+    kwargs.update(overrides)
+    return get_connection(**kwargs)
+
+
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP connections for one sending account.
+
+    - acquire(): reuses an idle connection (NOOP health check if it has been idle
+      for a while, reconnect if the check fails) or opens a new one.
+    - release(): keeps up to ``size`` idle connections open.
+    - send_messages(): batch send over one pooled connection; on a dropped
+      connection it reconnects once and retries the unsent part. A message the
+      server rejects (recipient/data error) goes to ``on_error`` and the batch
+      goes on over the same connection.
+    """
+
+    def __init__(self, username: str, password: str, *, size: int = 2, **overrides) -> None:
+        self.username = username
+        self.password = password
+        self.size = size
+        self.overrides = overrides
+        self._lock = threading.Lock()
+        self._idle: list[tuple[object, float]] = []
+
+    def _new(self):
+        conn = _smtp_connection(self.username, self.password, **self.overrides)
+        conn.open()
+        return conn
+
+    @staticmethod
+    def _healthy(conn) -> bool:
+        smtp = getattr(conn, "connection", None)
+        if smtp is None:
+            # non-SMTP backends (console/locmem/...) have nothing to check
+            return not hasattr(conn, "connection")
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > POOL_MAX_IDLE_SECONDS:
+                self._close(conn)
+                continue
+            if idle_for > POOL_IDLE_CHECK_SECONDS and not self._healthy(conn):
+                self._close(conn)
+                continue
+            return conn
+        return self._new()
+
+    def release(self, conn, *, broken: bool = False) -> None:
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        self._close(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[object]:
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as exc:
+            broken = is_connection_error(exc)
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def send_messages(
+        self,
+        messages: list[EmailMultiAlternatives],
+        *,
+        on_error: Optional[Callable[[EmailMultiAlternatives, Exception], None]] = None,
+    ) -> int:
+        """
+        Send ``messages``; returns how many were accepted. Without ``on_error``
+        the first rejected message raises (nothing after it is sent). With it,
+        nothing raises: each message is either counted or passed to ``on_error``
+        (including the unsent rest when the connection can't be re-established).
+        """
+        if not messages:
+            return 0
+        sent = 0
+        done = 0  # messages handled (sent or rejected)
+        for attempt in (1, 2):
+            try:
+                with self.connection() as conn:
+                    for msg in messages[done:]:
+                        msg.connection = conn
+                        try:
+                            sent += conn.send_messages([msg]) or 0
+                        except Exception as exc:
+                            if is_connection_error(exc) or on_error is None:
+                                raise
+                            on_error(msg, exc)
+                        done += 1
+                return sent
+            except Exception as exc:
+                if is_connection_error(exc) and attempt == 1:
+                    logger.warning("SMTP connection for %s dropped; reconnecting", self.username or "-")
+                    continue
+                if on_error is None:
+                    raise
+                for msg in messages[done:]:
+                    on_error(msg, exc)
+                return sent
+        return sent
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pools: dict[str, SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _account_credentials(account: str) -> tuple[str, str]:
+    if account == "no_reply":
+        return settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD
+    if account == "support":
+        password = getattr(settings, "THQAF_SUPPORT_EMAIL_PASSWORD", "")
+        if not password:
+            raise RuntimeError("THQAF_SUPPORT_EMAIL_PASSWORD is missing in .env")
+        return settings.THQAF_SUPPORT_EMAIL, password
+    raise ValueError(f"Unknown sending account: {account}")
+
+
+def get_pool(account: str) -> SMTPConnectionPool:
+    """Pool per sending account: "no_reply" (EMAIL_HOST_USER) or "support"."""
+    pool = _pools.get(account)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(account)
+            if pool is None:
+                username, password = _account_credentials(account)
+                pool = SMTPConnectionPool(username, password, size=getattr(settings, "EMAIL_POOL_SIZE", 2))
+                _pools[account] = pool
+    return pool
+
+
+def _send_within_quota(account: str, msg: EmailMultiAlternatives) -> None:
+    """
+    Direct sends draw a transactional token from the account's hourly quota
+    (mailer.quota) like the outbox does, and give it back if the send fails.
+    """
+    from mailer import quota
+    from mailer.models import OutboxMessage
+
+    granted, window = quota.try_acquire(account, 1, OutboxMessage.Priority.TRANSACTIONAL)
+    if not granted:
+        raise RuntimeError(f"Hourly email quota for {account} is used up")
+    try:
+        get_pool(account).send_messages([msg])
+    except Exception:
+        quota.release(account, 1, window)
+        raise
 
 
 def send_no_reply_email(*, subject: str, html_content: str, to: str) -> None:
     """
     OTP + إشعارات الدورات (no-reply)
     """
-    conn = _smtp_connection(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-
     from_email = f"{settings.THQAF_EMAIL_FROM_NAME} <{settings.THQAF_NO_REPLY_EMAIL}>"
 
     msg = EmailMultiAlternatives(
@@ -31,23 +231,17 @@ def send_no_reply_email(*, subject: str, html_content: str, to: str) -> None:
         body="",
         from_email=from_email,
         to=[to],
-        connection=conn,
     )
     msg.attach_alternative(html_content, "text/html")
-    msg.send(fail_silently=False)
+    _send_within_quota("no_reply", msg)
 
 
 def send_support_email(
-    *, subject: str, html_content: str, to: str, reply_to_email: str | None = None
+    *, subject: str, html_content: str, to: str, reply_to_email: Optional[str] = None
 ) -> None:
     """
     تواصل معنا (support)
     """
-    if not settings.THQAF_SUPPORT_EMAIL_PASSWORD:
-        raise RuntimeError("THQAF_SUPPORT_EMAIL_PASSWORD is missing in .env")
-
-    conn = _smtp_connection(settings.THQAF_SUPPORT_EMAIL, settings.THQAF_SUPPORT_EMAIL_PASSWORD)
-
     from_email = f"{settings.THQAF_SUPPORT_EMAIL_FROM_NAME} <{settings.THQAF_SUPPORT_EMAIL}>"
 
     msg = EmailMultiAlternatives(
@@ -55,8 +249,7 @@ def send_support_email(
         body="",
         from_email=from_email,
         to=[to],
-        connection=conn,
         reply_to=[reply_to_email] if reply_to_email else None,
     )
     msg.attach_alternative(html_content, "text/html")
-    msg.send(fail_silently=False)
+    _send_within_quota("support", msg)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# one directory per archived table
+ARCHIVES = ("auditevent", "auditlog")
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, "AUDIT_ARCHIVE_DIR", settings.BASE_DIR / "var" / "audit_archive"))
+
+
+def month_path(name: str, month: str) -> Path:
+    """<AUDIT_ARCHIVE_DIR>/<name>/<YYYY>/<YYYY-MM>.jsonl.gz"""
+    return archive_dir() / name / month[:4] / f"{month}.jsonl.gz"
+
+
+def _ua(obj) -> str:
+    return obj.ua.value if obj.ua_id else ""
+
+
+def _email(user) -> str:
+    return getattr(user, "email", "") or ""
+
+
+def _serialize_auditevent(e) -> dict[str, Any]:
+    return {
+        "id": e.id,
+        "created_at": e.created_at.isoformat(),
+        "action": e.action,
+        "actor_id": e.actor_id,
+        "actor_email": _email(e.actor),
+        "target_user_id": e.target_user_id,
+        "target_email": _email(e.target_user),
+        "meta": e.meta,
+        "ip_address": e.ip_address,
+        "user_agent": _ua(e),
+    }
+
+
+def _serialize_auditlog(log) -> dict[str, Any]:
+    return {
+        "id": log.id,
+        "created_at": log.created_at.isoformat(),
+        "action": log.action,
+        "actor_id": log.actor_id,
+        "actor_email": _email(log.actor),
+        "target_user_id": log.target_user_id,
+        "target_email": _email(log.target_user),
+        "op": log.op,
+        "changes": log.changes,
+        "note": log.note,
+        "ip_address": log.ip_address,
+        "user_agent": _ua(log),
+    }
+
+
+def _model_and_serializer(name: str):
+    if name == "auditevent":
+        from .models import AuditEvent
+        return AuditEvent, _serialize_auditevent
+    if name == "auditlog":
+        from sysadmin.models import AuditLog
+        return AuditLog, _serialize_auditlog
+    raise ValueError(f"Unknown audit archive: {name}")
+
+
+def _append(path: Path, rows: list[dict[str, Any]]) -> None:
+    # gzip members can be concatenated: each run appends one member
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for row in rows:
+                gz.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_older_than(name: str, days: int, *, chunk_size: int = CHUNK_SIZE, dry_run: bool = False) -> int:
+    """
+    Move rows older than ``days`` into monthly gzip JSONL files, then delete them
+    chunk by chunk. A chunk is deleted only after its file write is fsync'ed
+    (a crash in between can duplicate rows in the archive, never lose them).
+    """
+    model, serialize = _model_and_serializer(name)
+    cutoff = timezone.now() - timedelta(days=days)
+    base = model.objects.filter(created_at__lt=cutoff)
+    if dry_run:
+        return base.count()
+
+    moved = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            base.filter(pk__gt=last_pk)
+            .select_related("actor", "target_user", "ua")
+            .order_by("pk")[:chunk_size]
+        )
+        if not chunk:
+            break
+        by_month: dict[str, list[dict[str, Any]]] = {}
+        for obj in chunk:
+            month = timezone.localtime(obj.created_at).strftime("%Y-%m")
+            by_month.setdefault(month, []).append(serialize(obj))
+        for month, rows in by_month.items():
+            _append(month_path(name, month), rows)
+
+        ids = [obj.pk for obj in chunk]
+        with transaction.atomic():
+            if name == "auditevent":
+                from .audit_search import delete_rows
+                delete_rows(connection, ids)
+            model.objects.filter(pk__in=ids).delete()
+        moved += len(ids)
+        last_pk = ids[-1]
+    return moved
+
+
+def archived_months(name: str) -> list[str]:
+    root = archive_dir() / name
+    if not root.is_dir():
+        return []
+    return sorted(p.name[: -len(".jsonl.gz")] for p in root.glob("*/*.jsonl.gz"))
+
+
+def iter_archive(name: str, months: Optional[list[str]] = None, q: str = "") -> Iterator[dict[str, Any]]:
+    """
+    Stream archived rows (one decoded line at a time, never a whole month in
+    memory). ``q`` keeps rows whose raw JSON line contains every term.
+    """
+    terms = [t.lower() for t in (q or "").split() if t]
+    for month in months or archived_months(name):
+        path = month_path(name, month)
+        if not path.exists():
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if terms:
+                    low = line.lower()
+                    if not all(t in low for t in terms):
+                        continue
+                yield json.loads(line)
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(f) -> bool:
+    """Non-blocking exclusive lock on an open file; released when the process dies."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class AuditBuffer:
+    """
+    Buffered AuditEvent writer.
+
+    - ``add()`` appends the event to this process's spool file (JSONL) and to an
+      in-memory list; no DB write on the request path.
+    - The buffer is flushed with one ``bulk_create`` (+ search index rows,
+      iam.audit_search) when it reaches AUDIT_BUFFER_MAX_EVENTS or after
+      AUDIT_BUFFER_MAX_AGE seconds (timer thread). Flushes are serialised, and
+      the spool is rewritten with the events still pending under the same lock.
+    - Spools are named by a random per-process token (renewed after fork), and
+      the owner holds an exclusive file lock on its spool while it lives. A spool
+      that can be locked belongs to a dead process (whatever its PID is now) and
+      is replayed by the next flush, at most every AUDIT_SPOOL_RECOVER_SECONDS
+      (at-least-once delivery).
+    - A failed flush keeps the events and re-arms the timer with exponential
+      backoff (up to AUDIT_FLUSH_MAX_BACKOFF seconds), so a quiet worker retries
+      on its own. On interpreter exit the buffer is drained (atexit).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events: list[dict[str, Any]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._token = uuid.uuid4().hex
+        self._spool = None
+        self._next_recovery = 0.0
+        self._failed_in_row = 0
+        self.flushed_total = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def _after_fork(self) -> None:
+        # the parent's events are the parent's; the child starts its own spool
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = []
+        self._timer = None
+        self._token = uuid.uuid4().hex
+        self._spool = None
+        self._next_recovery = 0.0
+        self._failed_in_row = 0
+
+    # -----------------------------
+    # Config
+    # -----------------------------
+    @property
+    def max_events(self) -> int:
+        return int(getattr(settings, "AUDIT_BUFFER_MAX_EVENTS", 100))
+
+    @property
+    def max_age(self) -> float:
+        return float(getattr(settings, "AUDIT_BUFFER_MAX_AGE", 5.0))
+
+    @property
+    def max_backoff(self) -> float:
+        return float(getattr(settings, "AUDIT_FLUSH_MAX_BACKOFF", 60))
+
+    @property
+    def recover_every(self) -> float:
+        return float(getattr(settings, "AUDIT_SPOOL_RECOVER_SECONDS", 60))
+
+    @property
+    def spool_dir(self) -> Path:
+        return Path(getattr(settings, "AUDIT_SPOOL_DIR", settings.BASE_DIR / "var" / "audit_spool"))
+
+    def _spool_path(self) -> Path:
+        return self.spool_dir / f"audit.{os.getpid()}.{self._token}.jsonl"
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def add(self, event: dict[str, Any]) -> None:
+        with self._lock:
+            self._spool_append(event)
+            self._events.append(event)
+            full = len(self._events) >= self.max_events
+            if not full:
+                self._arm_timer(self.max_age)
+        if full:
+            self.flush()
+
+    def _arm_timer(self, delay: float) -> None:
+        # callers hold self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def queue_depth(self) -> int:
+        return len(self._events)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "flushed_total": self.flushed_total,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            if time.monotonic() >= self._next_recovery:
+                self._next_recovery = time.monotonic() + self.recover_every
+                self._recover_orphan_spools()
+
+            with self._lock:
+                events, self._events = self._events, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not events:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                _bulk_insert(events)
+            except Exception:
+                self.failed_flushes += 1
+                self._failed_in_row += 1
+                retry_in = min(self.max_age * 2 ** self._failed_in_row, self.max_backoff)
+                logger.exception(
+                    "Audit flush failed (%d events kept in buffer/spool, retry in %.0fs)", len(events), retry_in
+                )
+                with self._lock:
+                    self._events[:0] = events
+                    self._arm_timer(retry_in)
+                return 0
+            self._failed_in_row = 0
+
+            with self._lock:
+                # keep only what arrived during the insert (not flushed yet)
+                self._spool_rewrite(self._events)
+
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self.flushed_total += len(events)
+        logger.debug("Audit flush: %d events in %.1f ms (queue_depth=%d)", len(events), self.last_flush_ms, self.queue_depth())
+        return len(events)
+
+    # -----------------------------
+    # Spool (durable fallback); callers hold self._lock
+    # -----------------------------
+    def _spool_file(self):
+        if self._spool is None:
+            path = self._spool_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f = path.open("a+", encoding="utf-8")
+            if not _try_lock(f):
+                f.close()
+                raise OSError(f"Audit spool {path.name} is locked by another process")
+            self._spool = f
+        return self._spool
+
+    def _spool_append(self, event: dict[str, Any]) -> None:
+        try:
+            f = self._spool_file()
+            f.seek(0, os.SEEK_END)
+            f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+        except Exception:
+            logger.exception("Audit spool append failed")
+
+    def _spool_rewrite(self, events: list[dict[str, Any]]) -> None:
+        try:
+            f = self._spool_file()
+            f.seek(0)
+            f.truncate()
+            for e in events:
+                f.write(json.dumps(e, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+        except Exception:
+            logger.exception("Audit spool rewrite failed")
+
+    def _recover_orphan_spools(self) -> None:
+        if not self.spool_dir.is_dir():
+            return
+        own = self._spool_path().name
+        for path in self.spool_dir.glob("audit.*.jsonl"):
+            if path.name == own:
+                continue
+            try:
+                with path.open("r+", encoding="utf-8") as f:
+                    # locked: the owner is alive; gone from the directory: another worker took it
+                    if not _try_lock(f) or os.fstat(f.fileno()).st_nlink == 0:
+                        continue
+                    f.seek(0)
+                    events = [json.loads(line) for line in f if line.strip()]
+                    if events:
+                        _bulk_insert(events)
+                    # emptied before the lock is released: nobody can replay it twice
+                    f.truncate(0)
+                path.unlink(missing_ok=True)
+                if events:
+                    logger.warning("Recovered %d audit events from %s", len(events), path.name)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                logger.exception("Audit spool recovery failed for %s", path.name)
+
+    def drain(self) -> None:
+        """Flush what is left and release the spool (process exit). Unflushed events stay in the spool."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Audit drain failed")
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._spool is not None and not self._events:
+                # nothing left to replay: the spool can go
+                path = Path(self._spool.name)
+                self._spool.close()
+                self._spool = None
+                path.unlink(missing_ok=True)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:
+            # this thread's own DB connections
+            connections.close_all()
+
+
+def _bulk_insert(events: list[dict[str, Any]]) -> None:
+    from .audit_search import index_events
+    from .models import AuditEvent, UserAgent
+
+    ua_ids = UserAgent.intern_many(e.get("user_agent") or "" for e in events)
+    rows = []
+    for e in events:
+        created_at = e.get("created_at")
+        if isinstance(created_at, str):
+            created_at = parse_datetime(created_at)
+        rows.append(AuditEvent(
+            actor_id=e.get("actor_id"),
+            target_user_id=e.get("target_user_id"),
+            action=e["action"],
+            meta=e.get("meta") or {},
+            ip_address=e.get("ip_address"),
+            ua_id=ua_ids.get(e.get("user_agent") or ""),
+            created_at=created_at,
+        ))
+    with transaction.atomic():
+        index_events(AuditEvent.objects.bulk_create(rows))
+
+
+audit_buffer = AuditBuffer()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=audit_buffer._after_fork)
+atexit.register(audit_buffer.drain)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import logging
+import re
+from typing import Any, Iterable
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# SQLite: FTS5 virtual table (rowid = AuditEvent.id)
+# PostgreSQL: side table with a tsvector + GIN index
+SQLITE_TABLE = "iam_auditevent_fts"
+PG_TABLE = "iam_auditevent_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported(conn) -> bool:
+    return conn.vendor in ("sqlite", "postgresql")
+
+
+def create_index_sql(vendor: str) -> list[str]:
+    if vendor == "sqlite":
+        return [f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5(body, tokenize='unicode61')"]
+    if vendor == "postgresql":
+        return [
+            f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+            f"event_id bigint PRIMARY KEY REFERENCES iam_auditevent(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"body tsvector NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_body_gin ON {PG_TABLE} USING gin(body)",
+        ]
+    return []
+
+
+def drop_index_sql(vendor: str) -> list[str]:
+    if vendor == "sqlite":
+        return [f"DROP TABLE IF EXISTS {SQLITE_TABLE}"]
+    if vendor == "postgresql":
+        return [f"DROP TABLE IF EXISTS {PG_TABLE}"]
+    return []
+
+
+def _flatten(value: Any) -> Iterable[str]:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield str(k)
+            yield from _flatten(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _flatten(v)
+    elif value is not None:
+        yield str(value)
+
+
+def _email_terms(email: str) -> list[str]:
+    # PostgreSQL's parser keeps an address as one token: add its words (local part, domain) too
+    return [email, *_TOKEN_RE.findall(email)] if email else []
+
+
+def document(action: str, actor_email: str, target_email: str, meta: Any) -> str:
+    """Searchable text of one event: action, actor/target emails (and their words) and meta keys/values."""
+    return " ".join(filter(None, [action, *_email_terms(actor_email), *_email_terms(target_email), *_flatten(meta)]))
+
+
+def index_rows(conn, rows: list[tuple[int, str]]) -> None:
+    """Write (event_id, document) pairs to the vendor's search index."""
+    if not rows:
+        return
+    with conn.cursor() as cur:
+        if conn.vendor == "sqlite":
+            cur.executemany(f"INSERT OR REPLACE INTO {SQLITE_TABLE}(rowid, body) VALUES (%s, %s)", rows)
+        elif conn.vendor == "postgresql":
+            cur.executemany(
+                f"INSERT INTO {PG_TABLE}(event_id, body) VALUES (%s, to_tsvector('simple', %s)) "
+                f"ON CONFLICT (event_id) DO UPDATE SET body = EXCLUDED.body",
+                rows,
+            )
+
+
+def delete_rows(conn, ids: list[int]) -> None:
+    """Drop index rows of deleted events (PostgreSQL cascades on its own)."""
+    if ids and conn.vendor == "sqlite":
+        with conn.cursor() as cur:
+            cur.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(i,) for i in ids])
+
+
+def index_events(events) -> None:
+    """Incrementally index freshly inserted AuditEvent instances (pk set)."""
+    events = [e for e in events if e.pk]
+    if not events:
+        return
+    conn = connections[events[0]._state.db or DEFAULT_DB_ALIAS]
+    if not is_supported(conn):
+        return
+    from accounts.models import User
+
+    user_ids = {e.actor_id for e in events} | {e.target_user_id for e in events}
+    user_ids.discard(None)
+    emails = dict(User.objects.using(conn.alias).filter(pk__in=user_ids).values_list("pk", "email")) if user_ids else {}
+    try:
+        index_rows(conn, [
+            (e.pk, document(e.action, emails.get(e.actor_id, ""), emails.get(e.target_user_id, ""), e.meta))
+            for e in events
+        ])
+    except Exception:
+        logger.exception("Audit search indexing failed for %d events", len(events))
+
+
+def search(qs, q: str):
+    """Restrict an AuditEvent queryset to events matching ``q`` (all terms, prefix match)."""
+    tokens = _TOKEN_RE.findall(q or "")
+    if not tokens:
+        return qs
+    # the database the queryset reads from (the replica inside replica_reads)
+    vendor = connections[qs.db].vendor
+    if vendor == "sqlite":
+        match = " ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+        return qs.filter(pk__in=RawSQL(f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", (match,)))
+    if vendor == "postgresql":
+        # prefix match on every term, like the FTS5 query ("term"*): \w+ tokens need no escaping
+        query = " & ".join(f"{t}:*" for t in tokens)
+        return qs.filter(pk__in=RawSQL(
+            f"SELECT event_id FROM {PG_TABLE} WHERE body @@ to_tsquery('simple', %s)", (query,)
+        ))
+
+    from django.db.models import Q
+    return qs.filter(Q(action__icontains=q) | Q(actor__email__icontains=q) | Q(target_user__email__icontains=q))
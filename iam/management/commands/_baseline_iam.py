@@ -0,0 +1,127 @@
+"""
+Reference copy of IAMPermissionMiddleware.process_view and the permission
+helpers it called, as of the baseline commit (d0f16c9), for bench_iam_middleware.
+Kept verbatim apart from the names; not used by the application.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional
+
+from django.http import HttpResponseForbidden
+from django.shortcuts import redirect
+from django.urls import resolve, reverse
+from django.utils.deprecation import MiddlewareMixin
+
+from accounts.models import UserRole
+from iam.models import Permission, RolePermission, UserPermission
+
+
+@lru_cache(maxsize=50000)
+def _cached_user_perm(user_id: int, perm_code: str) -> Optional[bool]:
+    # Return True/False if explicitly set on user, else None
+    row = (UserPermission.objects
+           .filter(user_id=user_id, permission__code=perm_code, permission__is_active=True)
+           .select_related("permission")
+           .first())
+    if row is None:
+        return None
+    return bool(row.allow)
+
+
+@lru_cache(maxsize=50000)
+def _cached_role_perm(role: str, perm_code: str) -> Optional[bool]:
+    row = (RolePermission.objects
+           .filter(role=role, permission__code=perm_code, permission__is_active=True)
+           .select_related("permission")
+           .first())
+    if row is None:
+        return None
+    return bool(row.allow)
+
+
+def user_has_perm(user, perm_code: str) -> bool:
+    if not user or not getattr(user, "is_authenticated", False):
+        return False
+
+    # SUPER_ADMIN always allowed
+    if getattr(user, "role", None) == UserRole.SUPER_ADMIN:
+        return True
+
+    # User override
+    explicit = _cached_user_perm(int(user.id), perm_code)
+    if explicit is not None:
+        return explicit
+
+    # Role default
+    role = getattr(user, "role", "") or ""
+    rp = _cached_role_perm(role, perm_code)
+    if rp is not None:
+        return rp
+
+    return False
+
+
+def invalidate_perm_cache() -> None:
+    _cached_user_perm.cache_clear()
+    _cached_role_perm.cache_clear()
+
+
+def ensure_permission(code: str, name: str = "", module: str = "") -> Permission:
+    perm, _ = Permission.objects.get_or_create(
+        code=code,
+        defaults={
+            "name": name or code,
+            "module": module or (code.split(".", 1)[0] if "." in code else ""),
+        },
+    )
+    return perm
+
+
+class BaselineIAMPermissionMiddleware(MiddlewareMixin):
+    ALLOW_PREFIXES = (
+        "/admin/",  # Django admin (you may restrict later)
+        "/accounts/login",
+        "/accounts/register",
+        "/accounts/otp",
+        "/accounts/logout",  # logout is handled via POST in your project
+        "/static/",
+        "/media/",
+    )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        path = request.path or "/"
+        if path in {"/", "/favicon.ico"}:
+            return None
+        for p in self.ALLOW_PREFIXES:
+            if path.startswith(p):
+                return None
+
+        if not request.user.is_authenticated:
+            return redirect(f"{reverse('accounts:login')}?next={request.get_full_path()}")
+
+        match = resolve(path)
+        namespace = match.namespace or ""
+        url_name = match.url_name or ""
+        # fallback: first path segment
+        if not namespace:
+            seg = path.strip("/").split("/", 1)[0]
+            namespace = seg or "core"
+
+        # Broad access permission
+        access_code = f"{namespace}.access"
+        ensure_permission(access_code, name=f"دخول {namespace}", module=namespace)
+        if not user_has_perm(request.user, access_code):
+            return HttpResponseForbidden("غير مصرح لك بالدخول.")
+
+        # Specific permission for endpoint if named
+        if url_name:
+            code = f"{namespace}.{url_name}"
+            ensure_permission(code, name=code, module=namespace)
+            if not user_has_perm(request.user, code):
+                return HttpResponseForbidden("غير مصرح لك.")
+        else:
+            # If not named, enforce access only
+            pass
+
+        return None
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from iam.audit_archive import ARCHIVES, archive_dir, archive_older_than
+
+
+class Command(BaseCommand):
+    help = (
+        "Move AuditEvent / AuditLog rows older than the horizon into monthly gzip JSONL "
+        "archives (AUDIT_ARCHIVE_DIR) and delete them in chunks. "
+        "Schedule daily, e.g. cron: 30 3 * * * python manage.py archive_audit"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=getattr(settings, "AUDIT_ARCHIVE_AFTER_DAYS", 180))
+        parser.add_argument("--table", choices=ARCHIVES, action="append", help="default: all")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        for name in opts["table"] or ARCHIVES:
+            n = archive_older_than(name, opts["days"], chunk_size=opts["chunk_size"], dry_run=opts["dry_run"])
+            verb = "would archive" if opts["dry_run"] else "archived"
+            self.stdout.write(f"{name}: {verb} {n} rows older than {opts['days']} days -> {archive_dir() / name}")
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import copy
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from accounts.models import User, UserRole
+from iam.middleware import IAMPermissionMiddleware
+from iam.models import RolePermission
+from iam.registry import registry
+from iam.services import ensure_permission, invalidate_role_perms
+
+from . import _baseline_iam
+
+BENCH_EMAIL = "bench-iam-middleware@example.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark: per-request cost of IAMPermissionMiddleware.process_view, "
+        "baseline (d0f16c9) vs compiled, against the configured database. "
+        "Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument(
+            "--paths",
+            nargs="*",
+            default=["/sysadmin/users/3/", "/staff/courses/open/", "/contact/", "/organizations/dashboard/", "/accounts/login/otp/"],
+        )
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            self.run(opts["iterations"], opts["paths"])
+            transaction.set_rollback(True)
+
+    def run(self, n: int, paths: list[str]) -> None:
+        def get_response(request):
+            return None
+
+        compiled = IAMPermissionMiddleware(get_response)
+        baseline = _baseline_iam.BaselineIAMPermissionMiddleware(get_response)
+
+        # a coordinator allowed on every benchmarked route, so both checks run
+        role = UserRole.COORDINATOR
+        user = User.objects.create_user(email=BENCH_EMAIL, password=None, role=role, is_active=True)
+        rf = RequestFactory()
+        requests = []
+        for path in paths:
+            req = rf.get(path)
+            req.resolver_match = resolve(path)
+            for code in filter(None, compiled.codes_for(req, path)):
+                RolePermission.objects.get_or_create(role=role, permission=ensure_permission(code))
+            requests.append(req)
+        registry.flush()
+        invalidate_role_perms(role)
+        _baseline_iam.invalidate_perm_cache()
+
+        for label, mw in (("baseline", baseline), ("compiled", compiled)):
+            def one_pass():
+                for req in requests:
+                    # a fresh user per request, as loaded by the auth middleware
+                    req.user = copy.copy(user)
+                    mw.process_view(req, None, (), {})
+
+            one_pass()  # warm up
+            with CaptureQueriesContext(connection) as queries:
+                one_pass()
+            start = time.perf_counter()
+            for _ in range(n):
+                one_pass()
+            elapsed = time.perf_counter() - start
+            per_req_us = elapsed / (n * len(requests)) * 1e6
+            per_req_queries = len(queries) / len(requests)
+            self.stdout.write(
+                f"{label:9s} {per_req_us:8.2f} µs/request  {per_req_queries:5.2f} queries/request  "
+                f"({n * len(requests)} requests)"
+            )
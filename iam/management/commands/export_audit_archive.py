@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from iam.audit_archive import ARCHIVES, archived_months, iter_archive
+
+
+class Command(BaseCommand):
+    help = "Stream (search / export) archived audit rows as JSONL without loading months into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", choices=ARCHIVES, default="auditevent")
+        parser.add_argument("--month", action="append", help="YYYY-MM (repeatable); default: all archived months")
+        parser.add_argument("-q", "--query", default="", help="keep rows containing every term")
+        parser.add_argument("--list", action="store_true", help="list archived months and exit")
+
+    def handle(self, *args, **opts):
+        if opts["list"]:
+            for month in archived_months(opts["table"]):
+                self.stdout.write(month)
+            return
+        for row in iter_archive(opts["table"], opts["month"], q=opts["query"]):
+            self.stdout.write(json.dumps(row, ensure_ascii=False))
@@ -1,11 +1,57 @@
 from __future__ import annotations
 
+import re
+from typing import Optional
+
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
-from django.urls import resolve, reverse
+from django.urls import URLPattern, URLResolver, get_resolver, resolve, reverse
 from django.utils.deprecation import MiddlewareMixin
 
-from .services import ensure_permission, user_has_perm
+from .registry import registry
+from .services import user_has_perm
+
+RouteCodes = tuple[str, Optional[str]]  # (access_code, endpoint_code)
+
+
+def _namespace_fallback(path: str) -> str:
+    # fallback: first path segment
+    seg = path.strip("/").split("/", 1)[0]
+    return seg or "core"
+
+
+def _route_codes(namespace: str, url_name: str) -> RouteCodes:
+    access_code = f"{namespace}.access"
+    return access_code, (f"{namespace}.{url_name}" if url_name else None)
+
+
+def compile_route_table(urlpatterns=None, route_prefix: str = "", namespaces: tuple[str, ...] = ()) -> dict[str, RouteCodes]:
+    """
+    Walk the resolver once: full route pattern (== ResolverMatch.route) -> codes.
+    Routes whose namespace would depend on the concrete path (no namespace and a
+    dynamic first segment) are left out and resolved per request.
+    """
+    if urlpatterns is None:
+        urlpatterns = get_resolver().url_patterns
+    table: dict[str, RouteCodes] = {}
+    for p in urlpatterns:
+        route = str(p.pattern)
+        if route_prefix:
+            # same joining as ResolverMatch.route
+            route = route_prefix + route.removeprefix("^")
+        if isinstance(p, URLResolver):
+            ns = (*namespaces, p.namespace) if p.namespace else namespaces
+            table.update(compile_route_table(p.url_patterns, route, ns))
+        elif isinstance(p, URLPattern):
+            namespace = ":".join(namespaces)
+            if not namespace:
+                seg = route.split("/", 1)[0]
+                if any(ch in seg for ch in "<>^$()[]?*+\\"):
+                    continue
+                namespace = seg or "core"
+            table.setdefault(route, _route_codes(namespace, p.name or ""))
+    return table
+
 
 class IAMPermissionMiddleware(MiddlewareMixin):
     """
@@ -13,8 +59,13 @@ class IAMPermissionMiddleware(MiddlewareMixin):
     - Any authenticated request (except allowlist) must pass required permission.
     - Permission code is derived from namespace + url_name (e.g., courses.approve_list)
       and also the broader namespace.access (e.g., courses.access).
+    - Permission codes are checked against an in-memory registry (iam.registry);
+      no permission-table queries on the request path.
+    - Codes per route are precompiled at startup and looked up from
+      request.resolver_match (Django has already resolved the view).
     """
 
+    ALLOW_PATHS = frozenset({"/", "/favicon.ico"})
     ALLOW_PREFIXES = (
         "/admin/",  # Django admin (you may restrict later)
         "/accounts/login",
@@ -25,37 +76,46 @@ class IAMPermissionMiddleware(MiddlewareMixin):
         "/media/",
     )
 
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        registry.load()
+        self.allow_re = re.compile("|".join(re.escape(p) for p in self.ALLOW_PREFIXES))
+        self.route_table = compile_route_table()
+        for access_code, code in self.route_table.values():
+            namespace = access_code.rsplit(".", 1)[0]
+            registry.ensure(access_code, name=f"دخول {namespace}", module=namespace)
+            if code:
+                registry.ensure(code, name=code, module=namespace)
+
+    def codes_for(self, request, path: str) -> RouteCodes:
+        match = getattr(request, "resolver_match", None) or resolve(path)
+        codes = self.route_table.get(match.route)
+        if codes is not None:
+            return codes
+
+        namespace = match.namespace or _namespace_fallback(path)
+        access_code, code = _route_codes(namespace, match.url_name or "")
+        registry.ensure(access_code, name=f"دخول {namespace}", module=namespace)
+        if code:
+            registry.ensure(code, name=code, module=namespace)
+        return access_code, code
+
     def process_view(self, request, view_func, view_args, view_kwargs):
-        path = request.path or "/"\n        if path in {"/", "/favicon.ico"}:\n            return None
-        for p in self.ALLOW_PREFIXES:
-            if path.startswith(p):
-                return None
+        path = request.path or "/"
+        if path in self.ALLOW_PATHS or self.allow_re.match(path):
+            return None
 
         if not request.user.is_authenticated:
-            return redirect(f"{reverse('accounts:login')}?next={request.get_full_path()}")        
+            return redirect(f"{reverse('accounts:login')}?next={request.get_full_path()}")
 
-        match = resolve(path)
-        namespace = match.namespace or ""
-        url_name = match.url_name or ""
-        # fallback: first path segment
-        if not namespace:
-            seg = path.strip("/").split("/", 1)[0]
-            namespace = seg or "core"
+        access_code, code = self.codes_for(request, path)
 
         # Broad access permission
-        access_code = f"{namespace}.access"
-        ensure_permission(access_code, name=f"دخول {namespace}", module=namespace)
         if not user_has_perm(request.user, access_code):
             return HttpResponseForbidden("غير مصرح لك بالدخول.")
 
-        # Specific permission for endpoint if named
-        if url_name:
-            code = f"{namespace}.{url_name}"
-            ensure_permission(code, name=code, module=namespace)
-            if not user_has_perm(request.user, code):
-                return HttpResponseForbidden("غير مصرح لك.")
-        else:
-            # If not named, enforce access only
-            pass
+        # Specific permission for endpoint if named (else: access only)
+        if code and not user_has_perm(request.user, code):
+            return HttpResponseForbidden("غير مصرح لك.")
 
         return None
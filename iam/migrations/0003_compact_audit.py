@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:28
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _intern(UserAgent, values):
+    by_digest = {_digest(v): v for v in set(values) if v}
+    if not by_digest:
+        return {}
+    found = dict(UserAgent.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+    missing = [UserAgent(digest=d, value=v) for d, v in by_digest.items() if d not in found]
+    if missing:
+        UserAgent.objects.bulk_create(missing, ignore_conflicts=True)
+        found = dict(UserAgent.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+    return {v: found[d] for d, v in by_digest.items()}
+
+
+IDENTITY_FIELDS = ("id", "code", "email", "role", "permission")
+
+
+def _diff(before, after):
+    if before is None:
+        return {k: [None, v] for k, v in sorted((after or {}).items())}
+    if after is None:
+        return {k: [v, None] for k, v in sorted(before.items())}
+    return {
+        k: [before.get(k), after.get(k)]
+        for k in sorted(set(before) | set(after))
+        if before.get(k) != after.get(k)
+    }
+
+
+def _compact_meta(meta):
+    # frozen copy of iam.models.compact_meta
+    meta = dict(meta or {})
+    if "before" not in meta or "after" not in meta:
+        return meta
+    before, after = meta["before"], meta["after"]
+    if before is after is None or not all(v is None or isinstance(v, dict) for v in (before, after)):
+        return meta
+    del meta["before"], meta["after"]
+    meta["op"] = "create" if before is None else "delete" if after is None else "update"
+    meta["changes"] = _diff(before, after)
+    if before is not None and after is not None:
+        ref = {k: after[k] for k in IDENTITY_FIELDS if k in after and before.get(k) == after[k]}
+        if ref:
+            meta["ref"] = ref
+    return meta
+
+
+def backfill(apps, schema_editor):
+    AuditEvent = apps.get_model("iam", "AuditEvent")
+    UserAgent = apps.get_model("iam", "UserAgent")
+
+    last_pk = 0
+    while True:
+        chunk = list(AuditEvent.objects.filter(pk__gt=last_pk).order_by("pk")[:CHUNK_SIZE])
+        if not chunk:
+            break
+        ua_ids = _intern(UserAgent, (e.user_agent for e in chunk))
+        for e in chunk:
+            e.ua_id = ua_ids.get(e.user_agent)
+            e.meta = _compact_meta(e.meta)
+        AuditEvent.objects.bulk_update(chunk, ["ua", "meta"])
+        last_pk = chunk[-1].pk
+
+
+def _expand_meta(meta):
+    """
+    Inverse of _compact_meta for the rollback. Fields an update did not change
+    were never kept, so its before/after hold the changed fields plus ``ref``.
+    """
+    meta = dict(meta or {})
+    op, changes = meta.get("op"), meta.get("changes")
+    if op not in ("create", "update", "delete") or not isinstance(changes, dict):
+        return meta
+    ref = meta.pop("ref", None) or {}
+    del meta["op"], meta["changes"]
+    before = {**ref, **{k: v[0] for k, v in changes.items()}}
+    after = {**ref, **{k: v[1] for k, v in changes.items()}}
+    meta["before"] = None if op == "create" else before
+    meta["after"] = None if op == "delete" else after
+    return meta
+
+
+def unbackfill(apps, schema_editor):
+    AuditEvent = apps.get_model("iam", "AuditEvent")
+
+    last_pk = 0
+    while True:
+        chunk = list(AuditEvent.objects.filter(pk__gt=last_pk).select_related("ua").order_by("pk")[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for e in chunk:
+            e.user_agent = e.ua.value if e.ua_id else ""
+            e.meta = _expand_meta(e.meta)
+        AuditEvent.objects.bulk_update(chunk, ["user_agent", "meta"])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0002_alter_permissionrequest_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40, unique=True)),
+                ('value', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'User-Agent',
+                'verbose_name_plural': 'User-Agents',
+            },
+        ),
+        migrations.AddField(
+            model_name='auditevent',
+            name='ua',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='iam.useragent'),
+        ),
+        # user_agent is dropped in 0005: on PostgreSQL an ALTER TABLE after the
+        # backfill's UPDATEs in one transaction fails with "pending trigger events"
+        migrations.RunPython(backfill, unbackfill),
+    ]
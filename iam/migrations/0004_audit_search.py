@@ -0,0 +1,90 @@
+from django.db import migrations
+
+CHUNK_SIZE = 2000
+
+# Frozen copy of the iam.audit_search schema and document format at the time
+# of this migration: later changes to that module must not alter it.
+SQLITE_TABLE = "iam_auditevent_fts"
+PG_TABLE = "iam_auditevent_search"
+
+CREATE_SQL = {
+    "sqlite": [f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5(body, tokenize='unicode61')"],
+    "postgresql": [
+        f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+        f"event_id bigint PRIMARY KEY REFERENCES iam_auditevent(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        f"body tsvector NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_body_gin ON {PG_TABLE} USING gin(body)",
+    ],
+}
+DROP_SQL = {
+    "sqlite": [f"DROP TABLE IF EXISTS {SQLITE_TABLE}"],
+    "postgresql": [f"DROP TABLE IF EXISTS {PG_TABLE}"],
+}
+INSERT_SQL = {
+    "sqlite": f"INSERT OR REPLACE INTO {SQLITE_TABLE}(rowid, body) VALUES (%s, %s)",
+    "postgresql": (
+        f"INSERT INTO {PG_TABLE}(event_id, body) VALUES (%s, to_tsvector('simple', %s)) "
+        f"ON CONFLICT (event_id) DO UPDATE SET body = EXCLUDED.body"
+    ),
+}
+
+
+def _flatten(value):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield str(k)
+            yield from _flatten(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _flatten(v)
+    elif value is not None:
+        yield str(value)
+
+
+def _document(action, actor_email, target_email, meta):
+    return " ".join(filter(None, [action, actor_email, target_email, *_flatten(meta)]))
+
+
+def create_and_backfill(apps, schema_editor):
+    conn = schema_editor.connection
+    statements = CREATE_SQL.get(conn.vendor)
+    if not statements:
+        return
+    with conn.cursor() as cur:
+        for sql in statements:
+            cur.execute(sql)
+
+    AuditEvent = apps.get_model("iam", "AuditEvent")
+    last_pk = 0
+    while True:
+        chunk = list(
+            AuditEvent.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "action", "actor__email", "target_user__email", "meta")[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        with conn.cursor() as cur:
+            cur.executemany(INSERT_SQL[conn.vendor], [
+                (pk, _document(action, actor_email or "", target_email or "", meta))
+                for pk, action, actor_email, target_email, meta in chunk
+            ])
+        last_pk = chunk[-1][0]
+
+
+def drop(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cur:
+        for sql in DROP_SQL.get(conn.vendor, []):
+            cur.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0003_compact_audit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_and_backfill, drop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0004_audit_search'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='auditevent',
+            name='user_agent',
+        ),
+    ]
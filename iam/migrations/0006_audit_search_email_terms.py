@@ -0,0 +1,70 @@
+import re
+
+from django.db import migrations
+
+CHUNK_SIZE = 2000
+
+# Frozen copy of iam.audit_search's document format at the time of this
+# migration: e-mail addresses also contribute their words (local part, domain),
+# which PostgreSQL's 'simple' parser would otherwise keep as one token.
+# SQLite's FTS5 tokenizer already splits addresses, so only PostgreSQL re-indexes.
+PG_TABLE = "iam_auditevent_search"
+INSERT_SQL = (
+    f"INSERT INTO {PG_TABLE}(event_id, body) VALUES (%s, to_tsvector('simple', %s)) "
+    f"ON CONFLICT (event_id) DO UPDATE SET body = EXCLUDED.body"
+)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _flatten(value):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield str(k)
+            yield from _flatten(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _flatten(v)
+    elif value is not None:
+        yield str(value)
+
+
+def _email_terms(email):
+    return [email, *_TOKEN_RE.findall(email)] if email else []
+
+
+def _document(action, actor_email, target_email, meta):
+    return " ".join(filter(None, [action, *_email_terms(actor_email), *_email_terms(target_email), *_flatten(meta)]))
+
+
+def reindex(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    AuditEvent = apps.get_model("iam", "AuditEvent")
+    last_pk = 0
+    while True:
+        chunk = list(
+            AuditEvent.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "action", "actor__email", "target_user__email", "meta")[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        with conn.cursor() as cur:
+            cur.executemany(INSERT_SQL, [
+                (pk, _document(action, actor_email or "", target_email or "", meta))
+                for pk, action, actor_email, target_email, meta in chunk
+            ])
+        last_pk = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0005_remove_auditevent_user_agent'),
+    ]
+
+    operations = [
+        # the old documents are a subset of the new ones: nothing to undo
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
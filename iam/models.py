@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import hashlib
+from typing import Optional
+
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
@@ -55,13 +58,94 @@ class UserPermission(models.Model):
         return f"{self.user_id} -> {self.permission.code} ({'allow' if self.allow else 'deny'})"
 
 
+class UserAgent(models.Model):
+    """User-Agent strings interned once and referenced by id from audit rows."""
+    digest = models.CharField(max_length=40, unique=True)
+    value = models.TextField()
+
+    class Meta:
+        verbose_name = "User-Agent"
+        verbose_name_plural = "User-Agents"
+
+    def __str__(self) -> str:
+        return self.value[:80]
+
+    @staticmethod
+    def digest_of(value: str) -> str:
+        return hashlib.sha1(value.encode("utf-8", "surrogatepass")).hexdigest()
+
+    @classmethod
+    def intern_many(cls, values) -> dict[str, int]:
+        """value -> id for every non-empty value, inserting missing ones in one batch."""
+        by_digest = {cls.digest_of(v): v for v in set(values) if v}
+        if not by_digest:
+            return {}
+        found = dict(cls.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+        missing = [cls(digest=d, value=v) for d, v in by_digest.items() if d not in found]
+        if missing:
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            found = dict(cls.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+        return {v: found[d] for d, v in by_digest.items() if d in found}
+
+
+# kept in an update's "ref" even when unchanged, so the row still says which record it was about
+SNAPSHOT_IDENTITY_FIELDS = ("id", "code", "email", "role", "permission")
+
+
+def snapshot_op(before: Optional[dict], after: Optional[dict]) -> str:
+    """"create" / "update" / "delete", from which side of the snapshot pair is missing."""
+    if before is None:
+        return "create"
+    if after is None:
+        return "delete"
+    return "update"
+
+
+def diff_snapshots(before: Optional[dict], after: Optional[dict]) -> dict[str, list]:
+    """
+    Field-level diff {field: [old, new]}: the changed fields of an update, every
+    field of a create (before=None) or delete (after=None).
+    """
+    if before is None:
+        return {k: [None, v] for k, v in sorted((after or {}).items())}
+    if after is None:
+        return {k: [v, None] for k, v in sorted(before.items())}
+    return {
+        k: [before.get(k), after.get(k)]
+        for k in sorted(set(before) | set(after))
+        if before.get(k) != after.get(k)
+    }
+
+
+def compact_meta(meta: Optional[dict]) -> dict:
+    """
+    Replace full {"before": ..., "after": ...} snapshots in meta (dicts, or None
+    for a side that didn't exist) with "op", the "changes" diff and, for an
+    update, the unchanged identifying fields in "ref".
+    """
+    meta = dict(meta or {})
+    if "before" not in meta or "after" not in meta:
+        return meta
+    before, after = meta["before"], meta["after"]
+    if before is after is None or not all(v is None or isinstance(v, dict) for v in (before, after)):
+        return meta
+    del meta["before"], meta["after"]
+    meta["op"] = snapshot_op(before, after)
+    meta["changes"] = diff_snapshots(before, after)
+    if before is not None and after is not None:
+        ref = {k: after[k] for k in SNAPSHOT_IDENTITY_FIELDS if k in after and before.get(k) == after[k]}
+        if ref:
+            meta["ref"] = ref
+    return meta
+
+
 class AuditEvent(models.Model):
     actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="audit_actor")
     target_user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="audit_target")
     action = models.CharField(max_length=190, db_index=True)
     meta = models.JSONField(default=dict, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True, default="")
+    ua = models.ForeignKey(UserAgent, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
     created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
@@ -72,6 +156,10 @@ class AuditEvent(models.Model):
     def __str__(self) -> str:
         return f"{self.created_at:%Y-%m-%d %H:%M} {self.action}"
 
+    @property
+    def user_agent(self) -> str:
+        return self.ua.value if self.ua_id else ""
+
 
 class PermissionRequest(models.Model):
     class Status(models.TextChoices):
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Optional
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY_SECONDS = 2.0
+
+
+class PermissionRegistry:
+    """
+    In-memory set of known permission codes.
+
+    - Loaded once per process (existing DB codes + everything reachable from
+      the URL resolver, via iam.signals._walk).
+    - ``ensure()`` is a pure set lookup on the hot path; unknown codes are queued
+      and upserted in batches by a background thread (bulk_create ignore_conflicts),
+      so requests never touch the permission table.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._known: set[str] = set()
+        self._pending: dict[str, tuple[str, str]] = {}
+        self._loaded = False
+        self._timer: Optional[threading.Timer] = None
+
+    # -----------------------------
+    # Startup
+    # -----------------------------
+    def load(self) -> None:
+        if self._loaded:
+            return
+        from django.urls import get_resolver
+
+        from .models import Permission
+        from .signals import _walk
+
+        try:
+            known = set(Permission.objects.values_list("code", flat=True))
+        except Exception:
+            logger.exception("PermissionRegistry: could not read existing permissions")
+            known = set()
+
+        with self._lock:
+            self._known |= known
+            self._loaded = True
+
+        try:
+            for ns, name in _walk(get_resolver().url_patterns, ""):
+                if ns:
+                    self.ensure(f"{ns}.access", name=f"دخول {ns}", module=ns)
+                    if name:
+                        self.ensure(f"{ns}.{name}", name=f"{ns}.{name}", module=ns)
+        except Exception:
+            logger.exception("PermissionRegistry: URL resolver walk failed")
+
+    # -----------------------------
+    # Hot path
+    # -----------------------------
+    def is_known(self, code: str) -> bool:
+        return code in self._known
+
+    def ensure(self, code: str, name: str = "", module: str = "") -> None:
+        if code in self._known:
+            return
+        with self._lock:
+            if code in self._known:
+                return
+            self._known.add(code)
+            self._pending[code] = (
+                name or code,
+                module or (code.split(".", 1)[0] if "." in code else ""),
+            )
+            if self._timer is None:
+                self._timer = threading.Timer(FLUSH_DELAY_SECONDS, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    # -----------------------------
+    # Background upsert
+    # -----------------------------
+    def flush(self) -> int:
+        from .services import ensure_permissions
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+        if not pending:
+            return 0
+        try:
+            ensure_permissions(pending)
+        except Exception:
+            logger.exception("PermissionRegistry: flush of %d codes failed", len(pending))
+            with self._lock:
+                self._known.difference_update(pending)
+            return 0
+        return len(pending)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:
+            # this thread's own DB connections
+            connections.close_all()
+
+
+registry = PermissionRegistry()
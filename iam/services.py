@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import logging
-from functools import lru_cache
+import threading
+import uuid
 from typing import Any, Optional
 
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import IntegerField, Q, Value
 from django.utils import timezone
 
 from accounts.models import UserRole
-from .models import AuditEvent, Permission, RolePermission, UserPermission
+from .audit_buffer import audit_buffer
+from .models import Permission, compact_meta, RolePermission, UserPermission
 
 logger = logging.getLogger(__name__)
 
@@ -22,38 +26,132 @@ def get_client_ip(request) -> Optional[str]:
         return None
 
 def audit(request, *, action: str, target_user=None, meta: Optional[dict[str, Any]] = None) -> None:
+    """
+    Queue an AuditEvent on the buffered writer (iam.audit_buffer).
+    Inside a transaction the event is queued only if it commits.
+    """
     try:
-        AuditEvent.objects.create(
-            actor=getattr(request, "user", None) if getattr(getattr(request, "user", None), "is_authenticated", False) else None,
-            target_user=target_user,
-            action=action,
-            meta=meta or {},
-            ip_address=get_client_ip(request),
-            user_agent=(request.META.get("HTTP_USER_AGENT") or "")[:4000],
-        )
+        user = getattr(request, "user", None)
+        event = {
+            "actor_id": user.pk if getattr(user, "is_authenticated", False) else None,
+            "target_user_id": getattr(target_user, "pk", None),
+            "action": action,
+            "meta": compact_meta(meta),
+            "ip_address": get_client_ip(request),
+            "user_agent": (request.META.get("HTTP_USER_AGENT") or "")[:4000],
+            "created_at": timezone.now().isoformat(),
+        }
+        transaction.on_commit(lambda: audit_buffer.add(event))
     except Exception:
         logger.exception("Failed to write audit event: %s", action)
 
-@lru_cache(maxsize=50000)
-def _cached_user_perm(user_id: int, perm_code: str) -> Optional[bool]:
-    # Return True/False if explicitly set on user, else None
-    row = (UserPermission.objects
-           .filter(user_id=user_id, permission__code=perm_code, permission__is_active=True)
-           .select_related("permission")
-           .first())
-    if row is None:
-        return None
-    return bool(row.allow)
-
-@lru_cache(maxsize=50000)
-def _cached_role_perm(role: str, perm_code: str) -> Optional[bool]:
-    row = (RolePermission.objects
-           .filter(role=role, permission__code=perm_code, permission__is_active=True)
-           .select_related("permission")
-           .first())
-    if row is None:
-        return None
-    return bool(row.allow)
+# -----------------------------
+# Permission cache
+# -----------------------------
+# Snapshot: the user's effective allowed codes, loaded in one query and kept on
+#   request.user for the rest of the request (middleware, decorators, templates).
+# L1: per-process dict user_id -> (generations, role, snapshot).
+# L2: shared generation tokens in the Django cache (one per user / role + a
+# global one). A bump stores a fresh random token, so every other worker's L1
+# entries for that scope stop matching; generations are read once per request
+# (memoised on the request's user object). Tokens never repeat: an evicted or
+# unreadable token is replaced by a new one, which forces a reload instead of
+# matching an old L1 entry (a counter would restart at 0).
+PERM_CACHE_PREFIX = "iam:perm"
+PERM_L1_MAXSIZE = 10000
+
+_l1_lock = threading.Lock()
+_snapshot_l1: dict[int, tuple[tuple[str, str, str], str, frozenset[str]]] = {}
+
+
+def _gen_key(scope: str, ident: Any = "*") -> str:
+    return f"{PERM_CACHE_PREFIX}:gen:{scope}:{ident}"
+
+
+def _new_token() -> str:
+    return uuid.uuid4().hex
+
+
+def _bump_generation(key: str) -> None:
+    try:
+        cache.set(key, _new_token(), timeout=None)
+    except Exception:
+        logger.exception("Failed to bump permission cache generation: %s", key)
+
+
+def _perm_generations(user) -> tuple[str, str, str]:
+    """(global, user, role) generation tokens; fetched once per user instance (= once per request)."""
+    gens = getattr(user, "_iam_perm_gens", None)
+    if gens is not None:
+        return gens
+    role = getattr(user, "role", "") or ""
+    keys = [_gen_key("all"), _gen_key("user", int(user.id)), _gen_key("role", role)]
+    try:
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # first use or evicted: publish a new token (another worker may win the add)
+                cache.add(key, _new_token(), timeout=None)
+                found[key] = cache.get(key)
+    except Exception:
+        logger.exception("Failed to read permission cache generations")
+        found = {}
+    # a token still unknown gets a one-off value: this request reloads, nothing can match it
+    gens = tuple(found.get(k) or _new_token() for k in keys)
+    try:
+        user._iam_perm_gens = gens
+    except Exception:
+        pass
+    return gens
+
+
+def _load_effective_perms(user_id: int, role: str) -> frozenset[str]:
+    """Allowed codes for a user: user overrides win over role defaults. One query."""
+    user_rows = (UserPermission.objects
+                 .filter(user_id=user_id, permission__is_active=True)
+                 .annotate(src=Value(0, output_field=IntegerField()))
+                 .values_list("permission__code", "allow", "src"))
+    role_rows = (RolePermission.objects
+                 .filter(role=role, permission__is_active=True)
+                 .annotate(src=Value(1, output_field=IntegerField()))
+                 .values_list("permission__code", "allow", "src"))
+
+    decided: dict[str, bool] = {}
+    overridden: set[str] = set()
+    for code, allow, src in user_rows.union(role_rows, all=True):
+        if src == 0:
+            overridden.add(code)
+            decided[code] = bool(allow)
+        elif code not in overridden:
+            decided[code] = bool(allow)
+    return frozenset(code for code, allow in decided.items() if allow)
+
+
+def get_perm_snapshot(user) -> frozenset[str]:
+    """Effective allowed permission codes of ``user`` (memoised on the instance)."""
+    snap = getattr(user, "_iam_perm_snapshot", None)
+    if snap is not None:
+        return snap
+
+    user_id = int(user.id)
+    role = getattr(user, "role", "") or ""
+    gens = _perm_generations(user)
+    hit = _snapshot_l1.get(user_id)
+    if hit is not None and hit[0] == gens and hit[1] == role:
+        snap = hit[2]
+    else:
+        snap = _load_effective_perms(user_id, role)
+        with _l1_lock:
+            if len(_snapshot_l1) >= PERM_L1_MAXSIZE:
+                _snapshot_l1.clear()
+            _snapshot_l1[user_id] = (gens, role, snap)
+
+    try:
+        user._iam_perm_snapshot = snap
+    except Exception:
+        pass
+    return snap
+
 
 def user_has_perm(user, perm_code: str) -> bool:
     if not user or not getattr(user, "is_authenticated", False):
@@ -63,22 +161,24 @@ def user_has_perm(user, perm_code: str) -> bool:
     if getattr(user, "role", None) == UserRole.SUPER_ADMIN:
         return True
 
-    # User override
-    explicit = _cached_user_perm(int(user.id), perm_code)
-    if explicit is not None:
-        return explicit
+    return perm_code in get_perm_snapshot(user)
 
-    # Role default
-    role = getattr(user, "role", "") or ""
-    rp = _cached_role_perm(role, perm_code)
-    if rp is not None:
-        return rp
 
-    return False
+def invalidate_user_perms(user_id: int) -> None:
+    """Invalidate cached overrides of one user in every worker."""
+    _bump_generation(_gen_key("user", int(user_id)))
+
+
+def invalidate_role_perms(role: str) -> None:
+    """Invalidate cached defaults of one role in every worker."""
+    _bump_generation(_gen_key("role", role or ""))
+
 
 def invalidate_perm_cache() -> None:
-    _cached_user_perm.cache_clear()
-    _cached_role_perm.cache_clear()
+    """Invalidate everything (e.g. a Permission was (de)activated)."""
+    with _l1_lock:
+        _snapshot_l1.clear()
+    _bump_generation(_gen_key("all"))
 
 def ensure_permission(code: str, name: str = "", module: str = "") -> Permission:
     perm, _ = Permission.objects.get_or_create(
@@ -89,3 +189,21 @@ def ensure_permission(code: str, name: str = "", module: str = "") -> Permission
         },
     )
     return perm
+
+
+def ensure_permissions(specs: dict[str, tuple[str, str]]) -> int:
+    """
+    Bulk variant of ensure_permission: ``specs`` maps code -> (name, module).
+    One SELECT for existing codes + one bulk INSERT for the missing ones.
+    Returns the number of codes inserted.
+    """
+    if not specs:
+        return 0
+    existing = set(Permission.objects.filter(code__in=specs).values_list("code", flat=True))
+    missing = [
+        Permission(code=code, name=name or code, module=module or (code.split(".", 1)[0] if "." in code else ""))
+        for code, (name, module) in specs.items()
+        if code not in existing
+    ]
+    Permission.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(missing)
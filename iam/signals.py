@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import logging
-from django.db.models.signals import post_migrate
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.urls import get_resolver, URLPattern, URLResolver
 
-from .services import ensure_permission
+from .services import ensure_permissions, invalidate_perm_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,21 +20,30 @@ def _walk(urlpatterns, namespace_prefix=""):
             name = p.name or ""
             yield namespace_prefix, name
 
+def collect_permission_specs() -> dict[str, tuple[str, str]]:
+    """code -> (name, module) for every permission derivable from the URL resolver."""
+    specs: dict[str, tuple[str, str]] = {}
+    resolver = get_resolver()
+    for ns, name in _walk(resolver.url_patterns, ""):
+        if ns:
+            specs.setdefault(f"{ns}.access", (f"دخول {ns}", ns))
+            if name:
+                specs.setdefault(f"{ns}.{name}", (f"{ns}.{name}", ns))
+    # Core access (home)
+    specs["core.access"] = ("دخول الموقع", "core")
+    specs["core.home"] = ("الصفحة الرئيسية", "core")
+    return specs
+
+
 @receiver(post_migrate)
 def sync_permissions(sender, **kwargs):
-    # Only run once for our app installs, but safe to run multiple times.
+    # post_migrate fires once per installed app: run once per migrate (for iam).
+    if getattr(sender, "name", None) != "iam":
+        return
     try:
-        resolver = get_resolver()
-        namespaces=set()
-        for ns, name in _walk(resolver.url_patterns, ""):
-            if ns:
-                namespaces.add(ns)
-                ensure_permission(f"{ns}.access", name=f"دخول {ns}", module=ns)
-                if name:
-                    ensure_permission(f"{ns}.{name}", name=f"{ns}.{name}", module=ns)
-        # Core access (home)
-        ensure_permission("core.access", name="دخول الموقع", module="core")
-        ensure_permission("core.home", name="الصفحة الرئيسية", module="core")
+        created = ensure_permissions(collect_permission_specs())
+        if created:
+            logger.info("sync_permissions: %d new permissions", created)
     except Exception:
         logger.exception("sync_permissions failed")
 
@@ -53,16 +63,30 @@ def _seed_role_permissions():
         UserRole.ORG_REP: ["core.access", "organizations.access", "courses.access"],
         UserRole.INDIVIDUAL: ["core.access", "individuals.access", "courses.access", "certificates.access"],
     }
-    for role, codes in baseline.items():
-        for code in codes:
-            perm = Permission.objects.filter(code=code).first()
-            if not perm:
-                perm = ensure_permission(code, name=code, module=code.split('.',1)[0])
-            RolePermission.objects.get_or_create(role=role, permission=perm, defaults={"allow": True})
+    codes = {code for codes in baseline.values() for code in codes}
+    ensure_permissions({code: (code, code.split(".", 1)[0]) for code in codes})
+    perm_ids = dict(Permission.objects.filter(code__in=codes).values_list("code", "id"))
+    RolePermission.objects.bulk_create(
+        [
+            RolePermission(role=role, permission_id=perm_ids[code], allow=True)
+            for role, role_codes in baseline.items()
+            for code in role_codes
+        ],
+        ignore_conflicts=True,
+    )
 
 @receiver(post_migrate)
 def seed_role_permissions(sender, **kwargs):
+    if getattr(sender, "name", None) != "iam":
+        return
     try:
         _seed_role_permissions()
     except Exception:
         logger.exception("seed_role_permissions failed")
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_perms_on_permission_change(sender, **kwargs):
+    # (de)activating or removing a code changes the snapshot of every user who had it
+    transaction.on_commit(invalidate_perm_cache)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User, UserRole
+
+from . import audit_search
+from .audit_buffer import AuditBuffer, _try_lock
+from .models import AuditEvent, Permission, RolePermission, compact_meta, diff_snapshots
+from .services import get_perm_snapshot, invalidate_role_perms
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class CompactMetaTests(SimpleTestCase):
+    def test_update_keeps_changes_and_identity(self):
+        meta = compact_meta({
+            "note": "x",
+            "before": {"id": 3, "email": "a@example.com", "role": "admin", "is_active": True},
+            "after": {"id": 3, "email": "a@example.com", "role": "admin", "is_active": False},
+        })
+        self.assertEqual(meta, {
+            "note": "x",
+            "op": "update",
+            "changes": {"is_active": [True, False]},
+            "ref": {"id": 3, "email": "a@example.com", "role": "admin"},
+        })
+
+    def test_create_and_delete_keep_every_field(self):
+        created = compact_meta({"before": None, "after": {"role": "admin", "region_id": None}})
+        self.assertEqual(created["op"], "create")
+        self.assertEqual(created["changes"], {"region_id": [None, None], "role": [None, "admin"]})
+        deleted = compact_meta({"before": {"role": "admin"}, "after": None})
+        self.assertEqual((deleted["op"], deleted["changes"]), ("delete", {"role": ["admin", None]}))
+
+    def test_scalar_before_is_left_alone(self):
+        meta = {"permission": "x.y", "allow": True, "before": None}
+        self.assertEqual(compact_meta(meta), meta)
+        self.assertEqual(compact_meta({"before": True, "after": False}), {"before": True, "after": False})
+
+    def test_diff_of_empty_create_is_not_an_update(self):
+        self.assertEqual(diff_snapshots({}, {"a": None}), {})
+        self.assertEqual(diff_snapshots(None, {"a": None}), {"a": [None, None]})
+
+    def test_backfill_rollback_restores_the_snapshots(self):
+        migration = importlib.import_module("iam.migrations.0003_compact_audit")
+        for meta in [
+            {"note": "x", "before": {"id": 5, "allow": False}, "after": {"id": 5, "allow": True}},
+            {"before": None, "after": {"role": "admin", "region_id": None}},
+            {"before": {"role": "admin"}, "after": None},
+            {"permission": "x.y", "allow": True},
+        ]:
+            self.assertEqual(migration._expand_meta(migration._compact_meta(dict(meta))), meta)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.perm = Permission.objects.create(code="reports.export", name="export")
+        self.link = RolePermission.objects.create(role=UserRole.SUPERVISOR, permission=self.perm, allow=True)
+        self.user = User.objects.create_user(email="sup@example.com", password="x", role=UserRole.SUPERVISOR)
+
+    def snapshot(self):
+        # a fresh instance per "request": nothing memoised on the object
+        return get_perm_snapshot(User.objects.get(pk=self.user.pk))
+
+    def test_role_bump_reaches_cached_snapshot(self):
+        self.assertIn("reports.export", self.snapshot())
+        RolePermission.objects.filter(pk=self.link.pk).update(allow=False)
+        self.assertIn("reports.export", self.snapshot())  # L1 until invalidated
+        invalidate_role_perms(UserRole.SUPERVISOR)
+        self.assertNotIn("reports.export", self.snapshot())
+
+    def test_evicted_generation_forces_reload(self):
+        self.assertIn("reports.export", self.snapshot())
+        RolePermission.objects.filter(pk=self.link.pk).update(allow=False)
+        cache.clear()  # tokens evicted: must not read back as the L1 entry's generation
+        self.assertNotIn("reports.export", self.snapshot())
+
+    def test_permission_deactivation_invalidates(self):
+        self.assertIn("reports.export", self.snapshot())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perm.is_active = False
+            self.perm.save()
+        self.assertNotIn("reports.export", self.snapshot())
+
+
+def _event(action):
+    return {"action": action, "created_at": "2026-01-01T00:00:00+00:00"}
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool_dir = tmp.name
+        override = override_settings(AUDIT_SPOOL_DIR=tmp.name, AUDIT_BUFFER_MAX_AGE=3600)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.buffer = AuditBuffer()
+
+    def tearDown(self):
+        if self.buffer._timer is not None:
+            self.buffer._timer.cancel()
+        if self.buffer._spool is not None:
+            self.buffer._spool.close()
+
+    def _write_spool(self, name, *actions):
+        path = os.path.join(self.spool_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for action in actions:
+                f.write(json.dumps(_event(action)) + "\n")
+        return path
+
+    def test_dead_owner_with_reused_pid_is_recovered(self):
+        # same PID as this process, other token: the owner is gone, the PID was reused
+        path = self._write_spool(f"audit.{os.getpid()}.deadbeef.jsonl", "orphan.event")
+        self.buffer.add(_event("live.event"))
+        self.buffer.flush()
+        self.assertEqual(set(AuditEvent.objects.values_list("action", flat=True)), {"orphan.event", "live.event"})
+        self.assertFalse(os.path.exists(path))
+
+    def test_locked_spool_of_live_process_is_left_alone(self):
+        path = self._write_spool("audit.1.cafebabe.jsonl", "other.worker")
+        with open(path, "r+", encoding="utf-8") as owner:
+            self.assertTrue(_try_lock(owner))
+            self.buffer.add(_event("live.event"))
+            self.buffer.flush()
+        self.assertEqual(list(AuditEvent.objects.values_list("action", flat=True)), ["live.event"])
+        self.assertTrue(os.path.exists(path))
+
+    def test_events_added_during_flush_stay_spooled(self):
+        from . import audit_buffer as module
+
+        real_insert = module._bulk_insert
+
+        def insert_while_adding(events):
+            self.buffer.add(_event("arrived.during.insert"))
+            real_insert(events)
+
+        self.buffer.add(_event("first"))
+        with mock.patch.object(module, "_bulk_insert", side_effect=insert_while_adding):
+            self.assertEqual(self.buffer.flush(), 1)
+        with open(self.buffer._spool_path(), encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["action"] for line in f], ["arrived.during.insert"])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(os.path.getsize(self.buffer._spool_path()), 0)
+
+    def test_failed_insert_keeps_events(self):
+        from . import audit_buffer as module
+
+        self.buffer.add(_event("kept"))
+        with mock.patch.object(module, "_bulk_insert", side_effect=RuntimeError("db down")):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.queue_depth(), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(list(AuditEvent.objects.values_list("action", flat=True)), ["kept"])
+
+    @override_settings(AUDIT_BUFFER_MAX_AGE=5, AUDIT_FLUSH_MAX_BACKOFF=15)
+    def test_failed_flush_rearms_the_timer_with_backoff(self):
+        from . import audit_buffer as module
+
+        self.buffer.add(_event("kept"))
+        retries = []
+        with mock.patch.object(module, "_bulk_insert", side_effect=RuntimeError("db down")):
+            for _ in range(3):
+                self.buffer.flush()
+                retries.append(self.buffer._timer.interval)
+        self.assertEqual(retries, [10, 15, 15])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertIsNone(self.buffer._timer)
+
+    def test_drain_flushes_and_removes_the_spool(self):
+        self.buffer.add(_event("at.exit"))
+        spool = self.buffer._spool_path()
+        self.buffer.drain()
+        self.assertEqual(list(AuditEvent.objects.values_list("action", flat=True)), ["at.exit"])
+        self.assertFalse(spool.exists())
+
+
+class AuditSearchTests(TestCase):
+    def test_search_uses_the_querysets_database(self):
+        qs = AuditEvent.objects.using("default")
+        self.assertIn("MATCH", str(audit_search.search(qs, "login").query))
+        other = mock.Mock(vendor="mysql")
+        with mock.patch.object(audit_search, "connections", {"default": other}):
+            filtered = audit_search.search(qs, "login")
+        self.assertNotIn("MATCH", str(filtered.query))
+
+    def test_postgres_query_prefix_matches_every_term(self):
+        qs = AuditEvent.objects.using("default")
+        with mock.patch.object(audit_search, "connections", {"default": mock.Mock(vendor="postgresql")}):
+            filtered = audit_search.search(qs, "ali.has")
+        self.assertIn("to_tsquery('simple', %s)", filtered.query.where.children[0].rhs.sql)
+        self.assertEqual(filtered.query.where.children[0].rhs.params, ("ali:* & has:*",))
+
+    def test_document_indexes_email_words(self):
+        doc = audit_search.document("login", "ali.hassan@example.com", "", {})
+        self.assertEqual(doc.split(), ["login", "ali.hassan@example.com", "ali", "hassan", "example", "com"])
@@ -26,8 +26,6 @@ def dashboard_view(request: HttpRequest) -> HttpResponse:
     # لذلك نعرضها كقوائم فارغة حاليًا، وعند إضافة apps (courses/certificates)
     # نربطها هنا مع فلترة صارمة حسب المستخدم والمنطقة.
     ctx = {
-        "display_name": request.session.get("display_name") or (request.user.email.split("@")[0]),
-        "region": getattr(getattr(request.user, "region", None), "name", ""),
         "courses": [],
         "certificates": [],
         "active": "dashboard",
@@ -45,8 +43,6 @@ def my_courses_view(request: HttpRequest) -> HttpResponse:
         request,
         "individuals_temp/my_courses.html",
         {
-            "display_name": request.session.get("display_name") or (request.user.email.split("@")[0]),
-            "region": getattr(getattr(request.user, "region", None), "name", ""),
             "courses": [],
             "active": "courses",
         },
@@ -63,8 +59,6 @@ def my_certificates_view(request: HttpRequest) -> HttpResponse:
         request,
         "individuals_temp/my_certificates.html",
         {
-            "display_name": request.session.get("display_name") or (request.user.email.split("@")[0]),
-            "region": getattr(getattr(request.user, "region", None), "name", ""),
             "certificates": [],
             "active": "certs",
         },
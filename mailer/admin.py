@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "to_email", "subject", "account", "priority", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status", "account", "priority", "created_at")
+    search_fields = ("to_email", "subject")
+    readonly_fields = ("created_at", "sent_at", "last_error")
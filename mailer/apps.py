@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from django.apps import AppConfig
+
+
+class MailerConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "mailer"
+    verbose_name = "البريد الصادر"
+
+    def ready(self):
+        from . import checks  # noqa: F401
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_quota_cache(app_configs, **kwargs):
+    """The hourly send quota (mailer.quota) is a cache counter shared by all workers."""
+    from accounts.checks import ATOMIC_CACHE_BACKENDS
+
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend in ATOMIC_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f"{backend} has no atomic incr: concurrent mail workers can go over EMAIL_HOURLY_QUOTA.",
+            hint="Set THQAF_REDIS_URL in production.",
+            id="mailer.W001",
+        )
+    ]
+
+
+@register(Tags.templates, deploy=True)
+def check_email_build(app_configs, **kwargs):
+    """With EMAIL_TEMPLATES_PRECOMPILED the build must match templates/emails."""
+    if not getattr(settings, "EMAIL_TEMPLATES_PRECOMPILED", False):
+        return []
+    from .precompile import stale_templates
+
+    stale = stale_templates()
+    if not stale:
+        return []
+    return [
+        Warning(
+            f"Precompiled e-mail templates are missing or stale ({', '.join(stale)}): the source is served instead.",
+            hint="Run: python manage.py build_email_templates",
+            id="mailer.W002",
+        )
+    ]
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import logging
+import time
+import tracemalloc
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from email_utils import SMTPConnectionPool
+from mailer.merge import COURSE_HTML_TEMPLATE, COURSE_TXT_TEMPLATE, course_notification_merge, send_merge
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark course notifications: per-recipient render_to_string over a materialised "
+        "recipient list vs mail merge (mailer.merge) streamed in chunks. Reports msg/s and "
+        "peak traced memory, against a local aiosmtpd server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=20000)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--port", type=int, default=8026)
+
+    def handle(self, *args, **opts):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError as exc:
+            raise CommandError("pip install aiosmtpd") from exc
+
+        class Handler:
+            received = 0
+
+            async def handle_DATA(self, server, session, envelope):
+                Handler.received += 1
+                return "250 OK"
+
+        # aiosmtpd logs every SMTP command at DEBUG
+        logging.getLogger("mail.log").setLevel(logging.WARNING)
+        controller = Controller(Handler(), hostname="127.0.0.1", port=opts["port"])
+        controller.start()
+        conn_kwargs = dict(
+            backend="django.core.mail.backends.smtp.EmailBackend",
+            host="127.0.0.1", port=opts["port"], use_ssl=False, use_tls=False, timeout=10,
+        )
+        n = opts["recipients"]
+        ctx = {"course_title": "دورة الإسعافات الأولية", "start_at": "2026-11-01", "extra": "", "year": 2026,
+               "logo_url": "", "support_email": "support@example.com"}
+
+        def recipients():
+            for i in range(n):
+                yield f"user{i}@example.com", f"متدرب {i}"
+
+        def naive(pool):
+            rows = list(recipients())
+            messages = []
+            for email, name in rows:
+                c = {**ctx, "recipient_name": name}
+                msg = EmailMultiAlternatives(subject="bench", body=render_to_string(COURSE_TXT_TEMPLATE, c),
+                                             from_email="no-reply@example.com", to=[email])
+                msg.attach_alternative(render_to_string(COURSE_HTML_TEMPLATE, c), "text/html")
+                messages.append(msg)
+            return pool.send_messages(messages)
+
+        def merged(pool):
+            merge = course_notification_merge(course_title=ctx["course_title"], start_at=ctx["start_at"])
+            return send_merge(merge, recipients(), subject="bench", from_email="no-reply@example.com",
+                              chunk_size=opts["chunk_size"], pool=pool, use_quota=False).sent
+
+        results = []
+        try:
+            for label, fn in (("render per recipient", naive), ("mail merge (streamed)", merged)):
+                pool = SMTPConnectionPool("", "", size=1, **conn_kwargs)
+                tracemalloc.start()
+                start = time.perf_counter()
+                sent = fn(pool)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                pool.close_all()
+                results.append((label, sent, elapsed, peak))
+        finally:
+            controller.stop()
+
+        self.stdout.write(f"received={Handler.received} (expected {2 * n})")
+        for label, sent, elapsed, peak in results:
+            self.stdout.write(f"{label:24s} {sent / elapsed:8.1f} msg/s  peak {peak / 1024 / 1024:7.1f} MiB")
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.mail import EmailMultiAlternatives
+
+from email_utils import SMTPConnectionPool, _smtp_connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark: messages/second with a new SMTP connection per message vs the pooled "
+        "connection (email_utils.SMTPConnectionPool), against a local aiosmtpd server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=300)
+        parser.add_argument("--port", type=int, default=8025)
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated server latency per SMTP command group")
+
+    def handle(self, *args, **opts):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError as exc:
+            raise CommandError("pip install aiosmtpd") from exc
+
+        latency = opts["latency_ms"] / 1000
+
+        class Handler:
+            received = 0
+
+            async def handle_EHLO(self, server, session, envelope, hostname, responses):
+                if latency:
+                    time.sleep(latency)
+                session.host_name = hostname
+                return responses
+
+            async def handle_DATA(self, server, session, envelope):
+                Handler.received += 1
+                return "250 OK"
+
+        controller = Controller(Handler(), hostname="127.0.0.1", port=opts["port"])
+        controller.start()
+        conn_kwargs = dict(
+            backend="django.core.mail.backends.smtp.EmailBackend",
+            host="127.0.0.1", port=opts["port"], use_ssl=False, use_tls=False, timeout=10,
+        )
+        n = opts["messages"]
+
+        def make(i):
+            msg = EmailMultiAlternatives(subject=f"bench {i}", body="x", from_email="no-reply@example.com", to=["u@example.com"])
+            msg.attach_alternative("<p>x</p>", "text/html")
+            return msg
+
+        try:
+            start = time.perf_counter()
+            for i in range(n):
+                conn = _smtp_connection("", "", **conn_kwargs)
+                conn.send_messages([make(i)])
+            per_message = time.perf_counter() - start
+
+            pool = SMTPConnectionPool("", "", size=1, **conn_kwargs)
+            start = time.perf_counter()
+            pool.send_messages([make(i) for i in range(n)])
+            pooled = time.perf_counter() - start
+            pool.close_all()
+        finally:
+            controller.stop()
+
+        self.stdout.write(f"received={Handler.received} (expected {2 * n})")
+        self.stdout.write(f"connection per message: {n / per_message:8.1f} msg/s")
+        self.stdout.write(f"pooled connection:      {n / pooled:8.1f} msg/s")
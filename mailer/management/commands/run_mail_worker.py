@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mailer.services import process_outbox, worker_batch_size
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox e-mails (retries with exponential backoff). Run as a long-lived process, or --once from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="process due messages once and exit")
+        parser.add_argument("--batch-size", type=int, default=worker_batch_size())
+        parser.add_argument("--interval", type=float, default=1.0, help="idle poll interval (seconds)")
+
+    def handle(self, *args, **opts):
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        while not self._stop:
+            close_old_connections()
+            sent, failed = process_outbox(opts["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"outbox: sent={sent} failed={failed}")
+            if opts["once"]:
+                break
+            if not (sent or failed):
+                time.sleep(opts["interval"])
+
+    def _request_stop(self, signum, frame):
+        self._stop = True
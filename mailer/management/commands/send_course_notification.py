@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from mailer.merge import MERGE_CHUNK_SIZE, send_course_notification_bulk
+
+
+class Command(BaseCommand):
+    help = "Send a course notification to every active individual (optionally one region) via mail merge."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--title", required=True, help="course title")
+        parser.add_argument("--start-at", default=None)
+        parser.add_argument("--extra", default=None)
+        parser.add_argument("--region", type=int, default=None, help="Region id")
+        parser.add_argument("--chunk-size", type=int, default=MERGE_CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        stats = send_course_notification_bulk(
+            course_title=opts["title"],
+            start_at=opts["start_at"],
+            extra=opts["extra"],
+            region_id=opts["region"],
+            chunk_size=opts["chunk_size"],
+        )
+        self.stdout.write(
+            f"sent={stats.sent} failed={stats.failed} batches={stats.batches} failed_batches={stats.failed_batches} "
+            f"{stats.per_second:.1f} msg/s (waited {stats.deferred_seconds:.0f}s for quota)"
+        )
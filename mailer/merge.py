@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db.models import QuerySet
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import escape
+
+from email_utils import get_pool
+
+from . import quota
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+MERGE_CHUNK_SIZE = 500
+
+COURSE_TXT_TEMPLATE = "emails/course_notification.txt"
+COURSE_HTML_TEMPLATE = "emails/course_notification.html"
+
+
+def _token(field: str) -> str:
+    # plain ASCII marker: survives autoescape unchanged in both bodies
+    return f"@@merge:{field}@@"
+
+
+class MailMerge:
+    """
+    Render a txt/html template pair once for a whole campaign.
+
+    The shared context is rendered a single time with a marker in place of every
+    per-recipient field; ``render()`` then only substitutes those markers
+    (escaped for the HTML body). No template work per recipient.
+    """
+
+    def __init__(
+        self,
+        *,
+        txt_template: str,
+        html_template: Optional[str],
+        ctx: dict,
+        fields: Iterable[str] = ("recipient_name",),
+        defaults: Optional[dict] = None,
+    ) -> None:
+        self.fields = tuple(fields)
+        self.defaults = defaults or {}
+        merged_ctx = {**ctx, **{f: _token(f) for f in self.fields}}
+        self.text = get_template(txt_template).render(merged_ctx)
+        self.html = get_template(html_template).render(merged_ctx) if html_template else None
+        # only markers that actually appear in a body are substituted
+        self._text_fields = [f for f in self.fields if _token(f) in self.text]
+        self._html_fields = [f for f in self.fields if self.html and _token(f) in self.html]
+
+    def render(self, values: dict) -> tuple[str, Optional[str]]:
+        text, html = self.text, self.html
+        for f in self._text_fields:
+            text = text.replace(_token(f), str(values.get(f) or self.defaults.get(f, "")))
+        for f in self._html_fields:
+            html = html.replace(_token(f), escape(values.get(f) or self.defaults.get(f, "")))
+        return text, html
+
+
+@dataclass
+class MergeStats:
+    sent: int = 0
+    failed: int = 0
+    failed_batches: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    deferred_seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.sent / self.seconds if self.seconds else 0.0
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    chunk: list[tuple] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _pk_chunks(qs: QuerySet, size: int) -> Iterator[list[tuple]]:
+    """
+    Rows of ``qs`` (a values_list) ``size`` at a time, each chunk its own
+    ``pk > last`` query: no cursor or read snapshot stays open between chunks,
+    and the next chunk is only read once the previous one is sent.
+    """
+    fields = qs.query.values_select
+    qs = qs.order_by("pk").values_list("pk", *fields)
+    last_pk = None
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        rows = list(page[:size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+
+def send_merge(
+    merge: MailMerge,
+    recipients: Iterable[tuple[str, str]] | QuerySet,
+    *,
+    subject: str,
+    from_email: str,
+    reply_to: Optional[str] = None,
+    chunk_size: int = MERGE_CHUNK_SIZE,
+    account: str = OutboxMessage.Account.NO_REPLY,
+    pool=None,
+    use_quota: bool = True,
+) -> MergeStats:
+    """
+    Send one merged message per (email, recipient_name) pair.
+
+    Recipients are consumed lazily and sent ``chunk_size`` at a time over the
+    account's pooled connection, so memory holds one chunk of messages at most.
+    A values_list QuerySet of (email, recipient_name) is read by primary key
+    ranges, one query per chunk, so waiting for quota holds no open cursor.
+    A refused recipient or rejected message is logged and counted in ``failed``;
+    the rest of its chunk and the campaign go on. ``failed_batches`` counts the
+    chunk parts with at least one failure.
+
+    Each chunk draws bulk-priority tokens from the account's hourly quota
+    (mailer.quota); when the bulk share is used up the campaign waits for the
+    next window, leaving the rest of the quota to OTP/transactional mail.
+    Tokens of the messages that failed are released.
+    """
+    pool = pool or get_pool(account)
+    stats = MergeStats()
+
+    def on_error(msg: EmailMultiAlternatives, exc: Exception) -> None:
+        stats.failed += 1
+        logger.warning("Mail merge: message to %s failed: %s", msg.to[0], exc)
+    started = time.perf_counter()
+    if isinstance(recipients, QuerySet):
+        chunks = _pk_chunks(recipients, chunk_size)
+    else:
+        chunks = _chunks(iter(recipients), chunk_size)
+    for chunk in chunks:
+        messages = []
+        for email, name in chunk:
+            if not email:
+                continue
+            text, html = merge.render({"recipient_name": name})
+            msg = EmailMultiAlternatives(
+                subject=subject,
+                body=text,
+                from_email=from_email,
+                to=[email],
+                reply_to=[reply_to] if reply_to else None,
+            )
+            if html:
+                msg.attach_alternative(html, "text/html")
+            messages.append(msg)
+        stats.batches += 1
+        while messages:
+            if use_quota:
+                granted, window = quota.try_acquire(account, len(messages), OutboxMessage.Priority.BULK)
+            else:
+                granted, window = len(messages), None
+            if not granted:
+                wait = quota.seconds_to_refill()
+                logger.info("Mail merge: %s bulk quota used up, waiting %.0fs for the next window", account, wait)
+                stats.deferred_seconds += wait
+                time.sleep(wait)
+                continue
+            part, messages = messages[:granted], messages[granted:]
+            failed_before = stats.failed
+            stats.sent += pool.send_messages(part, on_error=on_error)
+            if stats.failed > failed_before:
+                stats.failed_batches += 1
+                if use_quota:
+                    quota.release(account, stats.failed - failed_before, window)
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        "Mail merge: %d sent, %d failed in %d batches — %.1f msg/s",
+        stats.sent, stats.failed, stats.batches, stats.per_second,
+    )
+    return stats
+
+
+def course_notification_recipients(*, region_id: Optional[int] = None):
+    """(email, full_name) of active individuals; send_merge reads it by pk chunks."""
+    from accounts.models import User, UserRole
+
+    qs = User.objects.filter(role=UserRole.INDIVIDUAL, is_active=True).exclude(email="")
+    if region_id:
+        qs = qs.filter(region_id=region_id)
+    return qs.order_by("pk").values_list("email", "individual_profile__full_name")
+
+
+def course_notification_merge(*, course_title: str, start_at: Optional[str] = None, extra: Optional[str] = None) -> MailMerge:
+    from accounts.views import _logo_url_default, _support_email
+
+    return MailMerge(
+        txt_template=COURSE_TXT_TEMPLATE,
+        html_template=COURSE_HTML_TEMPLATE,
+        ctx={
+            "course_title": course_title,
+            "start_at": start_at,
+            "extra": extra,
+            "year": timezone.now().year,
+            "logo_url": _logo_url_default(),
+            "support_email": _support_email(),
+        },
+        # same fallback as the template's |default for a missing name
+        defaults={"recipient_name": "بك"},
+    )
+
+
+def send_course_notification_bulk(
+    *,
+    course_title: str,
+    start_at: Optional[str] = None,
+    extra: Optional[str] = None,
+    region_id: Optional[int] = None,
+    chunk_size: int = MERGE_CHUNK_SIZE,
+) -> MergeStats:
+    from accounts.views import _no_reply_email, _support_email
+
+    return send_merge(
+        course_notification_merge(course_title=course_title, start_at=start_at, extra=extra),
+        course_notification_recipients(region_id=region_id),
+        subject=f"إشعار دورة تدريبية: {course_title}",
+        from_email=f"{settings.THQAF_EMAIL_FROM_NAME} <{_no_reply_email()}>",
+        reply_to=_support_email(),
+        chunk_size=chunk_size,
+    )
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254, verbose_name='إلى')),
+                ('from_email', models.CharField(max_length=255, verbose_name='من')),
+                ('reply_to', models.CharField(blank=True, default='', max_length=255, verbose_name='الرد إلى')),
+                ('subject', models.CharField(max_length=255, verbose_name='الموضوع')),
+                ('txt_template', models.CharField(max_length=200, verbose_name='قالب النص')),
+                ('html_template', models.CharField(blank=True, default='', max_length=200, verbose_name='قالب HTML')),
+                ('context', models.JSONField(blank=True, default=dict, verbose_name='بيانات القالب')),
+                ('status', models.CharField(choices=[('pending', 'بانتظار الإرسال'), ('sending', 'قيد الإرسال'), ('sent', 'أُرسلت'), ('failed', 'فشلت')], default='pending', max_length=16, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='المحاولة القادمة')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الإرسال')),
+            ],
+            options={
+                'verbose_name': 'رسالة صادرة',
+                'verbose_name_plural': 'البريد الصادر',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='mailer_outb_status_bc9948_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='account',
+            field=models.CharField(choices=[('no_reply', 'لا يُرد (EMAIL_HOST_USER)'), ('support', 'الدعم (THQAF_SUPPORT_EMAIL)')], default='no_reply', max_length=16, verbose_name='حساب الإرسال'),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'رمز تحقق'), (1, 'معاملات'), (2, 'إشعارات جماعية')], default=1, verbose_name='الأولوية'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['status', 'account', 'priority', 'next_attempt_at'], name='mailer_outb_status_f86ed1_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    """
+    رسالة بريد بانتظار الإرسال (Transactional Outbox).
+    تُكتب داخل نفس المعاملة التي أنشأتها، ويرسلها run_mail_worker بعد الـ commit.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "بانتظار الإرسال"
+        SENDING = "sending", "قيد الإرسال"
+        SENT = "sent", "أُرسلت"
+        FAILED = "failed", "فشلت"
+
+    class Account(models.TextChoices):
+        NO_REPLY = "no_reply", "لا يُرد (EMAIL_HOST_USER)"
+        SUPPORT = "support", "الدعم (THQAF_SUPPORT_EMAIL)"
+
+    class Priority(models.IntegerChoices):
+        # lower value = sent first
+        OTP = 0, "رمز تحقق"
+        TRANSACTIONAL = 1, "معاملات"
+        BULK = 2, "إشعارات جماعية"
+
+    to_email = models.EmailField(verbose_name="إلى")
+    from_email = models.CharField(max_length=255, verbose_name="من")
+    reply_to = models.CharField(max_length=255, blank=True, default="", verbose_name="الرد إلى")
+    subject = models.CharField(max_length=255, verbose_name="الموضوع")
+    txt_template = models.CharField(max_length=200, verbose_name="قالب النص")
+    html_template = models.CharField(max_length=200, blank=True, default="", verbose_name="قالب HTML")
+    context = models.JSONField(default=dict, blank=True, verbose_name="بيانات القالب")
+    account = models.CharField(
+        max_length=16, choices=Account.choices, default=Account.NO_REPLY, verbose_name="حساب الإرسال"
+    )
+    priority = models.PositiveSmallIntegerField(
+        choices=Priority.choices, default=Priority.TRANSACTIONAL, verbose_name="الأولوية"
+    )
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, verbose_name="الحالة")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="عدد المحاولات")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="المحاولة القادمة")
+    last_error = models.TextField(blank=True, default="", verbose_name="آخر خطأ")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="تاريخ الإرسال")
+
+    class Meta:
+        verbose_name = "رسالة صادرة"
+        verbose_name_plural = "البريد الصادر"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["status", "account", "priority", "next_attempt_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.to_email} - {self.subject} ({self.get_status_display()})"
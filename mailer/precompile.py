@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = "emails"
+# source digest per built template, written next to the build
+BUILD_MANIFEST = ".manifest.json"
+
+VOID_TAGS = {"area", "base", "br", "col", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+_STYLE_RE = re.compile(r"<style[^>]*>(.*?)</style>\s*", re.S | re.I)
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_HTML_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*?)(/?)>")
+_ATTR_RE = re.compile(r"""\s([a-zA-Z_:-]+)\s*=\s*("[^"]*"|'[^']*')""")
+_COMPOUND_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9]*)?((?:\.[\w-]+)*)(#[\w-]+)?((?:\.[\w-]+)*)$")
+_VAR_RE = re.compile(r"var\(\s*(--[\w-]+)\s*(?:,\s*([^)]+))?\)")
+_EXTENDS_RE = re.compile(r"""\{%\s*extends\s+["']([^"']+)["']\s*%\}""")
+_BLOCK_RE = re.compile(r"\{%\s*block\s+\w+\s*%\}")
+
+
+# -----------------------------
+# CSS
+# -----------------------------
+def _split_rules(css: str) -> list[tuple[str, str]]:
+    """Top-level (prelude, body) pairs; at-rule bodies (@media ...) are kept whole."""
+    css = _CSS_COMMENT_RE.sub("", css)
+    rules, depth, start, prelude = [], 0, 0, ""
+    for i, ch in enumerate(css):
+        if ch == "{":
+            if depth == 0:
+                prelude, start = css[:i].rsplit("}", 1)[-1].strip(), i + 1
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[start:i].strip()))
+    return rules
+
+
+def _declarations(body: str) -> list[tuple[str, str]]:
+    out = []
+    for decl in body.split(";"):
+        prop, sep, value = decl.partition(":")
+        if sep and prop.strip():
+            out.append((prop.strip().lower(), " ".join(value.split())))
+    return out
+
+
+def _parse_selector(selector: str) -> Optional[list[tuple[Optional[str], frozenset, Optional[str]]]]:
+    """Descendant chain of compound selectors (tag.class#id), or None if unsupported."""
+    parts = []
+    for compound in selector.split():
+        m = _COMPOUND_RE.match(compound)
+        if not m:
+            return None
+        tag, classes_a, id_, classes_b = m.groups()
+        classes = frozenset(c for c in (classes_a + classes_b).split(".") if c)
+        parts.append(((tag or "").lower() or None, classes, id_[1:] if id_ else None))
+    return parts or None
+
+
+def _specificity(parts) -> tuple[int, int, int]:
+    return (
+        sum(1 for _, _, i in parts if i),
+        sum(len(c) for _, c, _ in parts),
+        sum(1 for t, _, _ in parts if t),
+    )
+
+
+class Stylesheet:
+    """Rules of a template's <style> blocks, split into inlinable and residual."""
+
+    def __init__(self, css: str) -> None:
+        self.variables: dict[str, str] = {}
+        self.rules: list[tuple[tuple[int, int, int], int, list, list[tuple[str, str]]]] = []
+        residual: list[str] = []
+        for prelude, body in _split_rules(css):
+            if prelude.startswith("@"):
+                residual.append(f"{prelude}{{{body}}}")
+                continue
+            decls = _declarations(body)
+            kept = []
+            for selector in (s.strip() for s in prelude.split(",")):
+                if selector == ":root":
+                    self.variables.update((p, v) for p, v in decls if p.startswith("--"))
+                    continue
+                parts = _parse_selector(selector)
+                if parts is None:
+                    kept.append(selector)
+                else:
+                    self.rules.append((_specificity(parts), len(self.rules), parts, decls))
+            if kept:
+                residual.append(f"{','.join(kept)}{{{';'.join(f'{p}:{v}' for p, v in decls)}}}")
+        self.rules.sort(key=lambda r: (r[0], r[1]))
+        self.residual = self.resolve("".join(residual))
+
+    def resolve(self, value: str) -> str:
+        """Replace var(--x) with the :root value (many mail clients drop custom properties)."""
+        for _ in range(5):
+            new = _VAR_RE.sub(lambda m: self.variables.get(m.group(1), (m.group(2) or "").strip()) or m.group(0), value)
+            if new == value:
+                break
+            value = new
+        return value
+
+    def styles_for(self, stack: list[tuple[str, frozenset, Optional[str]]]) -> list[tuple[str, str]]:
+        merged: dict[str, str] = {}
+        for _, _, parts, decls in self.rules:
+            if _matches(parts, stack):
+                for prop, value in decls:
+                    if not prop.startswith("--"):
+                        merged.pop(prop, None)
+                        merged[prop] = self.resolve(value)
+        return list(merged.items())
+
+
+def _compound_matches(part, element) -> bool:
+    tag, classes, id_ = part
+    el_tag, el_classes, el_id = element
+    return (tag is None or tag == el_tag) and classes <= el_classes and (id_ is None or id_ == el_id)
+
+
+def _matches(parts, stack) -> bool:
+    if not stack or not _compound_matches(parts[-1], stack[-1]):
+        return False
+    i = len(stack) - 2
+    for part in reversed(parts[:-1]):
+        while i >= 0 and not _compound_matches(part, stack[i]):
+            i -= 1
+        if i < 0:
+            return False
+        i -= 1
+    return True
+
+
+# -----------------------------
+# HTML
+# -----------------------------
+def _element(tag: str, attrs: str) -> tuple[str, frozenset, Optional[str]]:
+    values = {k.lower(): v[1:-1] for k, v in _ATTR_RE.findall(" " + attrs)}
+    classes = frozenset(c for c in values.get("class", "").split() if "{" not in c and "}" not in c)
+    return tag, classes, values.get("id")
+
+
+def _with_style(attrs: str, decls: list[tuple[str, str]]) -> str:
+    inlined = ";".join(f"{p}:{v}" for p, v in decls).replace('"', "'")
+    m = re.search(r"""\sstyle\s*=\s*("([^"]*)"|'([^']*)')""", attrs)
+    if m:
+        # the element's own style attribute wins over stylesheet rules
+        own = (m.group(2) if m.group(2) is not None else m.group(3)).strip().rstrip(";")
+        return attrs[: m.start()] + f' style="{inlined};{own}"' + attrs[m.end():]
+    return f'{attrs.rstrip()} style="{inlined}"'
+
+
+def _walk(html: str, sheet: Optional[Stylesheet], stack: list):
+    """Inline ``sheet`` into every element of ``html`` (``stack`` = ancestors)."""
+    out, pos, in_head = [], 0, False
+    for m in _TAG_RE.finditer(html):
+        closing, tag, attrs, self_closing = m.group(1), m.group(2).lower(), m.group(3), m.group(4)
+        out.append(html[pos:m.start()])
+        pos = m.end()
+        if tag == "head":
+            in_head = not closing
+        if closing:
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == tag:
+                    del stack[i:]
+                    break
+            out.append(m.group(0))
+            continue
+        element = _element(tag, attrs)
+        stack.append(element)
+        decls = sheet.styles_for(stack) if sheet and not in_head and tag not in ("html", "head") else []
+        out.append(f"<{tag}{_with_style(attrs, decls) if decls else attrs}{self_closing}>")
+        if self_closing or tag in VOID_TAGS:
+            stack.pop()
+    out.append(html[pos:])
+    return "".join(out), stack
+
+
+def minify(html: str) -> str:
+    html = _HTML_COMMENT_RE.sub("", html)
+    # whitespace with a line break between two tags / template tags is layout only
+    html = re.sub(r"(>|%\})\s*\n\s*(<|\{%)", r"\1\2", html)
+    html = re.sub(r"[ \t]*\n\s*", " ", html)
+    return html.strip()
+
+
+def inline_css(source: str, parent_source: Optional[str] = None) -> str:
+    """
+    Move <style> rules onto the elements' style attributes. Selectors the
+    inliner cannot match (pseudo-classes, @media, ...) stay in a <style> block.
+    For a child template the parent's stylesheet applies to its blocks, with
+    the parent's elements around the first block as ancestors.
+    """
+    css_source = parent_source if parent_source is not None else source
+    sheet = Stylesheet("".join(_STYLE_RE.findall(css_source)))
+
+    if parent_source is not None:
+        block = _BLOCK_RE.search(parent_source)
+        _, ancestors = _walk(parent_source[: block.start()] if block else "", None, [])
+        html, _ = _walk(source, sheet, ancestors)
+        return html
+
+    blocks = iter(range(len(_STYLE_RE.findall(source))))
+    # first <style> keeps the residual rules, any others go away
+    html = _STYLE_RE.sub(
+        lambda m: f"<style>{sheet.residual}</style>" if next(blocks) == 0 and sheet.residual else "", source
+    )
+    html, _ = _walk(html, sheet, [])
+    return html
+
+
+# -----------------------------
+# Build
+# -----------------------------
+def source_dir() -> Path:
+    return Path(settings.BASE_DIR) / "templates" / EMAIL_TEMPLATE_DIR
+
+
+def build_dir() -> Path:
+    return Path(getattr(settings, "EMAIL_TEMPLATE_BUILD_DIR", settings.BASE_DIR / "var" / "email_build"))
+
+
+def _sources(name: str) -> tuple[str, Optional[str]]:
+    """Source of ``emails/<name>`` and of the e-mail template it extends (if any)."""
+    source = (source_dir() / name).read_text(encoding="utf-8")
+    m = _EXTENDS_RE.search(source)
+    if m and m.group(1).startswith(f"{EMAIL_TEMPLATE_DIR}/"):
+        return source, (source_dir() / m.group(1).split("/", 1)[1]).read_text(encoding="utf-8")
+    return source, None
+
+
+def source_digest(name: str) -> str:
+    """Hash of everything the build of ``emails/<name>`` is made from."""
+    source, parent_source = _sources(name)
+    return hashlib.sha256(f"{source}\0{parent_source or ''}".encode("utf-8")).hexdigest()
+
+
+def compile_email_template(name: str) -> str:
+    """Inlined + minified source of ``emails/<name>`` (still a Django template)."""
+    return minify(inline_css(*_sources(name)))
+
+
+def build_all(out_dir: Optional[Path] = None) -> list[tuple[str, int, int]]:
+    """
+    Write the compiled HTML e-mail templates to ``<out_dir>/emails/``, with a
+    manifest of their source digests. Returns (name, source bytes, built bytes)
+    per template.
+    """
+    target = (out_dir or build_dir()) / EMAIL_TEMPLATE_DIR
+    target.mkdir(parents=True, exist_ok=True)
+    results, manifest = [], {}
+    for path in sorted(source_dir().glob("*.html")):
+        built = compile_email_template(path.name)
+        (target / path.name).write_text(built, encoding="utf-8")
+        manifest[path.name] = source_digest(path.name)
+        results.append((path.name, path.stat().st_size, len(built.encode("utf-8"))))
+    (target / BUILD_MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return results
+
+
+def stale_templates(out_dir: Optional[Path] = None) -> list[str]:
+    """HTML e-mail templates whose build is missing or older than their source."""
+    try:
+        manifest = json.loads(((out_dir or build_dir()) / EMAIL_TEMPLATE_DIR / BUILD_MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    return [
+        path.name for path in sorted(source_dir().glob("*.html"))
+        if manifest.get(path.name) != source_digest(path.name)
+    ]
+
+
+class PrecompiledEmailLoader(FilesystemLoader):
+    """
+    Serves ``emails/*.html`` from EMAIL_TEMPLATE_BUILD_DIR while the build
+    matches its source; a stale or missing build is logged and the next loader
+    serves the source instead. Goes first, inside the cached loader, so the
+    check runs once per template and process.
+    """
+
+    def get_dirs(self):
+        return [build_dir()]
+
+    def get_template_sources(self, template_name):
+        folder, _, name = template_name.rpartition("/")
+        if folder != EMAIL_TEMPLATE_DIR or not name.endswith(".html"):
+            return
+        if name in stale_templates():
+            logger.error(
+                "E-mail template %s: precompiled build is missing or stale, serving the source. "
+                "Run: python manage.py build_email_templates", template_name,
+            )
+            return
+        yield from super().get_template_sources(template_name)
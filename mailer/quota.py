@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+QUOTA_CACHE_PREFIX = "mailer:quota"
+WINDOW_SECONDS = 3600
+
+DEFAULT_HOURLY_QUOTA = {"no_reply": 500, "support": 100}
+# share of the hourly quota kept free for higher priorities (by Priority value):
+# bulk stops at 80% used, transactional at 95%, OTP may use everything
+DEFAULT_RESERVE = {0: 0.0, 1: 0.05, 2: 0.20}
+
+
+class Grant(NamedTuple):
+    granted: int
+    # the hour the tokens came from: release() gives them back to that bucket
+    window: int
+
+
+def hourly_quota(account: str) -> int:
+    quotas = {**DEFAULT_HOURLY_QUOTA, **getattr(settings, "EMAIL_HOURLY_QUOTA", {})}
+    return int(quotas.get(account, 0))
+
+
+def _reserve(priority: int) -> float:
+    return float({**DEFAULT_RESERVE, **getattr(settings, "EMAIL_QUOTA_RESERVE", {})}.get(int(priority), 0.0))
+
+
+def _window(now: float | None = None) -> int:
+    return int((now or time.time()) // WINDOW_SECONDS)
+
+
+def _key(account: str, window: int) -> str:
+    return f"{QUOTA_CACHE_PREFIX}:{account}:{window}"
+
+
+def seconds_to_refill(now: float | None = None) -> float:
+    now = now or time.time()
+    return (_window(now) + 1) * WINDOW_SECONDS - now
+
+
+def limit_for(account: str, priority: int) -> int:
+    """How many sends of ``priority`` the account's bucket allows per window."""
+    quota = hourly_quota(account)
+    return max(int(quota * (1 - _reserve(priority))), 0)
+
+
+def used(account: str) -> int:
+    return int(cache.get(_key(account, _window())) or 0)
+
+
+def try_acquire(account: str, n: int, priority: int) -> Grant:
+    """
+    Take up to ``n`` tokens from the account's bucket for the current hour.
+    Returns how many were granted (0..n) and the window they belong to.
+
+    The bucket is a per-window counter in the shared cache, so every worker
+    process draws from the same quota. It refills at the hour boundary, like the
+    provider's own hourly limit. incr/decr are atomic only on Redis or Memcached
+    (mailer.W001): on FileBasedCache concurrent workers can lose updates and go
+    over the quota.
+    """
+    window = _window()
+    if n <= 0:
+        return Grant(0, window)
+    limit = limit_for(account, priority)
+    key = _key(account, window)
+    cache.add(key, 0, timeout=WINDOW_SECONDS + 60)
+    try:
+        after = cache.incr(key, n)
+    except ValueError:
+        # key expired between add() and incr()
+        cache.set(key, n, timeout=WINDOW_SECONDS + 60)
+        after = n
+    over = after - limit
+    if over <= 0:
+        return Grant(n, window)
+    give_back = min(over, n)
+    cache.decr(key, give_back)
+    return Grant(n - give_back, window)
+
+
+def release(account: str, n: int, window: int) -> None:
+    """
+    Return unused tokens (e.g. messages that could not be sent) to the window
+    they were taken from, never to a later one.
+    """
+    if n > 0:
+        try:
+            cache.decr(_key(account, window), n)
+        except ValueError:
+            pass
+
+
+def snapshot() -> dict[str, dict[str, int]]:
+    accounts = {**DEFAULT_HOURLY_QUOTA, **getattr(settings, "EMAIL_HOURLY_QUOTA", {})}
+    return {
+        account: {"used": used(account), "quota": hourly_quota(account)}
+        for account in accounts
+    }
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from email_utils import get_pool, is_connection_error
+
+from . import quota
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# a claimed message not finished within this lease is picked up again (worker crash)
+SENDING_LEASE_SECONDS = 300
+# SMTP unreachable: the messages wait this long without using up an attempt
+CONNECTION_RETRY_SECONDS = 60
+
+
+def enqueue_email(
+    *,
+    to_email: str,
+    subject: str,
+    txt_template: str,
+    html_template: Optional[str],
+    ctx: dict,
+    from_email: str,
+    reply_to: Optional[str] = None,
+    account: str = OutboxMessage.Account.NO_REPLY,
+    priority: int = OutboxMessage.Priority.TRANSACTIONAL,
+) -> OutboxMessage:
+    """
+    Write the message to the outbox. Call it inside the caller's transaction:
+    the row commits (or rolls back) together with the data that triggered it.
+    """
+    return OutboxMessage.objects.create(
+        account=account,
+        priority=priority,
+        to_email=to_email,
+        subject=subject,
+        txt_template=txt_template,
+        html_template=html_template or "",
+        context=ctx,
+        from_email=from_email,
+        reply_to=reply_to or "",
+    )
+
+
+def build_message(msg: OutboxMessage, connection=None) -> EmailMultiAlternatives:
+    text_body = render_to_string(msg.txt_template, msg.context)
+    html_body = None
+    if msg.html_template:
+        try:
+            html_body = render_to_string(msg.html_template, msg.context)
+        except Exception:
+            html_body = None
+
+    email = EmailMultiAlternatives(
+        subject=msg.subject,
+        body=text_body,
+        from_email=msg.from_email,
+        to=[msg.to_email],
+        reply_to=[msg.reply_to] if msg.reply_to else None,
+        connection=connection,
+    )
+    if html_body:
+        email.attach_alternative(html_body, "text/html")
+    return email
+
+
+def backoff_seconds(attempts: int) -> int:
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+def _due_queryset(now):
+    return OutboxMessage.objects.filter(
+        Q(status=OutboxMessage.Status.PENDING) | Q(status=OutboxMessage.Status.SENDING),
+        next_attempt_at__lte=now,
+    )
+
+
+def claim_due(limit: int) -> list[OutboxMessage]:
+    """
+    Claim up to ``limit`` due messages, highest priority first (OTP, then
+    transactional, then bulk), within each account's hourly quota (mailer.quota).
+    A priority class whose share of the quota is used up stays pending until the
+    bucket refills, so a bulk backlog never delays OTPs.
+
+    Each claim is a conditional UPDATE on (status, next_attempt_at), so concurrent
+    workers never send the same row twice. Each message carries the quota
+    window its token came from (``quota_window``).
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=SENDING_LEASE_SECONDS)
+    claimed_ids: list[int] = []
+    windows: dict[int, int] = {}
+    for priority in OutboxMessage.Priority.values:
+        for account in OutboxMessage.Account.values:
+            room = limit - len(claimed_ids)
+            if room <= 0:
+                break
+            candidates = list(
+                _due_queryset(now).filter(account=account, priority=priority)
+                .order_by("next_attempt_at", "id").values_list("id", "status", "next_attempt_at")[:room]
+            )
+            if not candidates:
+                continue
+            granted, window = quota.try_acquire(account, len(candidates), priority)
+            if granted < len(candidates):
+                logger.debug(
+                    "Mail scheduler: %s quota near limit, deferring %d %s message(s)",
+                    account, len(candidates) - granted, OutboxMessage.Priority(priority).name,
+                )
+            taken = [
+                pk for pk, status, next_at in candidates[:granted]
+                if OutboxMessage.objects.filter(pk=pk, status=status, next_attempt_at=next_at)
+                .update(status=OutboxMessage.Status.SENDING, next_attempt_at=lease_until)
+            ]
+            # rows another worker claimed first
+            quota.release(account, granted - len(taken), window)
+            claimed_ids.extend(taken)
+            windows.update(dict.fromkeys(taken, window))
+    messages = list(OutboxMessage.objects.filter(pk__in=claimed_ids).order_by("priority", "id"))
+    for msg in messages:
+        msg.quota_window = windows[msg.pk]
+    return messages
+
+
+def _mark_sent(msg: OutboxMessage) -> None:
+    OutboxMessage.objects.filter(pk=msg.pk).update(
+        status=OutboxMessage.Status.SENT, sent_at=timezone.now(), attempts=msg.attempts + 1, last_error=""
+    )
+
+
+def _mark_failed(msg: OutboxMessage, exc: Exception) -> None:
+    attempts = msg.attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        status, next_at = OutboxMessage.Status.FAILED, timezone.now()
+    else:
+        status, next_at = OutboxMessage.Status.PENDING, timezone.now() + timedelta(seconds=backoff_seconds(attempts))
+    OutboxMessage.objects.filter(pk=msg.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_at, last_error=f"{type(exc).__name__}: {exc}"[:2000]
+    )
+
+
+def _defer(msg: OutboxMessage, exc: Exception) -> None:
+    """Back to pending without counting an attempt: the server, not the message, failed."""
+    OutboxMessage.objects.filter(pk=msg.pk).update(
+        status=OutboxMessage.Status.PENDING,
+        next_attempt_at=timezone.now() + timedelta(seconds=CONNECTION_RETRY_SECONDS),
+        last_error=f"{type(exc).__name__}: {exc}"[:2000],
+    )
+
+
+def _deliver_account(account: str, messages: list[OutboxMessage]) -> tuple[int, int]:
+    sent = failed = 0
+    pending = list(messages)
+    try:
+        with get_pool(account).connection() as connection:
+            while pending:
+                msg = pending[0]
+                try:
+                    if build_message(msg, connection=connection).send(fail_silently=False) != 1:
+                        raise RuntimeError("Email backend returned sent_count=0")
+                    _mark_sent(msg)
+                    sent += 1
+                except Exception as exc:
+                    if is_connection_error(exc):
+                        raise
+                    # refused recipient / rejected data: only this message fails
+                    logger.warning("Mail worker: delivery of outbox #%s failed: %s", msg.pk, exc)
+                    _mark_failed(msg, exc)
+                    failed += 1
+                pending.pop(0)
+    except Exception as exc:
+        # connect failure / dropped connection: retry the rest later, attempts untouched
+        logger.warning("Mail worker: SMTP connection for %s failed: %s", account, exc)
+        for msg in pending:
+            _defer(msg, exc)
+        failed += len(pending)
+    return sent, failed
+
+
+def deliver(messages: list[OutboxMessage]) -> tuple[int, int]:
+    """
+    Send claimed messages, one pooled SMTP connection per account. Returns (sent, failed).
+    Quota tokens taken by claim_due for messages that failed go back to their window.
+    """
+    groups: dict[tuple[str, Optional[int]], list[OutboxMessage]] = {}
+    for msg in messages:
+        groups.setdefault((msg.account, getattr(msg, "quota_window", None)), []).append(msg)
+    sent = failed = 0
+    for (account, window), msgs in groups.items():
+        s, f = _deliver_account(account, msgs)
+        if window is not None:
+            # failed messages go back to pending and take a new token on retry
+            quota.release(account, f, window)
+        sent += s
+        failed += f
+    return sent, failed
+
+
+def process_outbox(batch_size: int = 50) -> tuple[int, int]:
+    return deliver(claim_due(batch_size))
+
+
+def worker_batch_size() -> int:
+    return int(getattr(settings, "MAILER_BATCH_SIZE", 50))
+
+
+def _seconds(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return round(value.total_seconds(), 1)
+    # SQLite returns duration aggregates as microseconds
+    return round(float(value) / 1_000_000, 1)
+
+
+def outbox_metrics() -> dict:
+    """
+    Queue depth and oldest wait per (account, priority), wait times of messages
+    sent in the last hour per priority, and quota use per account.
+    """
+    now = timezone.now()
+    labels = dict(OutboxMessage.Priority.choices)
+    queues = [
+        {
+            "account": row["account"],
+            "priority": row["priority"],
+            "label": labels.get(row["priority"], row["priority"]),
+            "depth": row["depth"],
+            "oldest_wait_s": round((now - row["oldest"]).total_seconds(), 1),
+        }
+        for row in OutboxMessage.objects.filter(
+            status__in=[OutboxMessage.Status.PENDING, OutboxMessage.Status.SENDING]
+        ).values("account", "priority").annotate(depth=Count("id"), oldest=Min("created_at")).order_by("priority", "account")
+    ]
+    wait = ExpressionWrapper(F("sent_at") - F("created_at"), output_field=DurationField())
+    sent = [
+        {
+            "priority": row["priority"],
+            "label": labels.get(row["priority"], row["priority"]),
+            "sent": row["n"],
+            "avg_wait_s": _seconds(row["avg_wait"]),
+            "max_wait_s": _seconds(row["max_wait"]),
+        }
+        for row in OutboxMessage.objects.filter(
+            status=OutboxMessage.Status.SENT, sent_at__gte=now - timedelta(hours=1)
+        ).values("priority").annotate(n=Count("id"), avg_wait=Avg(wait), max_wait=Max(wait)).order_by("priority")
+    ]
+    return {
+        "queue_depth": sum(q["depth"] for q in queues),
+        "queues": queues,
+        "sent_last_hour": sent,
+        "quota": quota.snapshot(),
+    }
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import smtplib
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.base import BaseEmailBackend
+from django.template import Engine
+from django.test import TestCase, override_settings
+
+from accounts.models import User, UserRole
+from email_utils import SMTPConnectionPool, _pools, is_connection_error, send_no_reply_email
+
+from . import quota
+from .merge import MailMerge, course_notification_recipients, send_merge
+from .models import OutboxMessage
+from .precompile import BUILD_MANIFEST, EMAIL_TEMPLATE_DIR, build_all, source_dir, stale_templates
+from .services import _deliver_account, claim_due, deliver, enqueue_email
+
+FAKE_BACKEND = "mailer.tests.FakeSMTPBackend"
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class FakeSMTPBackend(BaseEmailBackend):
+    """Records sends; refuses REFUSED, drops the connection once for DROP_ONCE and every time for DOWN."""
+
+    REFUSED: set[str] = set()
+    DROP_ONCE: set[str] = set()
+    DOWN: set[str] = set()
+    opened = 0
+    delivered: list[str] = []
+
+    def open(self):
+        FakeSMTPBackend.opened += 1
+        return True
+
+    def send_messages(self, email_messages):
+        count = 0
+        for message in email_messages:
+            to = message.to[0]
+            if to in self.DOWN or to in self.DROP_ONCE:
+                self.DROP_ONCE.discard(to)
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            if to in self.REFUSED:
+                raise smtplib.SMTPRecipientsRefused({to: (550, b"No such user")})
+            FakeSMTPBackend.delivered.append(to)
+            count += 1
+        return count
+
+    @classmethod
+    def reset(cls):
+        cls.REFUSED, cls.DROP_ONCE, cls.DOWN, cls.delivered, cls.opened = set(), set(), set(), [], 0
+
+
+def _message(to: str) -> EmailMultiAlternatives:
+    return EmailMultiAlternatives(subject="s", body="b", from_email="from@example.com", to=[to])
+
+
+class ConnectionErrorTests(TestCase):
+    def test_classification(self):
+        self.assertTrue(is_connection_error(smtplib.SMTPServerDisconnected()))
+        self.assertTrue(is_connection_error(smtplib.SMTPConnectError(421, "busy")))
+        self.assertTrue(is_connection_error(ConnectionResetError()))
+        self.assertTrue(is_connection_error(TimeoutError()))
+        self.assertFalse(is_connection_error(smtplib.SMTPRecipientsRefused({})))
+        self.assertFalse(is_connection_error(smtplib.SMTPDataError(554, b"rejected")))
+        self.assertFalse(is_connection_error(smtplib.SMTPSenderRefused(553, b"no", "from@example.com")))
+
+
+@override_settings(EMAIL_BACKEND=FAKE_BACKEND)
+class PoolTests(TestCase):
+    def setUp(self):
+        FakeSMTPBackend.reset()
+        self.pool = SMTPConnectionPool("user", "pass")
+
+    def test_refused_recipient_keeps_connection_and_batch(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        rejected = []
+        sent = self.pool.send_messages(
+            [_message("a@example.com"), _message("bad@example.com"), _message("b@example.com")],
+            on_error=lambda msg, exc: rejected.append(msg.to[0]),
+        )
+        self.assertEqual(sent, 2)
+        self.assertEqual(rejected, ["bad@example.com"])
+        self.assertEqual(FakeSMTPBackend.opened, 1)
+        self.assertEqual(len(self.pool._idle), 1)
+
+    def test_refused_recipient_without_handler_raises_once(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.pool.send_messages([_message("bad@example.com")])
+        # not retried on a new connection, and the connection goes back to the pool
+        self.assertEqual(FakeSMTPBackend.opened, 1)
+        self.assertEqual(len(self.pool._idle), 1)
+
+    def test_dropped_connection_reconnects_and_resumes(self):
+        FakeSMTPBackend.DROP_ONCE = {"b@example.com"}
+        sent = self.pool.send_messages([_message("a@example.com"), _message("b@example.com")])
+        self.assertEqual(sent, 2)
+        self.assertEqual(FakeSMTPBackend.delivered, ["a@example.com", "b@example.com"])
+        self.assertEqual(FakeSMTPBackend.opened, 2)
+
+
+@override_settings(EMAIL_BACKEND=FAKE_BACKEND, EMAIL_HOST_USER="user", EMAIL_HOST_PASSWORD="pass")
+class DeliverAccountTests(TestCase):
+    def setUp(self):
+        FakeSMTPBackend.reset()
+        _pools.clear()
+        self.addCleanup(_pools.clear)
+
+    def _outbox(self, *addresses):
+        return [
+            enqueue_email(
+                to_email=to, subject="s", txt_template="emails/contact_us_ack.txt",
+                html_template=None, ctx={}, from_email="from@example.com",
+            )
+            for to in addresses
+        ]
+
+    def test_refused_recipient_fails_only_its_row(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        good, bad, other = self._outbox("a@example.com", "bad@example.com", "b@example.com")
+        self.assertEqual(_deliver_account("no_reply", [good, bad, other]), (2, 1))
+        statuses = dict(OutboxMessage.objects.values_list("to_email", "status"))
+        self.assertEqual(statuses["a@example.com"], OutboxMessage.Status.SENT)
+        self.assertEqual(statuses["b@example.com"], OutboxMessage.Status.SENT)
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutboxMessage.Status.PENDING)
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn("SMTPRecipientsRefused", bad.last_error)
+
+    def test_dropped_connection_defers_the_rest(self):
+        FakeSMTPBackend.DROP_ONCE = {"b@example.com"}
+        first, second, third = self._outbox("a@example.com", "b@example.com", "c@example.com")
+        self.assertEqual(_deliver_account("no_reply", [first, second, third]), (1, 2))
+        self.assertEqual(
+            list(OutboxMessage.objects.order_by("id").values_list("status", "attempts")),
+            # the outage doesn't use up the deferred messages' attempts
+            [(OutboxMessage.Status.SENT, 1), (OutboxMessage.Status.PENDING, 0), (OutboxMessage.Status.PENDING, 0)],
+        )
+
+
+@override_settings(EMAIL_BACKEND=FAKE_BACKEND)
+class SendMergeTests(TestCase):
+    def setUp(self):
+        FakeSMTPBackend.reset()
+        self.pool = SMTPConnectionPool("user", "pass")
+        self.merge = MailMerge(txt_template="emails/course_notification.txt", html_template=None, ctx={})
+
+    def _send(self, recipients, **kwargs):
+        return send_merge(
+            self.merge, recipients, subject="s", from_email="from@example.com",
+            pool=self.pool, use_quota=False, **kwargs,
+        )
+
+    def test_refused_recipient_fails_alone(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        stats = self._send([("a@example.com", "A"), ("bad@example.com", "B"), ("c@example.com", "C")])
+        self.assertEqual((stats.sent, stats.failed, stats.failed_batches), (2, 1, 1))
+        self.assertEqual(FakeSMTPBackend.delivered, ["a@example.com", "c@example.com"])
+
+    def test_connection_lost_for_good_counts_the_unsent(self):
+        FakeSMTPBackend.DOWN = {"b@example.com"}
+        stats = self._send([("a@example.com", "A"), ("b@example.com", "B"), ("c@example.com", "C")], chunk_size=2)
+        # b fails twice (original connection + reconnect); c goes out in the next chunk
+        self.assertEqual((stats.sent, stats.failed, stats.failed_batches, stats.batches), (2, 1, 1, 2))
+        self.assertEqual(FakeSMTPBackend.delivered, ["a@example.com", "c@example.com"])
+
+
+    def test_queryset_chunk_is_read_after_the_quota_wait(self):
+        def individual(email):
+            User.objects.create_user(email=email, password=None, role=UserRole.INDIVIDUAL, is_active=True)
+
+        for email in ("a@example.com", "b@example.com", "c@example.com"):
+            individual(email)
+        grants = iter([1, 0, 1, 2])
+        with mock.patch("mailer.merge.quota.try_acquire", side_effect=lambda *a: quota.Grant(next(grants), 0)), \
+                mock.patch("mailer.merge.time.sleep", side_effect=lambda s: individual("d@example.com")):
+            stats = send_merge(
+                self.merge, course_notification_recipients(), subject="s", from_email="from@example.com",
+                pool=self.pool, chunk_size=2,
+            )
+        # d signed up while the campaign waited: the second chunk is queried afterwards
+        self.assertEqual((stats.sent, stats.batches), (4, 2))
+        self.assertEqual(FakeSMTPBackend.delivered, ["a@example.com", "b@example.com", "c@example.com", "d@example.com"])
+
+
+@override_settings(
+    EMAIL_BACKEND=FAKE_BACKEND, EMAIL_HOST_USER="user", EMAIL_HOST_PASSWORD="pass",
+    CACHES=LOCMEM_CACHES, EMAIL_HOURLY_QUOTA={"no_reply": 10},
+)
+class QuotaTests(TestCase):
+    def setUp(self):
+        FakeSMTPBackend.reset()
+        cache.clear()
+        _pools.clear()
+        self.addCleanup(_pools.clear)
+
+    def test_failed_outbox_sends_are_refunded(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        for to in ("a@example.com", "bad@example.com"):
+            enqueue_email(
+                to_email=to, subject="s", txt_template="emails/contact_us_ack.txt",
+                html_template=None, ctx={}, from_email="from@example.com",
+            )
+        claimed = claim_due(10)
+        self.assertEqual(quota.used("no_reply"), 2)
+        self.assertEqual(deliver(claimed), (1, 1))
+        self.assertEqual(quota.used("no_reply"), 1)
+
+    def test_failed_merge_sends_are_refunded(self):
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        merge = MailMerge(txt_template="emails/course_notification.txt", html_template=None, ctx={})
+        stats = send_merge(
+            merge, [("a@example.com", "A"), ("bad@example.com", "B")],
+            subject="s", from_email="from@example.com", pool=SMTPConnectionPool("user", "pass"),
+        )
+        self.assertEqual((stats.sent, stats.failed), (1, 1))
+        self.assertEqual(quota.used("no_reply"), 1)
+
+    def test_direct_send_takes_a_token_and_refunds_on_failure(self):
+        send_no_reply_email(subject="s", html_content="<p>x</p>", to="a@example.com")
+        self.assertEqual(quota.used("no_reply"), 1)
+        FakeSMTPBackend.REFUSED = {"bad@example.com"}
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            send_no_reply_email(subject="s", html_content="<p>x</p>", to="bad@example.com")
+        self.assertEqual(quota.used("no_reply"), 1)
+
+    def test_direct_send_refused_when_quota_is_used_up(self):
+        quota.try_acquire("no_reply", 10, OutboxMessage.Priority.OTP)
+        with self.assertRaises(RuntimeError):
+            send_no_reply_email(subject="s", html_content="<p>x</p>", to="a@example.com")
+        self.assertEqual(FakeSMTPBackend.delivered, [])
+
+    def test_release_goes_back_to_the_window_it_came_from(self):
+        hour = 3600 * 1000
+        with mock.patch("mailer.quota.time.time", return_value=hour + 3599):
+            granted, window = quota.try_acquire("no_reply", 3, OutboxMessage.Priority.OTP)
+        with mock.patch("mailer.quota.time.time", return_value=hour + 3600):
+            quota.try_acquire("no_reply", 1, OutboxMessage.Priority.OTP)
+            quota.release("no_reply", granted, window)
+            self.assertEqual(quota.used("no_reply"), 1)
+            self.assertEqual(cache.get(quota._key("no_reply", window)), 0)
+
+    def test_contact_us_goes_through_the_support_outbox(self):
+        from accounts.views import send_contact_us_email
+
+        send_contact_us_email(from_name="Sara", from_email="sara@example.com", message_text="hello")
+        msg = OutboxMessage.objects.get()
+        self.assertEqual((msg.account, msg.status), (OutboxMessage.Account.SUPPORT, OutboxMessage.Status.PENDING))
+        self.assertEqual(msg.reply_to, "sara@example.com")
+        self.assertEqual(FakeSMTPBackend.delivered, [])
+
+
+class PrecompiledTemplateTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = Path(tmp.name)
+        settings_override = override_settings(EMAIL_TEMPLATE_BUILD_DIR=self.out)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.engine = Engine(
+            dirs=[str(source_dir().parent)],
+            loaders=["mailer.precompile.PrecompiledEmailLoader", "django.template.loaders.filesystem.Loader"],
+            libraries={"static": "django.templatetags.static"},
+        )
+
+    def served_from_build(self, name="emails/contact_us.html") -> bool:
+        return str(self.engine.get_template(name).origin.name).startswith(str(self.out))
+
+    def test_fresh_build_is_served(self):
+        build_all()
+        self.assertEqual(stale_templates(), [])
+        self.assertTrue(self.served_from_build())
+        self.assertFalse(self.served_from_build("emails/contact_us.txt"))
+
+    def test_missing_build_falls_back_to_source(self):
+        with self.assertLogs("mailer.precompile", "ERROR"):
+            self.assertFalse(self.served_from_build())
+
+    def test_stale_build_falls_back_to_source(self):
+        build_all()
+        manifest_path = self.out / EMAIL_TEMPLATE_DIR / BUILD_MANIFEST
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        manifest["contact_us.html"] = "source changed since the build"
+        manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+        self.assertEqual(stale_templates(), ["contact_us.html"])
+        with self.assertLogs("mailer.precompile", "ERROR"):
+            self.assertFalse(self.served_from_build())
+        self.assertTrue(self.served_from_build("emails/login_otp.html"))
@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
 from django.shortcuts import render
 
-from accounts.models import UserRole, OrganizationProfile
+from accounts.models import UserRole
 
 
 def _is_org_rep(user) -> bool:
@@ -21,28 +21,8 @@ def _deny_if_not_org(request):
 
 
 def _ctx(request, active: str):
-    u = request.user
-
-    # اسم العرض من السيشن (الذي أنت تحفظه بعد login)
-    display_name = (request.session.get("display_name") or "").strip()
-    if not display_name:
-        display_name = getattr(u, "email", "") or "مستخدم"
-
-    # اسم الجهة من OrganizationProfile
-    org_name = ""
-    try:
-        org = OrganizationProfile.objects.filter(user=u).only("organization_name").first()
-        if org and (org.organization_name or "").strip():
-            org_name = org.organization_name.strip()
-    except Exception:
-        org_name = ""
-
-    return {
-        "active": active,
-        "display_name": display_name,
-        "region": getattr(u, "region", None),
-        "org_name": org_name,
-    }
+    # display_name / region / org_name من accounts.context_processors.portal_header
+    return {"active": active}
 
 
 @login_required
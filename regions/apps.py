@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegionsConfig(AppConfig):
     name = 'regions'
     verbose_name = 'المناطق'
+
+    def ready(self):
+        from .signals import connect_catalog_signals
+        connect_catalog_signals()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# مرجع البيانات الثابتة نسبيًا (المناطق/فروع الجهات المعتمدة/قوالب الشهادات النشطة)
+# كقوائم خيارات جاهزة: تُبنى مرة وتُحذف من الكاش عند أي تعديل (regions.signals)
+CATALOG_CACHE_KEY = "catalog:reference:v1"
+CATALOG_TTL_SECONDS = 6 * 3600
+
+
+def _build() -> dict[str, list[dict[str, Any]]]:
+    from certificates.models import CertificateTemplate
+    from organizations.models import OrganizationBranch, OrgStatus
+    from regions.models import Region
+
+    regions = [
+        {"id": pk, "label": name}
+        for pk, name in Region.objects.order_by("id").values_list("id", "name")
+    ]
+
+    org_branches = []
+    for row in (
+        OrganizationBranch.objects.filter(status=OrgStatus.APPROVED)
+        .order_by("id")
+        .values("id", "branch_name", "master__name", "region_id", "region__name")
+    ):
+        # same text as OrganizationBranch.__str__, without the per-row FK queries
+        if row["branch_name"]:
+            label = f"{row['master__name']} - {row['branch_name']} ({row['region__name']})"
+        else:
+            label = f"{row['master__name']} ({row['region__name']})"
+        org_branches.append({"id": row["id"], "label": label, "region_id": row["region_id"]})
+
+    certificate_templates = [
+        {"id": pk, "label": name, "region_id": region_id}
+        for pk, name, region_id in CertificateTemplate.objects.filter(is_active=True)
+        .order_by("name").values_list("id", "name", "region_id")
+    ]
+
+    return {
+        "regions": regions,
+        "org_branches": org_branches,
+        "certificate_templates": certificate_templates,
+    }
+
+
+def get_catalog() -> dict[str, list[dict[str, Any]]]:
+    data = cache.get(CATALOG_CACHE_KEY)
+    if data is None:
+        data = _build()
+        cache.set(CATALOG_CACHE_KEY, data, CATALOG_TTL_SECONDS)
+    return data
+
+
+def region_options() -> list[dict[str, Any]]:
+    return get_catalog()["regions"]
+
+
+def region_label(region_id) -> str:
+    """Region name by id from the catalog ("" when unknown)."""
+    if not region_id:
+        return ""
+    for region in region_options():
+        if region["id"] == region_id:
+            return region["label"]
+    return ""
+
+
+def org_branch_options() -> list[dict[str, Any]]:
+    return get_catalog()["org_branches"]
+
+
+def certificate_template_options() -> list[dict[str, Any]]:
+    return get_catalog()["certificate_templates"]
+
+
+def invalidate() -> None:
+    cache.delete(CATALOG_CACHE_KEY)
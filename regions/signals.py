@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .catalog import invalidate
+
+
+def _invalidate_catalog(sender, **kwargs):
+    # after commit: a rebuild inside the writing transaction could cache rolled-back rows
+    transaction.on_commit(invalidate)
+
+
+def connect_catalog_signals() -> None:
+    from certificates.models import CertificateTemplate
+    from organizations.models import OrganizationBranch, OrganizationMaster
+    from regions.models import Region
+
+    for model in (Region, OrganizationMaster, OrganizationBranch, CertificateTemplate):
+        post_save.connect(_invalidate_catalog, sender=model, dispatch_uid=f"catalog_save_{model._meta.label_lower}")
+        post_delete.connect(_invalidate_catalog, sender=model, dispatch_uid=f"catalog_delete_{model._meta.label_lower}")
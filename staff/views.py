@@ -5,11 +5,8 @@ from staff.decorators import staff_required
 
 
 def _ctx(request, active: str) -> dict:
-    return {
-        "active": active,
-        "display_name": (request.session.get("display_name") or "").strip(),  # ✅ الاسم فقط
-        "region": (request.session.get("region") or "").strip(),              # ✅ المنطقة
-    }
+    # display_name / region من accounts.context_processors.portal_header
+    return {"active": active}
 
 
 @login_required
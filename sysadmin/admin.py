@@ -6,4 +6,6 @@ class AuditLogAdmin(admin.ModelAdmin):
     list_display = ("created_at", "action", "actor", "target_user", "ip_address")
     list_filter = ("action", "created_at")
     search_fields = ("actor__email", "target_user__email", "ip_address", "note")
-    readonly_fields = ("actor", "action", "target_user", "ip_address", "user_agent", "before", "after", "note", "created_at")
+    readonly_fields = ("actor", "action", "target_user", "ip_address", "user_agent", "op", "before", "after", "changes", "note", "created_at")
+    exclude = ("ua",)
+    list_select_related = ("actor", "target_user")
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary into the local read replica (THQAF_SQLITE_REPLICA_PATH) with the "
+        "online backup API, so thqaf.db_router can be exercised without a replicated server. "
+        "Re-run (or schedule) to simulate replication; --every N keeps copying with N seconds of lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, default=0, help="repeat every N seconds (0: copy once)")
+
+    def handle(self, *args, **opts):
+        primary, replica = settings.DATABASES["default"], settings.DATABASES.get("replica")
+        if replica is None or primary["ENGINE"] != replica["ENGINE"] or "sqlite3" not in primary["ENGINE"]:
+            raise CommandError("Needs SQLite for both aliases: set THQAF_SQLITE_REPLICA_PATH.")
+        path = replica["NAME"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            start = time.perf_counter()
+            source = sqlite3.connect(str(primary["NAME"]))
+            target = sqlite3.connect(str(path))
+            try:
+                # readers of the replica see the old copy until the backup finishes
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(f"{primary['NAME']} -> {path} ({time.perf_counter() - start:.2f}s)")
+            if opts["every"] <= 0:
+                return
+            time.sleep(opts["every"])
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:28
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _intern(UserAgent, values):
+    by_digest = {_digest(v): v for v in set(values) if v}
+    if not by_digest:
+        return {}
+    found = dict(UserAgent.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+    missing = [UserAgent(digest=d, value=v) for d, v in by_digest.items() if d not in found]
+    if missing:
+        UserAgent.objects.bulk_create(missing, ignore_conflicts=True)
+        found = dict(UserAgent.objects.filter(digest__in=by_digest).values_list("digest", "id"))
+    return {v: found[d] for d, v in by_digest.items()}
+
+
+def _diff(before, after):
+    # frozen copy of iam.models.diff_snapshots
+    if before is None:
+        return {k: [None, v] for k, v in sorted((after or {}).items())}
+    if after is None:
+        return {k: [v, None] for k, v in sorted(before.items())}
+    return {
+        k: [before.get(k), after.get(k)]
+        for k in sorted(set(before) | set(after))
+        if before.get(k) != after.get(k)
+    }
+
+
+def backfill(apps, schema_editor):
+    AuditLog = apps.get_model("sysadmin", "AuditLog")
+    UserAgent = apps.get_model("iam", "UserAgent")
+
+    last_pk = 0
+    while True:
+        chunk = list(AuditLog.objects.filter(pk__gt=last_pk).order_by("pk")[:CHUNK_SIZE])
+        if not chunk:
+            break
+        ua_ids = _intern(UserAgent, (log.user_agent for log in chunk))
+        for log in chunk:
+            log.ua_id = ua_ids.get(log.user_agent)
+            if log.before is not None or log.after is not None:
+                log.op = "create" if log.before is None else "delete" if log.after is None else "update"
+                log.changes = _diff(log.before, log.after)
+        AuditLog.objects.bulk_update(chunk, ["ua", "op", "changes"])
+        last_pk = chunk[-1].pk
+
+
+def unbackfill(apps, schema_editor):
+    """
+    Rollback: user_agent from the interned value, before/after from the changes
+    (an update's unchanged fields were never kept, so only the changed ones).
+    """
+    AuditLog = apps.get_model("sysadmin", "AuditLog")
+
+    last_pk = 0
+    while True:
+        chunk = list(AuditLog.objects.filter(pk__gt=last_pk).select_related("ua").order_by("pk")[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for log in chunk:
+            log.user_agent = (log.ua.value if log.ua_id else "")[:256]
+            if log.op and isinstance(log.changes, dict):
+                log.before = None if log.op == "create" else {k: v[0] for k, v in log.changes.items()}
+                log.after = None if log.op == "delete" else {k: v[1] for k, v in log.changes.items()}
+        AuditLog.objects.bulk_update(chunk, ["user_agent", "before", "after"])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0003_compact_audit'),
+        ('sysadmin', '0002_rename_sysadmin_au_action_9bb2f1_idx_sysadmin_au_action_763a7b_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='changes',
+            field=models.JSONField(blank=True, default=dict, verbose_name='التغييرات'),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='ua',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='iam.useragent', verbose_name='User-Agent'),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='op',
+            field=models.CharField(blank=True, choices=[('create', 'إنشاء'), ('update', 'تعديل'), ('delete', 'حذف')], default='', max_length=8, verbose_name='نوع التغيير'),
+        ),
+        # before/after/user_agent are dropped in 0004: on PostgreSQL an ALTER TABLE
+        # after the backfill's UPDATEs in one transaction fails with "pending trigger events"
+        migrations.RunPython(backfill, unbackfill),
+    ]
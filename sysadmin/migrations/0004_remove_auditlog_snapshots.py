@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0003_compact_audit'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='after',
+        ),
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='before',
+        ),
+        migrations.RemoveField(
+            model_name='auditlog',
+            name='user_agent',
+        ),
+    ]
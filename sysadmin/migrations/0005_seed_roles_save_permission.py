@@ -0,0 +1,41 @@
+from django.db import migrations
+
+CODE = "sysadmin.roles_save"
+# whoever could edit the matrix cell by cell may save it in one go
+GRANTED_LIKE = "sysadmin.role_perm_toggle"
+
+
+def seed(apps, schema_editor):
+    Permission = apps.get_model("iam", "Permission")
+    RolePermission = apps.get_model("iam", "RolePermission")
+    UserPermission = apps.get_model("iam", "UserPermission")
+
+    perm, _ = Permission.objects.get_or_create(
+        code=CODE, defaults={"name": "حفظ مصفوفة صلاحيات الأدوار", "module": "sysadmin"}
+    )
+    RolePermission.objects.bulk_create(
+        [
+            RolePermission(role=role, permission=perm, allow=allow)
+            for role, allow in RolePermission.objects.filter(permission__code=GRANTED_LIKE).values_list("role", "allow")
+        ],
+        ignore_conflicts=True,
+    )
+    UserPermission.objects.bulk_create(
+        [
+            UserPermission(user_id=user_id, permission=perm, allow=allow)
+            for user_id, allow in UserPermission.objects.filter(permission__code=GRANTED_LIKE).values_list("user_id", "allow")
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iam', '0005_remove_auditevent_user_agent'),
+        ('sysadmin', '0004_remove_auditlog_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, migrations.RunPython.noop),
+    ]
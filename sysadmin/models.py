@@ -34,11 +34,23 @@ class AuditLog(models.Model):
         verbose_name="المستخدم المستهدف",
     )
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="عنوان IP")
-    user_agent = models.CharField(max_length=256, blank=True, default="", verbose_name="User-Agent")
+    ua = models.ForeignKey(
+        "iam.UserAgent",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="User-Agent",
+    )
 
-    # Snapshot مبسط (قبل/بعد)
-    before = models.JSONField(null=True, blank=True, verbose_name="قبل")
-    after = models.JSONField(null=True, blank=True, verbose_name="بعد")
+    OP_CHOICES = [
+        ("create", "إنشاء"),
+        ("update", "تعديل"),
+        ("delete", "حذف"),
+    ]
+    op = models.CharField(max_length=8, choices=OP_CHOICES, blank=True, default="", verbose_name="نوع التغيير")
+    # تعديل: الحقول التي تغيّرت فقط؛ إنشاء/حذف: كل الحقول — {field: [before, after]}
+    changes = models.JSONField(default=dict, blank=True, verbose_name="التغييرات")
 
     note = models.CharField(max_length=250, blank=True, default="", verbose_name="ملاحظة")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
@@ -53,3 +65,15 @@ class AuditLog(models.Model):
 
     def __str__(self) -> str:
         return f"{self.action} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+    @property
+    def user_agent(self) -> str:
+        return self.ua.value if self.ua_id else ""
+
+    @property
+    def before(self) -> dict:
+        return {k: v[0] for k, v in (self.changes or {}).items()}
+
+    @property
+    def after(self) -> dict:
+        return {k: v[1] for k, v in (self.changes or {}).items()}
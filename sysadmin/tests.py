@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, UserRole
+from iam.models import AuditEvent, Permission, RolePermission
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RolesMatrixSaveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email="root@example.com", password="x", role=UserRole.SUPER_ADMIN, is_active=True
+        )
+        self.client.force_login(self.admin)
+        self.perm = Permission.objects.create(code="reports.export", name="export")
+
+    def cell(self, role):
+        return f"{role}:{self.perm.pk}"
+
+    def allowed(self, role):
+        return RolePermission.objects.filter(role=role, permission=self.perm, allow=True).exists()
+
+    def test_stale_page_keeps_edits_made_elsewhere(self):
+        RolePermission.objects.create(role=UserRole.SUPERVISOR, permission=self.perm, allow=True)
+        page = self.client.get(reverse("sysadmin:roles")).context
+        # another admin revokes the supervisor grant after this page was loaded
+        RolePermission.objects.filter(role=UserRole.SUPERVISOR, permission=self.perm).update(allow=False)
+
+        # this admin only ticks the trainer box; the supervisor box is still ticked on the stale page
+        self.client.post(reverse("sysadmin:roles_save"), {
+            "shown_perms": page["shown_perms"],
+            "original": page["original"],
+            "cell": [self.cell(UserRole.SUPERVISOR), self.cell(UserRole.TRAINER)],
+        })
+        self.assertTrue(self.allowed(UserRole.TRAINER))
+        self.assertFalse(self.allowed(UserRole.SUPERVISOR))
+
+    def test_unticked_box_is_revoked(self):
+        RolePermission.objects.create(role=UserRole.SUPERVISOR, permission=self.perm, allow=True)
+        page = self.client.get(reverse("sysadmin:roles")).context
+        self.client.post(reverse("sysadmin:roles_save"), {
+            "shown_perms": page["shown_perms"], "original": page["original"], "cell": [],
+        })
+        self.assertFalse(self.allowed(UserRole.SUPERVISOR))
+
+    def test_roles_save_permission_is_seeded(self):
+        self.assertTrue(Permission.objects.filter(code="sysadmin.roles_save", is_active=True).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AuditLogPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email="root@example.com", password="x", role=UserRole.SUPER_ADMIN, is_active=True
+        )
+        self.client.force_login(self.admin)
+        now = timezone.now()
+        self.events = [
+            AuditEvent.objects.create(action=f"event.{i}", created_at=now - timedelta(minutes=i)) for i in range(3)
+        ]
+
+    def page(self, after=None):
+        with mock.patch("sysadmin.views.AUDIT_PAGE_SIZE", 1):
+            response = self.client.get(reverse("sysadmin:audit"), {"after": after} if after else {})
+        return [e.action for e in response.context["items"]], response.context["next_after"]
+
+    def test_cursor_survives_archived_row(self):
+        items, cursor = self.page(self.page()[1])
+        self.assertEqual(items, ["event.1"])
+        # archive_audit moved the cursor row away
+        self.events[1].delete()
+        self.assertEqual(self.page(cursor)[0], ["event.2"])
+
+    def test_bad_cursor_shows_the_first_page(self):
+        self.assertEqual(self.page("nonsense")[0], ["event.0"])
@@ -11,6 +11,7 @@ urlpatterns = [
     path("users/<int:user_id>/perm/<int:perm_id>/", views.user_perm_toggle, name="user_perm_toggle"),
     path("roles/", views.roles_matrix, name="roles"),
     path("roles/toggle/", views.role_perm_toggle, name="role_perm_toggle"),
+    path("roles/save/", views.roles_matrix_save, name="roles_save"),
     path("requests/", views.requests_list, name="requests"),
     path("requests/<int:req_id>/", views.request_decide, name="request_decide"),
     path("audit/", views.audit_log, name="audit"),
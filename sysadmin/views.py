@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 from django.contrib import messages
 from django.db import transaction
 from django.db.models import Count, Q
@@ -9,24 +12,37 @@ from django.views.decorators.http import require_http_methods, require_POST
 
 from accounts.models import User, UserRole
 from iam.decorators import permission_required
+from iam import audit_search
+from iam.audit_buffer import audit_buffer
 from iam.models import AuditEvent, Permission, RolePermission, UserPermission, PermissionRequest
-from iam.services import audit, invalidate_perm_cache
+from iam.services import audit, invalidate_role_perms, invalidate_user_perms
+from accounts.trusted_devices import login_stats
+from mailer.services import outbox_metrics
+from thqaf.db_router import replica_reads
 
 from .forms import UserUpdateForm, PermissionRequestDecisionForm
 
 @permission_required("sysadmin.dashboard")
+@replica_reads
 def dashboard(request):
     # quick stats
     stats = {
         "users": User.objects.count(),
         "active_users": User.objects.filter(is_active=True).count(),
         "pending_requests": PermissionRequest.objects.filter(status=PermissionRequest.Status.PENDING).count(),
-        "audit_today": AuditEvent.objects.filter(created_at__date=timezone.now().date()).count(),
+        # range on the indexed column instead of created_at__date (no per-row date cast)
+        "audit_today": AuditEvent.objects.filter(
+            created_at__gte=timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        ).count(),
+        "audit_buffer": audit_buffer.stats(),
+        "mail": outbox_metrics(),
+        "logins": login_stats(days=7),
     }
     roles = User.objects.values("role").annotate(n=Count("id")).order_by("-n")
     return render(request, "sysadmin/dashboard.html", {"stats": stats, "roles": roles})
 
 @permission_required("sysadmin.users")
+@replica_reads
 def users_list(request):
     q = (request.GET.get("q") or "").strip()
     role = (request.GET.get("role") or "").strip()
@@ -48,7 +64,7 @@ def user_edit(request, user_id: int):
             before = {"role": u.role, "is_active": u.is_active, "region_id": u.region_id, "org_branch_id": u.org_branch_id, "individual_id": u.individual_id}
             form.save()
             after = {"role": u.role, "is_active": u.is_active, "region_id": u.region_id, "org_branch_id": u.org_branch_id, "individual_id": u.individual_id}
-            invalidate_perm_cache()
+            invalidate_user_perms(u.id)
             audit(request, action="user.update", target_user=u, meta={"before": before, "after": after})
             messages.success(request, "تم تحديث المستخدم.")
             return redirect("sysadmin:users")
@@ -69,18 +85,86 @@ def user_perm_toggle(request, user_id: int, perm_id: int):
     before = UserPermission.objects.filter(user=u, permission=p).first()
     with transaction.atomic():
         UserPermission.objects.update_or_create(user=u, permission=p, defaults={"allow": allow})
-    invalidate_perm_cache()
+    invalidate_user_perms(u.id)
     audit(request, action="userperm.set", target_user=u, meta={"permission": p.code, "allow": allow, "before": (before.allow if before else None)})
     messages.success(request, "تم تحديث صلاحية المستخدم.")
     return redirect("sysadmin:user_edit", user_id=u.id)
 
 @permission_required("sysadmin.roles")
 def roles_matrix(request):
-    perms = Permission.objects.filter(is_active=True).order_by("module", "code")
+    perms = list(Permission.objects.filter(is_active=True).order_by("module", "code"))
     roles = [r[0] for r in UserRole.choices]
-    links = RolePermission.objects.select_related("permission").all()
+    links = RolePermission.objects.all()
     matrix = {(l.role, l.permission_id): l.allow for l in links}
-    return render(request, "sysadmin/roles_matrix.html", {"perms": perms, "roles": roles, "role_choices": UserRole.choices, "matrix": matrix})
+    rows = [
+        {"perm": p, "cells": [{"role": r, "allow": matrix.get((r, p.id), False)} for r in roles]}
+        for p in perms
+    ]
+    # the state the page was rendered with: the save applies only the cells edited since
+    shown_perms = " ".join(str(p.id) for p in perms)
+    original = " ".join(f"{r}:{p.id}" for p in perms for r in roles if matrix.get((r, p.id), False))
+    return render(request, "sysadmin/roles_matrix.html", {
+        "rows": rows, "roles": roles, "role_choices": UserRole.choices, "matrix": matrix,
+        "shown_perms": shown_perms, "original": original,
+    })
+
+@permission_required("sysadmin.roles_save")
+@require_POST
+def roles_matrix_save(request):
+    """
+    Save the edited matrix in one round-trip. The form posts the checked
+    "<role>:<perm_id>" cells plus the state it was rendered with; only cells the
+    admin changed on this page are written, so a stale page never reverts edits
+    made elsewhere since it was loaded.
+    """
+    valid_roles = dict(UserRole.choices)
+    perm_codes = dict(Permission.objects.filter(is_active=True).values_list("id", "code"))
+
+    def cells(values):
+        found = set()
+        for cell in values:
+            role, _, perm_id = cell.partition(":")
+            if role in valid_roles and perm_id.isdigit() and int(perm_id) in perm_codes:
+                found.add((role, int(perm_id)))
+        return found
+
+    checked = cells(request.POST.getlist("cell"))
+    original = cells((request.POST.get("original") or "").split())
+    shown = {int(p) for p in (request.POST.get("shown_perms") or "").split() if p.isdigit()} & set(perm_codes)
+    edited = {
+        (role, perm_id): (role, perm_id) in checked
+        for perm_id in shown for role in valid_roles
+        if ((role, perm_id) in checked) != ((role, perm_id) in original)
+    }
+
+    current = {
+        (l.role, l.permission_id): l
+        for l in RolePermission.objects.filter(permission_id__in={perm_id for _, perm_id in edited})
+    }
+    to_update, to_create = [], []
+    for (role, perm_id), allow in edited.items():
+        link = current.get((role, perm_id))
+        if link is None:
+            if allow:
+                to_create.append(RolePermission(role=role, permission_id=perm_id, allow=True))
+        elif link.allow != allow:
+            link.allow = allow
+            to_update.append(link)
+
+    if not to_update and not to_create:
+        messages.info(request, "لا توجد تغييرات.")
+        return redirect("sysadmin:roles")
+
+    before = {f"{l.role}:{perm_codes[l.permission_id]}": (not l.allow) for l in to_update}
+    after = {f"{l.role}:{perm_codes[l.permission_id]}": l.allow for l in to_update + to_create}
+    changed_roles = {l.role for l in to_update + to_create}
+    with transaction.atomic():
+        RolePermission.objects.bulk_update(to_update, ["allow"])
+        RolePermission.objects.bulk_create(to_create, ignore_conflicts=True)
+        audit(request, action="roleperm.bulk_set", meta={"before": before, "after": after})
+        transaction.on_commit(lambda: [invalidate_role_perms(r) for r in changed_roles])
+    messages.success(request, f"تم حفظ {len(to_update) + len(to_create)} تغيير على صلاحيات الأدوار.")
+    return redirect("sysadmin:roles")
 
 @permission_required("sysadmin.role_perm_toggle")
 @require_POST
@@ -95,12 +179,13 @@ def role_perm_toggle(request):
     before = RolePermission.objects.filter(role=role, permission=p).first()
     with transaction.atomic():
         RolePermission.objects.update_or_create(role=role, permission=p, defaults={"allow": allow})
-    invalidate_perm_cache()
+    invalidate_role_perms(role)
     audit(request, action="roleperm.set", meta={"role": role, "permission": p.code, "allow": allow, "before": (before.allow if before else None)})
     messages.success(request, "تم تحديث صلاحية الدور.")
     return redirect("sysadmin:roles")
 
 @permission_required("sysadmin.requests")
+@replica_reads
 def requests_list(request):
     status = (request.GET.get("status") or "pending").strip()
     qs = PermissionRequest.objects.select_related("requested_by","target_user","permission").all()
@@ -129,7 +214,7 @@ def request_decide(request, req_id: int):
                     UserPermission.objects.update_or_create(
                         user=pr.target_user, permission=pr.permission, defaults={"allow": pr.allow}
                     )
-                    invalidate_perm_cache()
+                    transaction.on_commit(lambda: invalidate_user_perms(pr.target_user_id))
                     audit(request, action="permrequest.approve", target_user=pr.target_user, meta={"permission": pr.permission.code, "allow": pr.allow, "note": note})
                     messages.success(request, "تم اعتماد الطلب وتطبيقه.")
                 else:
@@ -144,11 +229,39 @@ def request_decide(request, req_id: int):
         form = PermissionRequestDecisionForm()
     return render(request, "sysadmin/request_decide.html", {"pr": pr, "form": form})
 
+AUDIT_PAGE_SIZE = 50
+_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_CURSOR_RE = re.compile(r"^(\d+)_(\d+)$")
+
+
+def _audit_cursor(event: AuditEvent) -> str:
+    """(created_at, id) of the last row shown: "<µs since epoch>_<id>"."""
+    return f"{(event.created_at - _CURSOR_EPOCH) // timedelta(microseconds=1)}_{event.id}"
+
+
+def _parse_audit_cursor(value: str):
+    m = _CURSOR_RE.match(value)
+    if not m:
+        return None
+    return _CURSOR_EPOCH + timedelta(microseconds=int(m.group(1))), int(m.group(2))
+
+
 @permission_required("sysadmin.audit")
+@replica_reads
 def audit_log(request):
     q = (request.GET.get("q") or "").strip()
-    qs = AuditEvent.objects.select_related("actor","target_user").all()
+    qs = AuditEvent.objects.select_related("actor","target_user").order_by("-created_at", "-id")
     if q:
-        qs = qs.filter(Q(action__icontains=q) | Q(actor__email__icontains=q) | Q(target_user__email__icontains=q))
-    items = qs[:200]
-    return render(request, "sysadmin/audit.html", {"items": items, "q": q})
+        qs = audit_search.search(qs, q)
+
+    # keyset pagination: ?after=<(created_at, id) of the last row of the previous page>;
+    # the cursor carries its own position, so it survives the row being archived
+    cursor = _parse_audit_cursor((request.GET.get("after") or "").strip())
+    if cursor:
+        created_at, last_id = cursor
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+
+    items = list(qs[:AUDIT_PAGE_SIZE + 1])
+    next_after = _audit_cursor(items[AUDIT_PAGE_SIZE - 1]) if len(items) > AUDIT_PAGE_SIZE else None
+    items = items[:AUDIT_PAGE_SIZE]
+    return render(request, "sysadmin/audit.html", {"items": items, "q": q, "next_after": next_after})
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+REPLICA = "replica"
+PRIMARY = "default"
+SESSION_PIN_KEY = "_db_pinned_until"
+
+# per pin scope (a request, or a read_replica() block): may reads go to the replica,
+# and has the scope written? Outside a scope writes pin nothing, so management
+# commands and threads never stay pinned.
+_replica_ok = contextvars.ContextVar("db_replica_ok", default=False)
+_in_scope = contextvars.ContextVar("db_pin_scope", default=False)
+_pinned = contextvars.ContextVar("db_pinned", default=False)
+_wrote = contextvars.ContextVar("db_wrote", default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA in settings.DATABASES
+
+
+def pin_to_primary() -> None:
+    """Send the rest of the current scope's reads to the primary."""
+    if _in_scope.get():
+        _pinned.set(True)
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+@contextmanager
+def pin_scope(pinned: bool = False):
+    """
+    Read-your-own-writes scope: a write inside it pins the rest of the scope
+    to the primary. Pin and write flags are restored on exit.
+    """
+    tokens = (_in_scope.set(True), _pinned.set(pinned), _wrote.set(False))
+    try:
+        yield
+    finally:
+        for var, token in zip((_in_scope, _pinned, _wrote), tokens):
+            var.reset(token)
+
+
+@contextmanager
+def read_replica():
+    """
+    Route the reads inside the block to the replica (unless pinned to the
+    primary). Opens its own pin scope when not already inside one.
+    """
+    token = _replica_ok.set(True)
+    try:
+        if _in_scope.get():
+            yield
+        else:
+            with pin_scope():
+                yield
+    finally:
+        _replica_ok.reset(token)
+
+
+def replica_reads(view_func):
+    """For read-only views that tolerate a few seconds of replication lag (dashboards, reports)."""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view_func(request, *args, **kwargs)
+        with read_replica():
+            return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes → primary, and pin the rest of the pin scope there (read-your-own-writes).
+    Reads → replica only inside replica_reads / read_replica() and while unpinned;
+    objects keep reading from the database they were loaded from.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _replica_ok.get() and not _pinned.get():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if _in_scope.get():
+            _pinned.set(True)
+            _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica is a copy of the primary, never migrated on its own
+        return db == PRIMARY
+
+
+class ReplicaPinningMiddleware:
+    """
+    Starts every request unpinned, except within REPLICA_PIN_SECONDS after the
+    same session wrote (so a redirect after a POST reads its own data); a request
+    that writes extends the pin. Not loaded when no replica is configured.
+    Goes after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, "session", None)
+        pinned_until = session.get(SESSION_PIN_KEY, 0) if session is not None else 0
+        with pin_scope(pinned=pinned_until > time.time()):
+            response = self.get_response(request)
+            if _wrote.get() and session is not None:
+                session[SESSION_PIN_KEY] = time.time() + getattr(settings, "REPLICA_PIN_SECONDS", 5)
+        return response